@@ -0,0 +1,147 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from agents.console import log
+from config.llm_config import get_backend_pool_config
+
+# Routes LLM calls over several Ollama hosts (OLLAMA_HOSTS, see config/llm_config.py).
+# - each attempt goes to the healthy host with the lowest expected wait:
+#   (requests in flight + 1) x recent time to first token; hosts at their
+#   OLLAMA_NUM_PARALLEL are only used when every host is
+# - a host that fails eject_after times in a row (connection errors, 5xx, dropped streams)
+#   is ejected for eject_s, doubling on every repeat ejection up to eject_max_s; once that
+#   passes it gets requests again and a single failure ejects it again
+# - if every host is ejected, the one due back soonest is used rather than failing the call
+# The scheduler's retry then lands on whichever host is best at that moment.
+
+# time to first token assumed for a host until it has served a request
+DEFAULT_LATENCY_S = 0.05
+# weight of the newest sample in the latency moving average
+LATENCY_ALPHA = 0.3
+
+
+class Backend:
+    """One Ollama host and what the pool knows about it."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.latency_s: Optional[float] = None
+        self.failures = 0           # consecutive
+        self.ejections = 0          # consecutive; resets on the next success
+        self.ejected_until = 0.0
+        self.rejects_format = False  # answered a JSON-schema "format" with HTTP 400
+        self.stats: Dict[str, Any] = {"requests": 0, "errors": 0, "ejections": 0, "max_in_flight": 0}
+
+    def score(self) -> float:
+        return (self.in_flight + 1) * (self.latency_s if self.latency_s is not None else DEFAULT_LATENCY_S)
+
+
+class BackendPool:
+    """Least-loaded routing with passive health checks over a fixed list of hosts."""
+
+    def __init__(self, hosts: List[str], max_in_flight: int = 4, eject_after: int = 2,
+                 eject_s: float = 30.0, eject_max_s: float = 300.0):
+        if not hosts:
+            raise ValueError("BackendPool needs at least one host")
+        self.backends = [Backend(url) for url in hosts]
+        self.max_in_flight = max(1, max_in_flight)
+        self.eject_after = max(1, eject_after)
+        self.eject_s = eject_s
+        self.eject_max_s = eject_max_s
+        self._lock = threading.Lock()
+
+    @property
+    def hosts(self) -> List[str]:
+        return [b.url for b in self.backends]
+
+    def acquire(self, url: Optional[str] = None, needs_format: bool = False) -> Backend:
+        """Picks the host for one attempt (or takes url's) and counts it as in flight until release().
+
+        needs_format (a JSON-schema request) skips hosts that rejected schemas while another accepts them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            backends = self.backends
+            if needs_format and not all(b.rejects_format for b in backends):
+                backends = [b for b in backends if not b.rejects_format]
+            healthy = [b for b in backends if b.ejected_until <= now]
+            if url is not None:
+                backend = next((b for b in self.backends if b.url == url), None)
+                if backend is None:
+                    raise ValueError(f"{url} is not in the backend pool")
+            elif healthy:
+                free = [b for b in healthy if b.in_flight < self.max_in_flight]
+                backend = min(free or healthy, key=Backend.score)
+            else:
+                backend = min(backends, key=lambda b: b.ejected_until)
+            backend.in_flight += 1
+            backend.stats["requests"] += 1
+            backend.stats["max_in_flight"] = max(backend.stats["max_in_flight"], backend.in_flight)
+            return backend
+
+    def release(self, backend: Backend, ok: Optional[bool], latency_s: Optional[float] = None) -> None:
+        """Ends an attempt. ok=None (cancelled, deadline, model missing...) says nothing about the host."""
+        with self._lock:
+            backend.in_flight -= 1
+            if ok:
+                backend.failures = 0
+                backend.ejections = 0
+                if latency_s is not None:
+                    backend.latency_s = latency_s if backend.latency_s is None else \
+                        LATENCY_ALPHA * latency_s + (1 - LATENCY_ALPHA) * backend.latency_s
+                return
+            if ok is None:
+                return
+            backend.failures += 1
+            backend.stats["errors"] += 1
+            # a host that was ejected before gets no second chance
+            if backend.failures < self.eject_after and not backend.ejections:
+                return
+            cooldown = min(self.eject_max_s, self.eject_s * 2 ** backend.ejections)
+            backend.ejections += 1
+            backend.stats["ejections"] += 1
+            backend.failures = 0
+            backend.ejected_until = time.monotonic() + cooldown
+        log(f"[POOL] Ejected {backend.url} for {cooldown:.0f}s after repeated failures")
+
+    def reject_format(self, backend: Backend) -> None:
+        """Notes that backend answered a JSON-schema format with HTTP 400; schema calls avoid it from now on."""
+        with self._lock:
+            backend.rejects_format = True
+
+    def accepts_format(self) -> bool:
+        """False once every host rejected a JSON-schema format, so asking with one is wasted."""
+        with self._lock:
+            return not all(b.rejects_format for b in self.backends)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-host counters and current state, e.g. for a benchmark report."""
+        with self._lock:
+            now = time.monotonic()
+            return {b.url: {**b.stats, "in_flight": b.in_flight, "ejected": b.ejected_until > now,
+                            "latency_s": round(b.latency_s, 4) if b.latency_s is not None else None}
+                    for b in self.backends}
+
+
+_pool: Optional[BackendPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_backend_pool() -> BackendPool:
+    """Returns the process-wide pool; rebuilt when the configured hosts change (e.g. OLLAMA_HOST)."""
+    global _pool
+    config = get_backend_pool_config()
+    with _pool_lock:
+        if _pool is None or _pool.hosts != config["hosts"]:
+            _pool = BackendPool(**config)
+        return _pool
+
+
+def configure_backend_pool(**overrides: Any) -> BackendPool:
+    """Replaces the process-wide pool, e.g. with a short ejection time for a benchmark."""
+    global _pool
+    with _pool_lock:
+        _pool = BackendPool(**{**get_backend_pool_config(), **overrides})
+        return _pool
@@ -0,0 +1,119 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agents.console import log, log_to_file
+from agents.exemplars import EXEMPLAR_FILE
+from agents.pipeline import PipelineOptions, run_pipeline_file
+from agents.reply_cache import configure_reply_cache, get_reply_cache
+from agents.scheduler import get_scheduler
+from config.llm_config import get_exemplar_config
+
+# Batch mode: one pipeline per summary file in a directory, each into out_dir/<file stem>/.
+# Pipelines run concurrently in one process (agents/pipeline.py), so all of their LLM calls
+# share the scheduler's global concurrency budget (OLLAMA_NUM_PARALLEL x hosts) and the
+# reply cache. Each pipeline's console output goes to out_dir/<stem>/pipeline.log; the batch
+# itself prints one progress line per finished summary and writes batch_report.json.
+
+DEFAULT_PATTERN = "*.txt"
+BATCH_REPORT_FILE = "batch_report.json"
+PIPELINE_LOG_FILE = "pipeline.log"
+
+
+def default_max_pipelines() -> int:
+    # a pipeline spends most of its time waiting on the LLM, so keep enough of them running
+    # to fill every slot of the budget; more would only queue inside the scheduler
+    return get_scheduler().max_concurrency
+
+
+async def _run_one(summary_path: Path, out_dir: Path, options: PipelineOptions) -> Dict[str, Any]:
+    started = time.perf_counter()
+    entry: Dict[str, Any] = {"summary": summary_path.name, "out_dir": str(out_dir)}
+    try:
+        with log_to_file(out_dir / PIPELINE_LOG_FILE):
+            trace = await run_pipeline_file(summary_path, out_dir, options)
+        agents = trace["agents"].values()
+        entry.update(status="ok", llm_calls=trace["llm_calls"],
+                     cache_hits=sum(a["cache_hits"] for a in agents),
+                     tokens=sum(a["prompt_tokens"] + a["completion_tokens"] for a in agents),
+                     stages=trace["stages"])
+    except Exception as e:
+        entry.update(status="failed", error=f"{type(e).__name__}: {e}")
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+async def run_batch(summary_dir: Path, out_dir: Path, options: Optional[PipelineOptions] = None,
+                    max_pipelines: Optional[int] = None, pattern: str = DEFAULT_PATTERN,
+                    cache_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """Runs the pipeline for every summary in summary_dir; returns (and writes) the batch report.
+
+    At most max_pipelines run at once (default: the scheduler's concurrency cap). The reply
+    cache is switched on for the batch, in memory or under cache_dir if given.
+    """
+    import asyncio
+
+    summaries = sorted(summary_dir.glob(pattern))
+    if not summaries:
+        raise FileNotFoundError(f"No summaries matching {pattern} in {summary_dir}")
+    options = options or PipelineOptions()
+    # the variants share one exemplar index, so code approved for one is an example for the rest
+    config = get_exemplar_config()
+    if (options.exemplars is True or options.exemplars is None and config["enabled"]) and not config["path"]:
+        options = options._replace(exemplars=out_dir / EXEMPLAR_FILE)
+    max_pipelines = max(1, max_pipelines or default_max_pipelines())
+    cache = get_reply_cache()
+    if not cache.enabled:
+        cache = configure_reply_cache(enabled=True, directory=cache_dir)
+    calls_before = dict(cache.stats)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    log(f"\n[BATCH] {len(summaries)} summaries from {summary_dir}, {max_pipelines} at a time, "
+        f"LLM budget {get_scheduler().max_concurrency} calls")
+
+    gate = asyncio.Semaphore(max_pipelines)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+
+    async def worker(summary_path: Path) -> None:
+        async with gate:
+            entry = await _run_one(summary_path, out_dir / summary_path.stem, options)
+        results.append(entry)
+        detail = f"{entry['llm_calls']} LLM calls, {entry['cache_hits']} cached" if entry["status"] == "ok" \
+            else entry["error"]
+        log(f"[BATCH] {len(results)}/{len(summaries)} {entry['summary']}: {entry['status']} "
+            f"in {entry['seconds']:.1f}s ({detail})")
+
+    await asyncio.gather(*(worker(path) for path in summaries))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if r["status"] == "ok"]
+    report = {
+        "summaries": len(summaries),
+        "ok": len(ok),
+        "failed": len(summaries) - len(ok),
+        "wall_s": round(wall, 3),
+        "summaries_per_hour": round(len(ok) / wall * 3600, 1) if wall else None,
+        "max_pipelines": max_pipelines,
+        "llm_budget": get_scheduler().max_concurrency,
+        "llm_calls": sum(r["llm_calls"] for r in ok),
+        "cache": {key: cache.stats[key] - calls_before.get(key, 0) for key in cache.stats},
+        "results": sorted(results, key=lambda r: r["summary"]),
+    }
+    (out_dir / BATCH_REPORT_FILE).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print_batch_report(report)
+    log(f"[OK] Batch report written to: {out_dir / BATCH_REPORT_FILE}")
+    return report
+
+
+def print_batch_report(report: Dict[str, Any]) -> None:
+    width = max(len(r["summary"]) for r in report["results"])
+    log(f"\n{'Summary':<{width}}  {'Status':<6}  {'Time':>8}  {'Calls':>5}  {'Cached':>6}")
+    for r in report["results"]:
+        calls = r.get("llm_calls", "-")
+        cached = r.get("cache_hits", "-")
+        log(f"{r['summary']:<{width}}  {r['status']:<6}  {r['seconds']:>7.1f}s  {calls:>5}  {cached:>6}")
+    cache = report["cache"]
+    log(f"[BATCH] {report['ok']}/{report['summaries']} ok in {report['wall_s']:.1f}s "
+        f"({report['summaries_per_hour']} summaries/hour), {report['llm_calls']} LLM calls, "
+        f"cache {cache['hits']} hits / {cache['misses']} misses / {cache['shared']} shared in flight")
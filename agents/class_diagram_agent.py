@@ -1,21 +1,32 @@
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
-from autogen.agentchat import ConversableAgent
 
-from config.llm_config import get_llm_config
+from agents.diagram_check import class_problems, repair
+from agents.prompt_budget import SPEC_BOILERPLATE_FIELDS, PromptBuilder, compact_specs
+from agents.structured import ask_plantuml
+from agents.tracing import traced
 
+# hard requirements of the class diagram: the system prompt asks for them, class_problems() checks them
+REQUIRED_CLASSES = ["User", "Vehicle", "MaintenanceRecord", "RecommendationService", "MaintenanceDB"]
+MULTIPLICITY_ASSOCIATIONS = ['User "1" -- "*" Vehicle', 'Vehicle "1" *-- "*" MaintenanceRecord']
+DEPENDENCIES = ["RecommendationService ..> Vehicle : analyzes", "MaintenanceDB ..> MaintenanceRecord : stores"]
+
+
+def fallback_diagram() -> str:
+    """The required classes and relations without members, for when the reply holds no diagram."""
+    lines = ["@startuml"] + [f"class {name}" for name in REQUIRED_CLASSES]
+    return "\n".join(lines + MULTIPLICITY_ASSOCIATIONS + DEPENDENCIES + ["@enduml"])
+
+
+@traced("class_diagram")
 def generate_class_diagram(uc_specs_path: Path, output_path: Path) -> None:
     """Reads the system summary and asks an LLM agent to generate a UML-style use case diagram description"""
 
     class_text = uc_specs_path.read_text(encoding="utf-8")
-    llm_config = get_llm_config()
    
 
 
-    agent = ConversableAgent(
-        name="class_diagram_agent",
-        llm_config=llm_config,
-        system_message=(
+    system_message = (
             "You are an expert software engineer. "
             "Your ONLY task is to output a VALID PlantUML CLASS DIAGRAM.\n\n"
             
@@ -27,46 +38,39 @@ def generate_class_diagram(uc_specs_path: Path, output_path: Path) -> None:
 
             "CONTENT RULES:\n"
             "- Include these classes:\n"
-            "    User\n"
-            "    Vehicle\n"
-            "    MaintenanceRecord\n"
-            "    RecommendationService\n"
-            "    MaintenanceDB\n"
+            + "".join(f"    {name}\n" for name in REQUIRED_CLASSES) +
             "- Include attributes (+ public, - private) and basic types.\n"
             "- Include at least 1–2 methods per class.\n"
             "- Include associations with multiplicities:\n"
-            "    User \"1\" -- \"*\" Vehicle\n"
-            "    Vehicle \"1\" *-- \"*\" MaintenanceRecord\n"
-            "- Include RecommendationService ..> Vehicle : analyzes\n"
-            "- Include MaintenanceDB ..> MaintenanceRecord : stores\n"
+            + "".join(f"    {line}\n" for line in MULTIPLICITY_ASSOCIATIONS)
+            + "".join(f"- Include {line}\n" for line in DEPENDENCIES) +
             "- DO NOT invent unrelated classes.\n"
     )
-)
-
-    user_prompt = f"""
-Here is the the system summary:
 
-\"\"\"{class_text}\"\"\"
-
-Generate a comprehensive PlantUML class diagram for this system following the system message instructions. Output ONLY the PlantUML block.
-"""
-
-    reply = agent.generate_reply(
-        messages=[{"role": "user", "content": user_prompt}]
+    # classes and associations come from what each use case does, not from its menu steps
+    specs = compact_specs(class_text, drop_fields=SPEC_BOILERPLATE_FIELDS + ("main success scenario",))
+    user_prompt = (
+        PromptBuilder("class_diagram", system_message)
+        .add("Here is the the system summary", f'"""{specs}"""', kind="markdown",
+             verbatim=f'"""{class_text}"""')
+        .add("", "Generate a comprehensive PlantUML class diagram for this system following the system "
+                 "message instructions. Output ONLY the PlantUML block.")
+        .build()
     )
-    
 
-    specs_text = reply["content"] if isinstance(reply, dict) else str(reply)
-    
-    
-    import re
-    match = re.search(r"@startuml[\s\S]*?@enduml", specs_text, re.I)
-    if match:
-        specs_text = match.group(0).strip()
-        print(f"[OK] Extracted PlantUML block: {len(specs_text)} chars")
+    specs_text = ask_plantuml("class_diagram_agent", system_message, user_prompt, role="class_diagram")
+    if specs_text is None:
+        print("[WARNING] No @startuml...@enduml block found in agent reply, writing the required classes and relations")
+        specs_text = fallback_diagram()
     else:
-        print("[WARNING] No @startuml...@enduml block found in agent reply!")
-        print(f"[DEBUG] Reply preview: {specs_text[:300]}")
+        print(f"[OK] Extracted PlantUML block: {len(specs_text)} chars")
+
+    # diff against the content rules; only what is missing or extra goes back to the model
+    specs_text, problems = repair("class_diagram_agent", "class", specs_text,
+                                  lambda d: class_problems(d, REQUIRED_CLASSES, MULTIPLICITY_ASSOCIATIONS + DEPENDENCIES),
+                                  role="class_diagram")
+    if problems:
+        print(f"[WARN] The class diagram still misses requirements: {'; '.join(problems)}")
 
     output_path.write_text(specs_text, encoding="utf-8")
     print(f"[OK] Class Diagram saved to: {output_path}")
@@ -1,11 +1,27 @@
 from pathlib import Path
-from autogen.agentchat import ConversableAgent
-import sys
-import subprocess
-import re
-from typing import Dict, Optional
+import ast
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from config.llm_config import get_llm_config
+from agents.console import buffered_log, log, print_block
+from agents.exemplars import ExemplarIndex, format_examples, open_index
+from agents.llm_client import Cancelled, ask_agent
+from agents.microbench import breaches, format_report, run_microbench
+from agents.plantuml import Diagram, parse as parse_plantuml
+from agents.prompt_budget import PromptBuilder
+from agents.run_state import current_run_state
+from agents.sandbox import get_pool
+from agents.static_check import BLOCKING_KINDS, Finding, analyze, format_findings
+from agents.structured import CODE_SCHEMA, REVIEW_SCHEMA, ask_structured
+from agents.test_runner import failure_summary, run_test
+from agents.tracing import current_trace, span, traced
+from agents.transcript import current_transcript
+from config.llm_config import get_exemplar_config, get_llm_config, get_microbench_config
 
 # Demonstrates all 4 agentic patterns:
 # 1) Tool-based agent (date calculation tools)
@@ -13,7 +29,18 @@ from config.llm_config import get_llm_config
 # 3) Multi-agent collaboration (Architect -> Coder -> Tester)
 # 4) Observer/reflection (CodeReviewer provides feedback, Coder refines)
 
-llm_config = get_llm_config()
+# Use cases are independent, so they are processed concurrently on a bounded pool.
+DEFAULT_MAX_WORKERS = 5
+
+# Coder candidates per use case (best-of-N; 1 = single coder call) and reviewer -> refine rounds.
+DEFAULT_CANDIDATES = 1
+DEFAULT_REFINE_ROUNDS = 1
+# temperature added per extra candidate so the candidates differ
+CANDIDATE_TEMPERATURE_STEP = 0.2
+
+# Reviewer/tester prompts are capped below the context window: they need the structure of the
+# code (classes, signatures, docstrings) more than every line, and shorter prompts answer faster.
+REVIEW_PROMPT_TOKENS = 2048
 
 # --- PATTERN 1: Tool-based agent functions ---
 def calculate_service_due_date(last_service: str, months: int = 6) -> str:
@@ -22,237 +49,734 @@ def calculate_service_due_date(last_service: str, months: int = 6) -> str:
     next_date = last + timedelta(days=30*months)
     return next_date.strftime("%Y-%m-%d")
 
-def days_since_last_service(last_service: str) -> int:
-    """Tool: calculates days since last service."""
+def days_since_last_service(last_service: str, today: Optional[str] = None) -> int:
+    """Tool: calculates days since last service (until today, "%Y-%m-%d", default the current date)."""
     last = datetime.strptime(last_service, "%Y-%m-%d")
-    return (datetime.now() - last).days
-
-# --- Helper: run agent and extract reply ---
-def ask_agent(name: str, system_msg: str, user_msg: str) -> str:
-    """Creates an agent, sends a message, and returns the response content."""
-    agent = ConversableAgent(name=name, system_message=system_msg, llm_config=llm_config)
-    reply = agent.generate_reply(messages=[{"role": "user", "content": user_msg}])
-    content = reply.get("content", "") if isinstance(reply, dict) else str(reply)
-    return content.strip()
+    now = datetime.strptime(today, "%Y-%m-%d") if today else datetime.now()
+    return (now - last).days
 
 # --- Load sequence diagrams ---
-def load_sequence_diagrams(seq_dir: Path) -> Dict[str, str]:
-    """Loads all .puml files from sequence directory and extracts PlantUML blocks."""
+def load_sequence_diagrams(seq_dir: Path) -> Dict[str, Diagram]:
+    """Loads all .puml files from sequence directory and parses their PlantUML blocks."""
     diagrams = {}
     if not seq_dir.exists():
         return diagrams
     
     for f in sorted(seq_dir.glob("*.puml")):
-        raw = f.read_text(encoding="utf-8-sig")
-        m = re.search(r"@startuml[\s\S]*?@enduml", raw, re.I)
-        if m:
+        diagram = parse_plantuml(f.read_text(encoding="utf-8-sig"))
+        if diagram:
             name = f.stem.replace("_sequence", "").replace("_", " ").title()
-            diagrams[name] = m.group(0).strip()
+            diagrams[name] = diagram
     return diagrams
 
 # --- PATTERN 2: Coding agent with code executor ---
+def check_code(code: str, filename: str) -> List[str]:
+    """Compiles code in-process. Returns error lines (empty if it compiles) and logs AST warnings."""
+    try:
+        tree = ast.parse(code, filename=filename)
+        compile(tree, filename, "exec")
+    except SyntaxError as e:
+        return [f"line {e.lineno}: {e.msg}", (e.text or "").rstrip()]
+    except ValueError as e:  # e.g. source contains null bytes
+        return [str(e)]
+
+    if not any(isinstance(node, (ast.ClassDef, ast.FunctionDef)) for node in tree.body):
+        log(f"[WARN] {filename}: no classes or functions defined")
+    if not any(isinstance(node, ast.If) and "__main__" in ast.unparse(node.test) for node in tree.body):
+        log(f"[WARN] {filename}: no if __name__ == '__main__' demo block")
+    return []
+
 def write_code(output_dir: Path, name: str, code: str) -> Optional[Path]:
     """Writes code to file and syntax-checks it."""
     target = output_dir / f"{name.lower().replace(' ', '_')}_impl.py"
     target.write_text(code, encoding="utf-8")
     
-    # Syntax check using py_compile
-    res = subprocess.run(
-        [sys.executable, "-m", "py_compile", str(target)],
-        capture_output=True,
-        text=True
-    )
-    if res.returncode != 0:
-        print(f"[ERROR] Syntax error in {target.name}:")
-        print(res.stderr[:500])
+    # Syntax check with the in-process compiler (no interpreter start-up)
+    errors = check_code(code, target.name)
+    if errors:
+        log(f"[ERROR] Syntax error in {target.name}:")
+        log("\n".join(errors)[:500])
         return None
     
-    print(f"[OK] Code written and validated: {target.name}")
+    log(f"[OK] Code written and validated: {target.name}")
     return target
 
-def execute_code(path: Path, timeout: int = 5) -> tuple:
-    """Executes Python file and returns (stdout, stderr, returncode)."""
+def execute_code(path: Path, timeout: int = 5, cwd: Optional[Path] = None) -> tuple:
+    """Executes Python file and returns (stdout, stderr, returncode).
+
+    Runs in a pre-started sandbox worker (CPU/memory limited, see agents/sandbox.py).
+    cwd keeps files the generated code writes (e.g. maintenance_db.json) away from other runs.
+    """
+    with span(f"execute:{path.name}", kind="step") as attrs:
+        try:
+            stdout, stderr, returncode = get_pool().run(path, timeout=timeout, cwd=cwd)
+        except Exception as e:
+            stdout, stderr, returncode = "", f"Execution error: {str(e)}", -1
+        attrs["returncode"] = returncode
+    return stdout, stderr, returncode
+
+def ask_code(name: str, system_msg: str, user_msg: str, role: str,
+             llm_config: Optional[Dict[str, Any]] = None, cancel: Optional[threading.Event] = None) -> str:
+    """Asks an agent for a Python file and returns its source (JSON {"code": ...} or a fenced reply)."""
+    return ask_structured(name, system_msg, user_msg, CODE_SCHEMA, stop_on="code", llm_config=llm_config,
+                          role=role, cancel=cancel)["code"]
+
+# --- PATTERN 3 & 4: Multi-agent collaboration with reflection ---
+def _candidate_config(index: int) -> Dict[str, Any]:
+    """Candidate 0 uses the configured temperature; later ones sample hotter for variety."""
+    llm_config = get_llm_config("coder")
+    llm_config["temperature"] = min(1.0, llm_config.get("temperature", 0.2) + index * CANDIDATE_TEMPERATURE_STEP)
+    return llm_config
+
+def _run_candidate(index: int, use_case: str, coder_sys: str, coder_prompt: str, scratch: Path,
+                   tests_future: Optional[Future], cancel: threading.Event) -> Dict[str, Any]:
+    """Generates one coder candidate and runs it (and the generated tests) in its own directory."""
+    candidate: Dict[str, Any] = {"index": index, "code": None, "errors": [], "stdout": "", "stderr": "",
+                                 "returncode": None, "tests_rc": None, "passed": False}
+    code = ask_code(f"coder_{use_case}_c{index + 1}", coder_sys, coder_prompt, role="coder",
+                    llm_config=_candidate_config(index), cancel=cancel)
+    candidate["code"] = code
+    stem = f"{use_case.lower().replace(' ', '_')}_impl"
+    candidate["errors"] = check_code(code, f"{stem}.py")
+    if candidate["errors"] or cancel.is_set():
+        return candidate
+
+    # the module keeps its real name so the generated tests can import it
+    workdir = scratch / f"candidate_{index + 1}"
+    workdir.mkdir()
+    impl_path = workdir / f"{stem}.py"
+    impl_path.write_text(code, encoding="utf-8")
+    candidate["stdout"], candidate["stderr"], candidate["returncode"] = execute_code(impl_path, cwd=workdir)
+    if candidate["returncode"] != 0:
+        return candidate
+
+    tests = tests_future.result() if tests_future is not None else None
+    if tests and not cancel.is_set():
+        test_path = workdir / f"test_{stem}.py"
+        test_path.write_text(tests, encoding="utf-8")
+        _, candidate["tests_stderr"], candidate["tests_rc"] = execute_code(test_path, cwd=workdir)
+    candidate["passed"] = candidate["tests_rc"] in (None, 0)
+    return candidate
+
+def _best_of_n(use_case: str, n: int, coder_sys: str, coder_prompt: str, tester_sys: str, tester_prompt: str,
+               scratch: Path) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Runs n coder candidates (and one tester) concurrently; the first candidate that compiles,
+    exits 0 and passes the tests wins and cancels the others.
+
+    Returns (chosen candidate or None, generated tests or None). Without a winner the first
+    candidate that compiles is returned, preferring one that ran cleanly, for the reviewer.
+    """
+    cancel = threading.Event()
+    finished: List[Dict[str, Any]] = []
+    winner = None
+    with ThreadPoolExecutor(max_workers=n + 1, thread_name_prefix="candidate") as pool:
+        tests_future = pool.submit(copy_context().run, _generate_tests, use_case, tester_sys, tester_prompt)
+        futures = [pool.submit(copy_context().run, _run_candidate, i, use_case, coder_sys, coder_prompt,
+                               scratch, tests_future, cancel) for i in range(n)]
+        for future in as_completed(futures):
+            try:
+                candidate = future.result()
+            except Cancelled:
+                continue
+            except Exception as e:
+                log(f"[ERROR] Coder candidate failed: {str(e)}")
+                continue
+            finished.append(candidate)
+            status = ("passed" if candidate["passed"] else
+                      "syntax error" if candidate["errors"] else
+                      f"returncode={candidate['returncode']}" if candidate["returncode"] != 0 else
+                      f"tests returncode={candidate['tests_rc']}")
+            log(f"[CANDIDATE] {candidate['index'] + 1}/{n}: {status}")
+            if candidate["passed"]:
+                winner = candidate
+                cancel.set()  # in-flight streams close at their next chunk
+                break
+    tests = tests_future.result() if tests_future.done() and not tests_future.exception() else None
+    if winner is None:
+        runnable = sorted((c for c in finished if not c["errors"]),
+                          key=lambda c: (c["returncode"] != 0, c["index"]))
+        winner = runnable[0] if runnable else None
+    return winner, tests
+
+def _generate_tests(use_case: str, tester_sys: str, tester_prompt: str,
+                    cancel: Optional[threading.Event] = None) -> Optional[str]:
+    try:
+        return ask_code(f"tester_{use_case}", tester_sys, tester_prompt, role="tester", cancel=cancel)
+    except Cancelled:
+        return None
+    except Exception as e:
+        log(f"[ERROR] Tester agent failed: {str(e)}")
+        return None
+
+def _tester_prompt(tester_sys: str, code: str) -> str:
+    return (
+        PromptBuilder("tester", tester_sys, max_tokens=REVIEW_PROMPT_TOKENS)
+        .add("Implementation", code, kind="code")
+        .add("", "Generate test script.")
+        .build()
+    )
+
+def public_api(code: str) -> Optional[frozenset]:
+    """What tests written against code can call: top-level functions and classes with their
+    public methods, each with its parameter names. None if the code does not parse."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    def params(func: ast.AST) -> Tuple[str, ...]:
+        args = func.args
+        return tuple(a.arg for a in [*args.posonlyargs, *args.args, *args.kwonlyargs])
+
+    api = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            api.add((node.name, params(node)))
+        elif isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            api.add((node.name, ()))
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and \
+                        (item.name == "__init__" or not item.name.startswith("_")):
+                    api.add((f"{node.name}.{item.name}", params(item)))
+    return frozenset(api)
+
+def _log_execution(prefix: str, stdout: str, stderr: str, returncode: int) -> None:
+    log(f"[{prefix}EXECUTE] returncode={returncode}")
+    if stdout:
+        log(f"[{prefix}STDOUT] {stdout[:500]}")
+    if stderr:
+        log(f"[{prefix}STDERR] {stderr[:500]}")
+
+def process_use_case(use_case: str, diagram: Diagram, output_dir: Path, candidates: int = DEFAULT_CANDIDATES,
+                     refine_rounds: int = DEFAULT_REFINE_ROUNDS, static_gate: bool = True,
+                     exemplars: Optional[ExemplarIndex] = None) -> Dict[str, Any]:
+    """Runs architect -> coder -> execute -> reviewer -> refine -> tester for one use case.
+
+    The tester starts as soon as the coder's output compiles and runs concurrently with
+    execution and review; its tests are kept if refinement leaves the public API unchanged.
+
+    With candidates > 1 the coder step is best-of-N: candidates are generated and executed
+    concurrently together with the tests, and the reviewer only runs if none of them passes.
+    The reviewer -> refine loop runs at most refine_rounds times. Code that runs is
+    micro-benchmarked first, and methods over a threshold are part of the review.
+    With static_gate, findings of agents/static_check.py on the coder's first draft go
+    straight to a refine round, before the draft is executed or reviewed.
+    With an exemplars index, approved code of similar use cases is few-shot context for
+    the architect and coder, and this use case's code is added to it once accepted.
+    """
+    # the structured form is shorter than the raw PlantUML and is what the agents act on
+    puml = diagram.compact()
+    result: Dict[str, Any] = {
+        "use_case": use_case, "status": "skipped", "returncode": None,
+        "approved": False, "refined": 0, "tests": False, "tests_passed": None, "candidate": None,
+        "seconds": 0.0,
+    }
+    started = time.perf_counter()
+
+    log(f"\n{'='*60}")
+    log(f"Processing: {use_case}")
+    log('='*60)
+
+    # PATTERN 1: Use tools and include results in prompt
+    sample_date = "2024-06-01"
     try:
-        res = subprocess.run(
-            [sys.executable, str(path)],
-            capture_output=True,
-            text=True,
-            timeout=timeout
+        next_service = calculate_service_due_date(sample_date, months=6)
+        days_since = days_since_last_service(sample_date, _today(use_case))
+        tool_context = (
+            f"Tool results: next_service_due={next_service}, "
+            f"days_since_last_service('{sample_date}')={days_since}"
         )
-        return res.stdout, res.stderr, res.returncode
-    except subprocess.TimeoutExpired:
-        return "", "Execution timed out", -1
+        log(f"[TOOL] {tool_context}")
     except Exception as e:
-        return "", f"Execution error: {str(e)}", -1
+        tool_context = f"Tool error: {str(e)}"
+        log(f"[TOOL] {tool_context}")
 
-# --- PATTERN 3 & 4: Multi-agent collaboration with reflection ---
-def generate_code_from_sequences(seq_dir: Path, output_dir: Path) -> None:
-    """Main orchestrator that demonstrates all 4 agentic patterns."""
-    
-    print(f"\n{'='*60}")
-    print("Starting Code Generation Agent")
-    print(f"Sequence diagrams: {seq_dir}")
-    print(f"Output directory: {output_dir}")
-    print('='*60)
-    
-    diagrams = load_sequence_diagrams(seq_dir)
-    if not diagrams:
-        print(f"[WARN] No sequence diagrams found in {seq_dir}")
-        return
+    # approved code of similar use cases from earlier runs
+    outline_examples, code_examples = _retrieve(use_case, diagram, exemplars, result)
+
+    # PATTERN 3: Multi-agent collaboration
+    # Agent 1: Architect - designs class structure
+    log("\n[ARCHITECT] Designing class structure...")
+    architect_sys = (
+        "You are a software architect. Given a sequence diagram, produce a Python class outline "
+        "(class names, method signatures, attributes). Output only the outline, no implementation."
+    )
+    builder = (
+        PromptBuilder("architect", architect_sys)
+        .add("", tool_context)
+        .add("Sequence Diagram (participants and ordered messages)", puml, verbatim=diagram.to_plantuml())
+    )
+    if outline_examples:
+        builder.add("Approved designs of similar use cases (reuse what fits)", outline_examples, kind="code")
+    architect_prompt = (
+        builder.add("", "Provide Python class outline with class names, attributes, and method signatures.")
+        .build()
+    )
     
-    print(f"[INFO] Found {len(diagrams)} sequence diagrams to process\n")
+    try:
+        outline = ask_agent(f"architect_{use_case}", architect_sys, architect_prompt, role="architect")
+        log(f"[ARCHITECT] Generated outline ({len(outline)} chars)")
+        log(f"[ARCHITECT] Preview: {outline[:200]}...")
+    except Exception as e:
+        log(f"[ERROR] Architect agent failed: {str(e)}")
+        result["error"] = f"architect: {e}"
+        return _finish(result, started)
 
-    for use_case, puml in diagrams.items():
-        print(f"\n{'='*60}")
-        print(f"Processing: {use_case}")
-        print('='*60)
+    # Agent 2: Coder - implements the outline
+    coder_sys = (
+        "You are a coding agent. Generate a complete, executable Python file implementing the provided outline. \n"
+        "Requirements:\n"
+        "- Use in-memory storage (dict) or JSON file\n"
+        "- Include if __name__ == '__main__' with a simple demo\n"
+        "- Use only Python stdlib\n"
+        "- Output ONLY Python code, no markdown or explanations"
+    )
+    builder = (
+        PromptBuilder("coder", coder_sys)
+        .add("Outline", outline, kind="code")
+        .add("Sequence Diagram (participants and ordered messages)", puml, verbatim=diagram.to_plantuml())
+    )
+    if code_examples:
+        builder.add("Approved implementations of similar use cases (follow their patterns where they fit)",
+                    code_examples, kind="code")
+    coder_prompt = builder.add("", "Generate complete Python implementation.").build()
+    tester_sys = (
+        "You are a testing agent. Generate a simple test script (using unittest or plain asserts) "
+        "that validates the main functionality. Output only Python code."
+    )
 
-        # PATTERN 1: Use tools and include results in prompt
-        sample_date = "2024-06-01"
-        try:
-            next_service = calculate_service_due_date(sample_date, months=6)
-            days_since = days_since_last_service(sample_date)
-            tool_context = (
-                f"Tool results: next_service_due={next_service}, "
-                f"days_since_last_service('{sample_date}')={days_since}"
+    # each use case runs its demo in its own scratch directory
+    with tempfile.TemporaryDirectory(prefix="codegen_") as scratch, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="tester") as tester_pool:
+        tests = None
+        tests_future: Optional[Future] = None
+        passed = False
+        if candidates > 1:
+            # the tests are written from the outline so they can run against every candidate
+            log(f"\n[CODER] Generating {candidates} candidate implementations...")
+            module = f"{use_case.lower().replace(' ', '_')}_impl"
+            tester_prompt = (
+                PromptBuilder("tester", tester_sys, max_tokens=REVIEW_PROMPT_TOKENS)
+                .add("Class outline", outline, kind="code")
+                .add("", f"The implementation module is importable as `{module}`.\nGenerate test script.")
+                .build()
             )
-            print(f"[TOOL] {tool_context}")
-        except Exception as e:
-            tool_context = f"Tool error: {str(e)}"
-            print(f"[TOOL] {tool_context}")
-
-        # PATTERN 3: Multi-agent collaboration
-        # Agent 1: Architect - designs class structure
-        print("\n[ARCHITECT] Designing class structure...")
-        architect_sys = (
-            "You are a software architect. Given a sequence diagram, produce a Python class outline "
-            "(class names, method signatures, attributes). Output only the outline, no implementation."
-        )
-        architect_prompt = (
-            f"{tool_context}\n\n"
-            f"Sequence Diagram:\n{puml}\n\n"
-            f"Provide Python class outline with class names, attributes, and method signatures."
-        )
-        
-        try:
-            outline = ask_agent(f"architect_{use_case}", architect_sys, architect_prompt)
-            print(f"[ARCHITECT] Generated outline ({len(outline)} chars)")
-            print(f"[ARCHITECT] Preview: {outline[:200]}...")
-        except Exception as e:
-            print(f"[ERROR] Architect agent failed: {str(e)}")
-            continue
-
-        # Agent 2: Coder - implements the outline
-        print("\n[CODER] Generating implementation...")
-        coder_sys = (
-            "You are a coding agent. Generate a complete, executable Python file implementing the provided outline. \n"
-            "Requirements:\n"
-            "- Use in-memory storage (dict) or JSON file\n"
-            "- Include if __name__ == '__main__' with a simple demo\n"
-            "- Use only Python stdlib\n"
-            "- Output ONLY Python code, no markdown or explanations"
-        )
-        coder_prompt = (
-            f"Outline:\n{outline}\n\n"
-            f"Sequence Diagram:\n{puml}\n\n"
-            f"Generate complete Python implementation."
-        )
-        
-        try:
-            code = ask_agent(f"coder_{use_case}", coder_sys, coder_prompt)
-            
-            # Clean code (remove markdown fences if present)
-            code = re.sub(r"```python\n?", "", code)
-            code = re.sub(r"```\n?", "", code)
-            
-            print(f"[CODER] Generated code ({len(code)} chars)")
-        except Exception as e:
-            print(f"[ERROR] Coder agent failed: {str(e)}")
-            continue
-        
-        # PATTERN 2: Execute generated code
-        print("\n[EXECUTOR] Writing and validating code...")
-        impl_path = write_code(output_dir, use_case, code)
-        if not impl_path:
-            print(f"[SKIP] {use_case} - code failed syntax check\n")
-            continue
-
-        print("[EXECUTOR] Executing generated code...")
-        stdout, stderr, returncode = execute_code(impl_path)
-        print(f"[EXECUTE] returncode={returncode}")
-        if stdout:
-            print(f"[STDOUT] {stdout[:500]}")
-        if stderr:
-            print(f"[STDERR] {stderr[:500]}")
-
-        # PATTERN 4: Observer/Reflection - review and refine
-        print("\n[REVIEWER] Analyzing code quality...")
+            candidate, tests = _best_of_n(use_case, candidates, coder_sys, coder_prompt,
+                                          tester_sys, tester_prompt, Path(scratch))
+            if candidate is None:
+                log(f"[SKIP] {use_case} - no candidate passed the syntax check\n")
+                result["error"] = "syntax check failed"
+                return _finish(result, started)
+            code, passed = candidate["code"], candidate["passed"]
+            stdout, stderr, returncode = candidate["stdout"], candidate["stderr"], candidate["returncode"]
+            result["candidate"] = f"{candidate['index'] + 1}/{candidates}"
+            impl_path = write_code(output_dir, use_case, code)
+            _log_execution("", stdout, stderr, returncode)
+        else:
+            log("\n[CODER] Generating implementation...")
+            try:
+                code = ask_code(f"coder_{use_case}", coder_sys, coder_prompt, role="coder")
+                log(f"[CODER] Generated code ({len(code)} chars)")
+            except Exception as e:
+                log(f"[ERROR] Coder agent failed: {str(e)}")
+                result["error"] = f"coder: {e}"
+                return _finish(result, started)
+
+            # PATTERN 2: Execute generated code
+            log("\n[EXECUTOR] Writing and validating code...")
+            impl_path = write_code(output_dir, use_case, code)
+            if not impl_path:
+                log(f"[SKIP] {use_case} - code failed syntax check\n")
+                result["error"] = "syntax check failed"
+                return _finish(result, started)
+
+            # speculative tester: the tests only need the code, so they are written while the
+            # code is executed and reviewed instead of after the last refinement
+            log("[TESTER] Generating test cases alongside execution and review...")
+            tests_code, tests_cancel = code, threading.Event()
+            tests_future = tester_pool.submit(copy_context().run, _generate_tests, use_case, tester_sys,
+                                              _tester_prompt(tester_sys, code), tests_cancel)
+
+            # static gate: what breaks the code goes straight to the coder, without executing or
+            # reviewing code that is known to be broken; side effects and diagram gaps go to the reviewer
+            findings = _static_gate(code, impl_path, diagram, result) if static_gate else []
+            findings = [f for f in findings if f.kind in BLOCKING_KINDS]
+            refined = None
+            if findings and result["refined"] < refine_rounds:
+                result["static_refined"] = True
+                refined = _refine(use_case, coder_sys, puml, code, None, "", "Static analysis findings",
+                                  format_findings(findings), output_dir, Path(scratch), result, refine_rounds,
+                                  diagram)
+            if refined is not None:
+                code, impl_path, stdout, stderr, returncode = refined
+            else:
+                log("[EXECUTOR] Executing generated code...")
+                stdout, stderr, returncode = execute_code(impl_path, cwd=Path(scratch))
+                _log_execution("", stdout, stderr, returncode)
+        result.update(status="ok", returncode=returncode)
+
+        # micro-benchmark: what does not scale is reviewed like what does not work
+        perf, perf_path = _microbench(impl_path, returncode, result), impl_path
+        if passed and perf:
+            log(f"[BENCH] Candidate {result['candidate']} passed its tests but not the micro-benchmark")
+            passed = False
+
+        # PATTERN 4: Observer/Reflection - review and refine (skipped when a candidate passed its tests)
+        if passed:
+            log(f"[CANDIDATE] {result['candidate']} passed execution and tests, review skipped")
+            result["approved"] = True
         reviewer_sys = (
             "You are a code reviewer. Analyze the generated code and execution results. "
             "Provide specific, actionable feedback if there are errors or improvements needed. "
             "If code is good, say 'APPROVED'."
         )
-        reviewer_prompt = (
-            f"Use Case: {use_case}\n"
-            f"Code:\n{code[:1000]}\n...\n"
-            f"Execution stdout: {stdout[:300]}\n"
-            f"Execution stderr: {stderr[:300]}\n"
-            f"Return code: {returncode}\n\n"
-            "Provide review feedback."
-        )
-        
-        try:
-            feedback = ask_agent(f"reviewer_{use_case}", reviewer_sys, reviewer_prompt)
-            print(f"[REVIEWER] {feedback[:400]}")
-        except Exception as e:
-            print(f"[ERROR] Reviewer agent failed: {str(e)}")
-            feedback = ""
-
-        # Reflection: if not approved, refine once
-        if feedback and "APPROVED" not in feedback.upper():
-            print("\n[REFINE] Requesting code refinement...")
-            refine_prompt = (
-                f"{coder_prompt}\n\n"
-                f"Reviewer feedback:\n{feedback}\n\n"
-                f"Generate improved code addressing the feedback."
+        while not passed:
+            if impl_path != perf_path:
+                perf, perf_path = _microbench(impl_path, returncode, result), impl_path
+            log("\n[REVIEWER] Analyzing code quality...")
+            builder = (
+                PromptBuilder("reviewer", reviewer_sys, max_tokens=REVIEW_PROMPT_TOKENS)
+                .add("", f"Use Case: {use_case}")
+                .add("Code", code, kind="code")
+                .add("", f"Execution stdout: {stdout[:300]}\n"
+                         f"Execution stderr: {stderr[-300:]}\n"
+                         f"Return code: {returncode}")
             )
-            
+            if perf:
+                builder.add("Micro-benchmark results over threshold (report each as an issue)", perf)
+            if result.get("review_findings"):
+                builder.add("Possible problems found by static analysis (report the real ones as issues)",
+                            "\n".join(f"- {finding}" for finding in result["review_findings"]))
+            reviewer_prompt = builder.add("", "Provide review feedback.").build()
+
             try:
-                refined_code = ask_agent(f"coder_refined_{use_case}", coder_sys, refine_prompt)
-                refined_code = re.sub(r"```python\n?", "", refined_code)
-                refined_code = re.sub(r"```\n?", "", refined_code)
-                
-                refined_path = write_code(output_dir, use_case + "_v2", refined_code)
-                if refined_path:
-                    stdout2, stderr2, rc2 = execute_code(refined_path)
-                    print(f"[REFINED EXECUTE] returncode={rc2}")
-                    if stdout2:
-                        print(f"[REFINED STDOUT] {stdout2[:300]}")
+                review = ask_structured(f"reviewer_{use_case}", reviewer_sys, reviewer_prompt, REVIEW_SCHEMA,
+                                        role="reviewer")
+                result["approved"] = review["verdict"] == "approved"
+                # only the issues go to the refine prompt
+                feedback = "\n".join(f"- {issue}" for issue in review["issues"])
+                log(f"[REVIEWER] {review['verdict']}" + (f"\n{feedback[:400]}" if feedback else ""))
             except Exception as e:
-                print(f"[ERROR] Refinement failed: {str(e)}")
+                log(f"[ERROR] Reviewer agent failed: {str(e)}")
+                result["approved"], feedback = False, ""
+
+            # Reflection: if not approved, refine (up to refine_rounds times)
+            if not feedback or result["approved"] or result["refined"] >= refine_rounds:
+                break
+            refined = _refine(use_case, coder_sys, puml, code, returncode, stderr, "Reviewer feedback", feedback,
+                              output_dir, Path(scratch), result, refine_rounds, diagram)
+            if refined is None:
+                break
+            code, impl_path, stdout, stderr, returncode = refined
+            # the last refinement is not reviewed again
+            if result["refined"] >= refine_rounds:
+                break
 
         # Agent 3: Tester - generates test cases
-        print("\n[TESTER] Generating test cases...")
-        tester_sys = (
-            "You are a testing agent. Generate a simple test script (using unittest or plain asserts) "
-            "that validates the main functionality. Output only Python code."
-        )
-        tester_prompt = f"Implementation:\n{code[:1000]}\n\nGenerate test script."
-        
-        try:
-            tests = ask_agent(f"tester_{use_case}", tester_sys, tester_prompt)
-            tests = re.sub(r"```python\n?", "", tests)
-            tests = re.sub(r"```\n?", "", tests)
-            
-            test_path = output_dir / f"test_{impl_path.name}"
+        if tests_future is not None:
+            # the speculative tests still apply if refinement kept the API they were written against
+            api = public_api(tests_code)
+            if code == tests_code or (api is not None and public_api(code) == api):
+                tests = tests_future.result()
+                result["tests_source"] = "speculative" if code == tests_code else "speculative (API unchanged)"
+            else:
+                tests_cancel.set()
+                log("[TESTER] Refinement changed the API, discarding the speculative tests")
+                result["tests_source"] = "regenerated"
+        if tests is None:
+            log("\n[TESTER] Generating test cases...")
+            tests = _generate_tests(use_case, tester_sys, _tester_prompt(tester_sys, code))
+        if tests is not None:
+            # named after the first version, which is the module name the tests import
+            test_path = output_dir / f"test_{use_case.lower().replace(' ', '_')}_impl.py"
             test_path.write_text(tests, encoding="utf-8")
-            print(f"[TESTER] Test script written: {test_path.name}")
+            log(f"[TESTER] Test script written: {test_path.name}")
+            result["tests"] = True
+
+            # test failures go back to the coder like reviewer feedback, within the same round budget
+            # (a best-of-N winner already passed these tests)
+            result["tests_passed"] = True if passed else None
+            while not passed:
+                report = run_test(test_path, impl=impl_path)
+                result["tests_passed"] = report["status"] == "passed"
+                log(f"[TESTS] {test_path.name} against {impl_path.name}: {report['status']}")
+                if result["tests_passed"] or result["refined"] >= refine_rounds:
+                    break
+                refined = _refine(use_case, coder_sys, puml, code, returncode, stderr, "Failing tests",
+                                  failure_summary(report), output_dir, Path(scratch), result, refine_rounds, diagram)
+                if refined is None:
+                    break
+                code, impl_path, stdout, stderr, returncode = refined
+
+    if exemplars is not None and _accepted(result):
+        transcript = current_transcript()
+        # a replayed run changes nothing on disk beyond its own artifacts
+        if transcript is None or transcript.mode != "replay":
+            exemplars.add(use_case, diagram, code, refined=result["refined"])
+            log(f"[EXEMPLARS] Added the approved {impl_path.name} to {exemplars.path.name}")
+    return _finish(result, started)
+
+def _refine(use_case: str, coder_sys: str, puml: str, code: str, returncode: int, stderr: str,
+            feedback_label: str, feedback: str, output_dir: Path, scratch: Path, result: Dict[str, Any],
+            refine_rounds: int, diagram: Optional[Diagram] = None) -> Optional[Tuple[str, Path, str, str, int]]:
+    """One reflection round: asks the coder to fix code given feedback, writes <use_case>_vN and runs it.
+
+    returncode is None when the code was never executed (static findings). Returns
+    (code, path, stdout, stderr, returncode) of the refined version, or None if it failed.
+    """
+    result["refined"] += 1
+    log(f"\n[REFINE] Requesting code refinement ({result['refined']}/{refine_rounds})...")
+    # the current code already carries the outline, so it replaces the original coder prompt
+    builder = (
+        PromptBuilder("refine", coder_sys, role="coder")
+        .add("Sequence Diagram (participants and ordered messages)", puml)
+        .add("Current code", code, kind="code")
+    )
+    if returncode is not None:
+        builder.add("", f"Return code: {returncode}\nExecution stderr: {stderr[-300:]}")
+    refine_prompt = (
+        builder.add(feedback_label, feedback)
+        .add("", "Generate improved code addressing the feedback.")
+        .build()
+    )
+
+    try:
+        refined_code = ask_code(f"coder_refined_{use_case}", coder_sys, refine_prompt, role="coder")
+
+        refined_path = write_code(output_dir, f"{use_case}_v{result['refined'] + 1}", refined_code)
+        if not refined_path:
+            return None
+        # the refined code is executed either way; remaining findings are only reported
+        _static_gate(refined_code, refined_path, diagram, result)
+        stdout, stderr, returncode = execute_code(refined_path, cwd=scratch)
+        _log_execution("REFINED ", stdout, stderr, returncode)
+        result["returncode"] = returncode
+        return refined_code, refined_path, stdout, stderr, returncode
+    except Exception as e:
+        log(f"[ERROR] Refinement failed: {str(e)}")
+        return None
+
+def _static_gate(code: str, path: Path, diagram: Optional[Diagram], result: Dict[str, Any]) -> List[Finding]:
+    """Runs the static analyzer on written code; logs and counts its findings."""
+    with span(f"static:{path.name}", kind="step") as attrs:
+        findings = analyze(code, path.name, diagram)
+        attrs["findings"] = len(findings)
+    result["static_findings"] = len(findings)
+    result["review_findings"] = [str(f) for f in findings if f.kind not in BLOCKING_KINDS]
+    if findings:
+        log(f"[STATIC] {len(findings)} finding(s) in {path.name}:\n{format_findings(findings)[:800]}")
+    else:
+        log(f"[STATIC] {path.name}: no findings")
+    return findings
+
+def _microbench(impl_path: Path, returncode: int, result: Dict[str, Any]) -> str:
+    """Micro-benchmarks code that ran cleanly; returns its threshold breaches as review input.
+
+    Timings vary between runs, so a transcript carries the breaches along with the LLM replies
+    and a replayed run reviews the same ones.
+    """
+    config = get_microbench_config()
+    if not config["enabled"] or returncode != 0:
+        return ""
+    transcript, name = current_transcript(), f"microbench_{impl_path.name}"
+    if transcript is not None and transcript.mode == "replay":
+        problems = json.loads(transcript.replay(name, "", "", None, None)[0])
+    else:
+        with span(f"microbench:{impl_path.name}", kind="step") as attrs:
+            report = run_microbench(impl_path, get_pool(), config)
+            problems = breaches(report, config)
+            attrs.update(methods=len(report["methods"]), breaches=len(problems))
+        log(f"[BENCH] {impl_path.name} under {config['vehicles']} vehicles x {config['records']} records:\n"
+            f"{format_report(report)}")
+        if transcript is not None:
+            transcript.record(name, None, "", "", None, None, json.dumps(problems), {})
+    result["microbench"] = {"file": impl_path.name, "breaches": problems}
+    if problems:
+        log(f"[BENCH] {len(problems)} method(s) over threshold:\n" + "\n".join(problems))
+    return "\n".join(f"- {problem}" for problem in problems)
+
+def _retrieve(use_case: str, diagram: Diagram, exemplars: Optional[ExemplarIndex],
+              result: Dict[str, Any]) -> Tuple[str, str]:
+    """Few-shot context from the index: (for the architect, for the coder), or empty strings.
+
+    Like micro-benchmark results, the context is kept in a transcript, so a replay does not
+    depend on what the index holds at the time.
+    """
+    if exemplars is None:
+        return "", ""
+    config = get_exemplar_config()
+    transcript, name = current_transcript(), f"exemplars_{use_case}"
+    if transcript is not None and transcript.mode == "replay":
+        outline_examples, code_examples, found = json.loads(transcript.replay(name, "", "", None, None)[0])
+    else:
+        with span(f"exemplars:{use_case}", kind="step") as attrs:
+            matches = exemplars.search(use_case, diagram, config["top_k"], config["min_score"])
+            found = [[entry["use_case"], score] for score, entry in matches]
+            outline_examples = format_examples(matches, config["architect_tokens"])
+            code_examples = format_examples(matches, config["coder_tokens"])
+            attrs.update(indexed=len(exemplars.entries), matches=len(matches))
+        if transcript is not None:
+            transcript.record(name, None, "", "", None, None,
+                              json.dumps([outline_examples, code_examples, found]), {})
+    result["exemplars"] = found
+    if found:
+        log("[EXEMPLARS] Few-shot context: " + ", ".join(f"{source} ({score:.2f})" for source, score in found))
+    return outline_examples, code_examples
+
+def _today(use_case: str) -> str:
+    """The date the tools count from. A transcript pins it, so a replay on a later day sends the same prompts."""
+    transcript, name = current_transcript(), f"clock_{use_case}"
+    if transcript is not None and transcript.mode == "replay":
+        return transcript.replay(name, "", "", None, None)[0]
+    today = datetime.now().strftime("%Y-%m-%d")
+    if transcript is not None:
+        transcript.record(name, None, "", "", None, None, today, {})
+    return today
+
+def _accepted(result: Dict[str, Any]) -> bool:
+    """True if the use case's final code is good enough to be an example for later runs."""
+    return (result["approved"] and result["returncode"] == 0 and result["tests_passed"] is not False
+            and not (result.get("microbench") or {}).get("breaches"))
+
+def _finish(result: Dict[str, Any], started: float) -> Dict[str, Any]:
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+def _process_buffered(use_case: str, diagram: Diagram, output_dir: Path, candidates: int,
+                      refine_rounds: int, static_gate: bool,
+                      exemplars: Optional[ExemplarIndex]) -> Tuple[Dict[str, Any], List[str]]:
+    """Worker entry point: processes one use case with its console output held back."""
+    with buffered_log() as lines, span(f"use_case:{use_case}", kind="step"):
+        try:
+            result = process_use_case(use_case, diagram, output_dir, candidates, refine_rounds, static_gate,
+                                      exemplars)
         except Exception as e:
-            print(f"[ERROR] Tester agent failed: {str(e)}")
+            log(f"[ERROR] {use_case} failed: {e}")
+            result = {"use_case": use_case, "status": "error", "returncode": None, "approved": False,
+                      "refined": 0, "tests": False, "tests_passed": None, "candidate": None, "seconds": 0.0,
+                      "error": str(e)}
+        result["tokens"] = _tokens_spent(use_case)
+    return result, lines
+
+def _tokens_spent(use_case: str) -> int:
+    """LLM tokens (prompt + completion) of the calls made for one use case so far."""
+    trace = current_trace()
+    if trace is None:
+        return 0
+    return sum(s.attrs.get("prompt_tokens", 0) + s.attrs.get("completion_tokens", 0)
+               for s in trace.llm_spans() if f"use_case:{use_case}" in s.path())
+
+def use_case_files(output_dir: Path, use_case: str) -> List[Path]:
+    """Every file a use case wrote: its implementation, refined versions and test script."""
+    stem = use_case.lower().replace(" ", "_")
+    return sorted([*output_dir.glob(f"{stem}_impl.py"), *output_dir.glob(f"{stem}_v*_impl.py"),
+                   *output_dir.glob(f"test_{stem}_impl.py")])
 
+def print_summary(results: List[Dict[str, Any]], elapsed: float) -> None:
+    """Prints one row per use case plus the wall time of the whole stage."""
+    width = max([len("Use case")] + [len(r["use_case"]) for r in results])
+    print(f"\n{'Use case':<{width}}  {'Status':<7}  {'RC':>4}  {'Review':<8}  {'Refined':<7}  {'Tests':<5}  "
+          f"{'Cand':<5}  {'Time':>7}")
+    print("-" * (width + 59))
+    for r in results:
+        rc = "-" if r["returncode"] is None else str(r["returncode"])
+        review = "approved" if r["approved"] else "changes"
+        refined = f"{r['refined']}x" if r["refined"] else "no"
+        tests = "pass" if r.get("tests_passed") else "fail" if r["tests"] else "no"
+        print(f"{r['use_case']:<{width}}  {r['status']:<7}  {rc:>4}  {review:<8}  "
+              f"{refined:<7}  {tests:<5}  {r.get('candidate') or '-':<5}  "
+              f"{r['seconds']:>6.1f}s")
+    slowest = max((r["seconds"] for r in results), default=0.0)
+    print(f"Stage wall time: {elapsed:.1f}s (slowest use case: {slowest:.1f}s)")
+    refined = [r for r in results if r["refined"]]
+    print(f"Refine rate: {len(refined)}/{len(results)} use cases refined, "
+          f"{sum(r['refined'] for r in results)} refine rounds "
+          f"({sum(1 for r in results if r.get('static_refined'))} on static findings, before execution)")
+    # "exemplars" is set (maybe empty) for every use case looked up in an index
+    if any("exemplars" in r for r in results):
+        primed = [r for r in results if r.get("exemplars")]
+        print(f"Exemplars: {len(primed)}/{len(results)} use cases started from approved code of similar use cases")
+        # compare with the same lines of an earlier run; a resumed use case made no calls in this one
+        ran = [r for r in results if not r.get("resumed")]
+        for label, group in (("with exemplars", [r for r in ran if r.get("exemplars")]),
+                             ("without", [r for r in ran if not r.get("exemplars")])):
+            if group:
+                print(f"  {label}: {sum(r['refined'] for r in group) / len(group):.1f} refine rounds, "
+                      f"{sum(r.get('tokens', 0) for r in group) / len(group):.0f} LLM tokens per use case")
+    benched = [r for r in results if r.get("microbench")]
+    if benched:
+        print(f"Micro-benchmark: {sum(1 for r in benched if r['microbench']['breaches'])}/{len(benched)} "
+              f"use cases over a threshold when last reviewed")
+
+@traced("code_gen")
+def generate_code_from_sequences(seq_dir: Path, output_dir: Path, max_workers: int = DEFAULT_MAX_WORKERS,
+                                 candidates: int = DEFAULT_CANDIDATES,
+                                 refine_rounds: int = DEFAULT_REFINE_ROUNDS,
+                                 static_gate: bool = True,
+                                 exemplars: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Main orchestrator that demonstrates all 4 agentic patterns.
+
+    Use cases run concurrently on up to max_workers threads; each one's output is
+    printed as a single block when it finishes, followed by a summary table.
+    candidates > 1 generates that many coder candidates per use case (see process_use_case).
+    static_gate=False skips the static analysis of the coder's first draft.
+    exemplars is the index file of approved code used as few-shot context (agents/exemplars.py).
+    """
+    
     print(f"\n{'='*60}")
-    print("Code generation complete!")
+    print("Starting Code Generation Agent")
+    print(f"Sequence diagrams: {seq_dir}")
     print(f"Output directory: {output_dir}")
-    print(f"Generated {len(diagrams)} implementations")
     print('='*60)
+    
+    diagrams = load_sequence_diagrams(seq_dir)
+    if not diagrams:
+        print(f"[WARN] No sequence diagrams found in {seq_dir}")
+        return []
+    
+    # start the sandbox workers now so they are warm by the time the first code is ready
+    get_pool()
+
+    index = open_index(exemplars) if exemplars is not None else None
+    if index is not None:
+        print(f"[INFO] Exemplar index: {len(index.entries)} approved implementations in {index.path}")
 
+    workers = max(1, min(max_workers, len(diagrams)))
+    print(f"[INFO] Found {len(diagrams)} sequence diagrams to process ({workers} workers)\n")
+
+    started = time.perf_counter()
+    results: Dict[str, Dict[str, Any]] = {}
+    # use cases finished by an earlier, interrupted run are checkpointed (see agents/run_state.py)
+    state = current_run_state()
+    if state is not None:
+        for use_case in diagrams:
+            record = state.done_unit("code", use_case)
+            if record is not None:
+                print(f"[RESUME] {use_case}: done in an earlier run, keeping its files")
+                results[use_case] = {**record["result"], "resumed": True}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="codegen") as pool:
+        futures = {
+            pool.submit(copy_context().run, _process_buffered, use_case, diagram, output_dir,
+                        candidates, refine_rounds, static_gate, index): use_case
+            for use_case, diagram in diagrams.items() if use_case not in results
+        }
+        for future in as_completed(futures):
+            result, lines = future.result()
+            print_block(lines)
+            use_case = futures[future]
+            results[use_case] = result
+            if state is not None:
+                state.finish_unit("code", use_case, "done" if result["status"] == "ok" else "failed",
+                                  use_case_files(output_dir, use_case), result)
+    elapsed = time.perf_counter() - started
+
+    ordered = [results[name] for name in diagrams]
+    print_summary(ordered, elapsed)
+
+    generated = sum(1 for r in ordered if r["status"] == "ok")
+    print(f"\n{'='*60}")
+    print("Code generation complete!")
+    print(f"Output directory: {output_dir}")
+    print(f"Generated {generated}/{len(diagrams)} implementations")
+    print('='*60)
+    return ordered
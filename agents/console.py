@@ -0,0 +1,74 @@
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, List, Optional, TextIO
+
+# Console output for code that may run on worker threads.
+# Inside buffered_log() every log() line is collected instead of printed, so a worker's
+# output can be printed as one block when it finishes instead of interleaving with others.
+# Inside log_to_file() everything the context prints (print() included) goes to a file, so
+# pipelines running side by side in one process each get their own log.
+
+_buffer: ContextVar[Optional[List[str]]] = ContextVar("console_buffer", default=None)
+_print_lock = threading.Lock()
+_target: ContextVar[Optional[TextIO]] = ContextVar("console_target", default=None)
+
+
+def log(message: str = "") -> None:
+    """Prints a line, or appends it to the active buffer."""
+    buffer = _buffer.get()
+    if buffer is None:
+        with _print_lock:
+            print(message)
+    else:
+        buffer.append(message)
+
+
+@contextmanager
+def buffered_log() -> Iterator[List[str]]:
+    """Collects log() lines from this context (and contexts copied from it) into a list."""
+    lines: List[str] = []
+    token = _buffer.set(lines)
+    try:
+        yield lines
+    finally:
+        _buffer.reset(token)
+
+
+def print_block(lines: List[str]) -> None:
+    """Prints buffered lines together, without other threads' output in between."""
+    with _print_lock:
+        print("\n".join(lines))
+
+
+class _ContextStdout:
+    """sys.stdout replacement that writes to the current context's log file, if it has one."""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        return (_target.get() or self.stream).write(text)
+
+    def flush(self) -> None:
+        (_target.get() or self.stream).flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def log_to_file(path: Path) -> Iterator[None]:
+    """Sends this context's console output (and that of contexts copied from it) to path."""
+    with _print_lock:
+        if not isinstance(sys.stdout, _ContextStdout):
+            sys.stdout = _ContextStdout(sys.stdout)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", buffering=1) as f:
+        token = _target.set(f)
+        try:
+            yield
+        finally:
+            _target.reset(token)
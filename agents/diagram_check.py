@@ -0,0 +1,119 @@
+from typing import Callable, List, Optional, Tuple
+
+from agents import plantuml
+from agents.console import log
+from agents.structured import ask_plantuml
+from agents.tracing import span
+
+# Validators for LLM-written diagrams and the targeted re-prompt that goes with them.
+# Each validator diffs a parsed diagram against the hard requirements its stage puts in the
+# system prompt (the exact message lines and participant order of a sequence diagram, the
+# classes and associations of the class diagram) and returns one line per missing, extra or
+# misplaced element. repair() sends only those lines plus the current diagram back to the
+# model, which is a much shorter prompt than the original and leaves the correct parts alone.
+
+# corrective prompts per diagram before the caller falls back
+MAX_REPAIRS = 2
+
+def _message_key(message: plantuml.Message) -> Tuple[str, str, str, str]:
+    return message.source, message.arrow, message.target, " ".join(message.text.split())
+
+
+def _parse_lines(lines: List[str]) -> plantuml.Diagram:
+    return plantuml.parse("\n".join(["@startuml", *lines, "@enduml"]))
+
+
+def sequence_problems(diagram: plantuml.Diagram, expected_messages: List[str], participants: List[str],
+                      actors: Tuple[str, ...] = ("User",)) -> List[str]:
+    """What a sequence diagram lacks or has too much of, compared with its required lines."""
+    problems: List[str] = []
+    # the parser resolves aliases: participant "Maintenance DB" as DB is DB
+    declared = [(p.kind, p.name) for p in diagram.participants if p.declared]
+    kinds = dict((name, kind) for kind, name in declared)
+    for actor in actors:
+        if actor not in kinds:
+            problems.append(f"missing declaration: actor {actor}")
+        elif kinds[actor] != "actor":
+            problems.append(f"{actor} is declared as {kinds[actor]}, not as actor")
+    missing = [p for p in participants if p not in kinds]
+    problems += [f"missing declaration: participant {p}" for p in missing]
+    problems += [f"extra declaration: {kind} {name}" for kind, name in declared
+                 if name not in participants and name not in actors]
+    order = [name for _, name in declared if name in participants]
+    if not missing and order != [p for p in participants if p in order]:
+        problems.append(f"participants declared out of order (expected: {', '.join(participants)})")
+
+    expected = _parse_lines(expected_messages).messages
+    wanted = [_message_key(m) for m in expected]
+    present = [_message_key(m) for m in diagram.messages]
+    problems += [f"missing message: {m.to_plantuml()}" for m, key in zip(expected, wanted) if key not in present]
+    problems += [f"extra message: {m.to_plantuml()}" for m, key in zip(diagram.messages, present)
+                 if key not in wanted]
+    in_diagram = [key for key in present if key in wanted]
+    if in_diagram != [key for key in wanted if key in in_diagram]:
+        problems.append("messages out of order (expected order: "
+                        + " | ".join(m.to_plantuml() for m in expected) + ")")
+    return problems
+
+
+def _association_key(association: plantuml.Association) -> Tuple[str, ...]:
+    return (association.source, association.arrow, association.target, association.source_mult,
+            association.target_mult, " ".join(association.label.split()))
+
+
+def _reversed_key(association: plantuml.Association) -> Optional[Tuple[str, ...]]:
+    # a plain association reads the same both ways
+    if association.arrow not in ("--", ".."):
+        return None
+    return (association.target, association.arrow, association.source, association.target_mult,
+            association.source_mult, " ".join(association.label.split()))
+
+
+def class_problems(diagram: plantuml.Diagram, classes: List[str], associations: List[str]) -> List[str]:
+    """What a class diagram lacks or has too much of, compared with its required classes and associations."""
+    names = [c.name for c in diagram.classes]
+    problems = [f"missing class: {name}" for name in classes if name not in names]
+    problems += [f"extra class: {name}" for name in names if name not in classes]
+    present = set()
+    for association in diagram.associations:
+        present.add(_association_key(association))
+        present.add(_reversed_key(association))
+    for association in _parse_lines([f"class {name}" for name in classes] + associations).associations:
+        if _association_key(association) not in present:
+            problems.append(f"missing association: {association.to_plantuml()}")
+    return problems
+
+
+def repair_prompt(block: str, problems: List[str]) -> str:
+    return ("Current diagram:\n" + block + "\n\nProblems:\n" + "\n".join(f"- {p}" for p in problems)
+            + "\n\nFix exactly these problems and return the whole corrected diagram.")
+
+
+def repair(name: str, kind: str, block: str, check: Callable[[plantuml.Diagram], List[str]],
+           role: str) -> Tuple[str, List[str]]:
+    """Validates block and re-prompts with only its problems, up to MAX_REPAIRS times.
+
+    Returns the last block and the problems it still has (empty if it passed).
+    """
+    system_message = (
+        f"You correct PlantUML {kind} diagrams. Apply exactly the listed corrections: add what is "
+        "missing, remove what is extra, reorder what is out of order. Keep every other line unchanged. "
+        "Output ONLY the PlantUML block from @startuml to @enduml."
+    )
+    with span(f"validate:{name}", kind="step", repairs=0) as attrs:
+        diagram = plantuml.parse(block)
+        problems = check(diagram) if diagram is not None else ["no PlantUML block"]
+        attrs["problems"] = len(problems)
+        while problems and attrs["repairs"] < MAX_REPAIRS:
+            attrs["repairs"] += 1
+            log(f"[VALIDATE] {name}: {len(problems)} problem(s), asking for a correction "
+                f"({attrs['repairs']}/{MAX_REPAIRS}):\n" + "\n".join(f"  - {p}" for p in problems))
+            fixed = ask_plantuml(f"{name}_repair", system_message, repair_prompt(block, problems), role=role)
+            diagram = plantuml.parse(fixed) if fixed else None
+            if diagram is None:
+                continue
+            block, problems = fixed, check(diagram)
+        attrs["remaining"] = len(problems)
+    if not problems and attrs["repairs"]:
+        log(f"[VALIDATE] {name}: valid after {attrs['repairs']} correction(s)")
+    return block, problems
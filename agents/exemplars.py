@@ -0,0 +1,137 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from agents.plantuml import Diagram
+from agents.prompt_budget import fit_code
+from agents.static_check import message_method
+
+# Local index of approved implementations, used as few-shot context for the architect and coder.
+# When a use case ends approved (review or best-of-N tests), runs cleanly and passes its tests
+# and micro-benchmark, its final code is stored with the use case name and the structure of
+# its sequence diagram: the participants and the (source, target, method) edges of its request
+# messages. A new use case is matched against the index by TF-IDF cosine over the words of the
+# use case name, participants and message labels, blended with the Jaccard overlap of the
+# edges. No external service or embedding model; the index is one JSON file, by default
+# out_dir/exemplars.json, so later runs into the same directory reuse what earlier runs got
+# approved.
+
+EXEMPLAR_FILE = "exemplars.json"
+INDEX_VERSION = 1
+
+# weight of the term similarity; the rest is the edge overlap
+TERM_WEIGHT = 0.6
+
+
+def _words(text: str) -> List[str]:
+    """Lower-case words, with CamelCase and snake_case split: "MaintenanceDB" -> ["maintenance", "db"]."""
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", text))
+    return [word for word in re.split(r"[^a-z0-9]+", spaced.lower()) if len(word) > 1]
+
+
+def structure(diagram: Diagram) -> Dict[str, List[str]]:
+    """The parts of a sequence diagram that shape the code: participants and request edges."""
+    actors = set(diagram.actors)
+    edges = []
+    for message in diagram.messages:
+        if not message.is_reply and message.text and message.target not in actors:
+            edge = f"{message.source}->{message.target}.{message_method(message.text)}"
+            if edge not in edges:
+                edges.append(edge)
+    return {"participants": [p.name for p in diagram.participants if p.name not in actors], "edges": edges}
+
+
+def terms(use_case: str, shape: Dict[str, List[str]]) -> List[str]:
+    words = _words(use_case) * 2  # the use case name says the most about what the code does
+    for participant in shape["participants"]:
+        words += _words(participant)
+    for edge in shape["edges"]:
+        words += _words(edge.split(".", 1)[1])
+    return words
+
+
+def _jaccard(a: List[str], b: List[str]) -> float:
+    union = set(a) | set(b)
+    return len(set(a) & set(b)) / len(union) if union else 0.0
+
+
+class ExemplarIndex:
+    """Approved implementations on disk, searched by use case and diagram structure."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data["entries"]
+
+    def add(self, use_case: str, diagram: Diagram, code: str, **meta: Any) -> None:
+        """Stores approved code; replaces an earlier entry for the same use case and structure."""
+        shape = structure(diagram)
+        entry = {"use_case": use_case, **shape, "code": code, "approved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 **meta}
+        with self._lock:
+            self.entries = [e for e in self.entries
+                            if (e["use_case"], e["edges"]) != (use_case, shape["edges"])] + [entry]
+            tmp = self.path.with_suffix(".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "entries": self.entries}, indent=1),
+                           encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def search(self, use_case: str, diagram: Diagram, k: int = 2,
+               min_score: float = 0.0) -> List[Tuple[float, Dict[str, Any]]]:
+        """The k best (score, entry) pairs, best first; scores run from 0 to 1."""
+        with self._lock:
+            entries = list(self.entries)
+        if not entries:
+            return []
+        shape = structure(diagram)
+        docs = [Counter(terms(e["use_case"], e)) for e in entries]
+        # smoothed idf, so a word in every entry still counts a little
+        df = Counter(word for doc in docs for word in doc)
+        idf = {word: math.log((1 + len(docs)) / (1 + count)) + 1 for word, count in df.items()}
+
+        def vector(counts: Counter) -> Dict[str, float]:
+            return {word: count * idf.get(word, math.log(1 + len(docs)) + 1) for word, count in counts.items()}
+
+        def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+            dot = sum(weight * b.get(word, 0.0) for word, weight in a.items())
+            norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+            return dot / norm if norm else 0.0
+
+        query = vector(Counter(terms(use_case, shape)))
+        scored = [(TERM_WEIGHT * cosine(query, vector(doc)) + (1 - TERM_WEIGHT) * _jaccard(shape["edges"], e["edges"]),
+                   e) for doc, e in zip(docs, entries)]
+        scored.sort(key=lambda pair: -pair[0])
+        return [(round(score, 3), entry) for score, entry in scored[:k] if score >= min_score]
+
+
+def format_examples(matches: List[Tuple[float, Dict[str, Any]]], max_tokens: int) -> str:
+    """The matches as compact few-shot context, each shrunk by structure to its share of max_tokens."""
+    if not matches:
+        return ""
+    share = max_tokens // len(matches)
+    return "\n\n".join(f"# Approved implementation of \"{entry['use_case']}\" (similarity {score:.2f})\n"
+                       + fit_code(entry["code"], share) for score, entry in matches)
+
+
+_indexes: Dict[Path, ExemplarIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def open_index(path: Path) -> ExemplarIndex:
+    """The process-wide index for path, so concurrent pipelines sharing a file do not lose entries."""
+    key = Path(path).resolve()
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ExemplarIndex(key)
+        return _indexes[key]
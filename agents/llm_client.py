@@ -0,0 +1,320 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from agents.backend_pool import get_backend_pool
+from agents.console import log
+from agents.reply_cache import cache_key, get_reply_cache
+from agents.scheduler import BackendError, DeadlineExceeded, get_scheduler, is_retryable, priority_for
+from agents.tracing import estimate_tokens, span
+from agents.transcript import current_transcript
+from config.llm_config import get_llm_config
+
+# Shared entry point for every agent's LLM call.
+# - stream=False in the config: the call goes through an AutoGen ConversableAgent (original behavior)
+# - stream=True: the call is streamed straight from Ollama's /api/chat endpoint and generation
+#   is cancelled as soon as the block we asked for (PlantUML, fenced code or a JSON object) is complete
+
+
+class Cancelled(Exception):
+    """Raised by ask_agent when its cancel event was set before the reply was complete."""
+
+
+class BlockExtractor:
+    """Watches a streamed reply and reports when the requested block is complete.
+
+    mode="plantuml" stops after the first @enduml that follows an @startuml.
+    mode="code" stops at the closing ``` of the first fenced code block.
+    mode="json" stops when the first top-level JSON object closes (schema-constrained replies).
+    mode=None never stops early.
+    """
+
+    def __init__(self, mode: Optional[str] = None):
+        self.mode = mode
+        self.text = ""
+        self.done = False
+        self._scanned = 0      # everything before this offset has already been searched
+        self._start = -1       # offset just after @startuml / the opening fence line
+        self._depth = 0        # json: open braces and brackets
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """Appends a chunk and returns True once the block is complete."""
+        if self.done:
+            return True
+        self.text += chunk
+        if self.mode == "plantuml":
+            self.done = self._scan("@startuml", "@enduml", ignore_case=True)
+        elif self.mode == "code":
+            self.done = self._scan("```", "\n```", ignore_case=False, open_line=True)
+        elif self.mode == "json":
+            self.done = self._scan_json()
+        return self.done
+
+    def _scan_json(self) -> bool:
+        for pos in range(self._scanned, len(self.text)):
+            char = self.text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._start >= 0:
+                self._in_string = True
+            elif char in "{[":
+                if self._start < 0 and char == "{":
+                    self._start = pos
+                if self._start >= 0:
+                    self._depth += 1
+            elif char in "}]" and self._start >= 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._scanned = pos + 1
+                    return True
+        self._scanned = len(self.text)
+        return False
+
+    def _scan(self, open_marker: str, close_marker: str, ignore_case: bool, open_line: bool = False) -> bool:
+        haystack = self.text.lower() if ignore_case else self.text
+        # re-check a small overlap so markers split across chunks are still found
+        overlap = max(len(open_marker), len(close_marker))
+        begin = max(0, self._scanned - overlap)
+        self._scanned = len(haystack)
+
+        if self._start < 0:
+            pos = haystack.find(open_marker, begin)
+            if pos < 0:
+                return False
+            if open_line:
+                # the opening fence is only complete once its language tag line ends
+                eol = haystack.find("\n", pos)
+                if eol < 0:
+                    self._scanned = pos
+                    return False
+                self._start = eol
+            else:
+                self._start = pos + len(open_marker)
+            begin = self._start
+
+        return haystack.find(close_marker, max(begin, self._start)) >= 0
+
+    def block_text(self) -> str:
+        """Returns the text up to and including the closing marker (the whole text if not done)."""
+        if not self.done:
+            return self.text
+        if self.mode == "plantuml":
+            end = self.text.lower().find("@enduml", self._start) + len("@enduml")
+        elif self.mode == "json":
+            end = self._scanned
+        else:
+            end = self.text.find("\n```", self._start) + len("\n```")
+        return self.text[:end]
+
+
+def _stream_chat(name: str, system_msg: str, user_msg: str, llm_config: Dict[str, Any], cfg: Dict[str, Any],
+                 stop_on: Optional[str], cancel: Optional[threading.Event] = None,
+                 deadline: float = float("inf")) -> Tuple[str, Dict[str, Any]]:
+    """Streams a chat completion from the Ollama model in cfg and stops reading once the block is complete.
+
+    If cancel is set, the stream is closed at the next chunk and Cancelled is raised.
+    deadline (a time.perf_counter() value) caps socket timeouts and the stream itself.
+    """
+    import urllib.request  # ~30ms of http/email imports, only paid once a call is made
+
+    payload = {
+        "model": cfg["model"],
+        "messages": [
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_msg},
+        ],
+        "stream": True,
+        "options": {
+            "temperature": llm_config.get("temperature", 0.2),
+            "num_predict": llm_config.get("max_tokens", 4096),
+            "num_ctx": llm_config.get("context_window", 8192),
+        },
+    }
+    if llm_config.get("keep_alive") is not None:
+        payload["keep_alive"] = llm_config["keep_alive"]
+    if llm_config.get("format") is not None:
+        # a JSON schema (or "json") the reply is constrained to, see agents/structured.py
+        payload["format"] = llm_config["format"]
+    request = urllib.request.Request(
+        cfg["client_host"].rstrip("/") + "/api/chat",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+
+    extractor = BlockExtractor(stop_on)
+    started = time.perf_counter()
+    first_token = None
+    stopped_early = False
+    finished = False
+    usage: Dict[str, Any] = {}
+
+    # Closing the response closes the socket, which makes Ollama abort the generation.
+    timeout = max(0.1, min(llm_config.get("timeout", 120), deadline - started))
+    with urllib.request.urlopen(request, timeout=timeout) as resp:
+        for raw_line in resp:
+            if cancel is not None and cancel.is_set():
+                log(f"[LLM] {name}: cancelled after {time.perf_counter() - started:.2f}s")
+                raise Cancelled(name)
+            if time.perf_counter() > deadline:
+                raise DeadlineExceeded(f"{name}: deadline reached while streaming")
+            if not raw_line.strip():
+                continue
+            event = json.loads(raw_line)
+            if event.get("error"):
+                raise BackendError(f"Ollama error: {event['error']}")
+            chunk = event.get("message", {}).get("content", "")
+            if chunk and first_token is None:
+                first_token = time.perf_counter()
+            if extractor.feed(chunk):
+                stopped_early = not event.get("done", False)
+                finished = True
+                break
+            if event.get("done"):
+                finished = True
+                # only the final event carries Ollama's token counts
+                usage = {"prompt_tokens": event.get("prompt_eval_count"),
+                         "completion_tokens": event.get("eval_count"),
+                         # time Ollama spent loading the model for this call (a cold start)
+                         "load_s": round(event["load_duration"] / 1e9, 4) if event.get("load_duration") else None}
+                break
+    if not finished:
+        # the connection closed without a final event: a truncated reply must not pass as complete
+        raise BackendError(f"stream ended after {len(extractor.text)} chars without a final event")
+
+    total = time.perf_counter() - started
+    ttft = f"{first_token - started:.2f}s" if first_token is not None else "n/a"
+    suffix = " (stopped early)" if stopped_early else ""
+    log(f"[LLM] {name}: ttft={ttft} total={total:.2f}s chars={len(extractor.text)}{suffix}")
+    stats = {
+        "ttft_s": round(first_token - started, 4) if first_token is not None else None,
+        "stopped_early": stopped_early,
+        "completion_chars": len(extractor.text),
+        **{k: v for k, v in usage.items() if v is not None},
+    }
+    return extractor.block_text(), stats
+
+
+# the llm_config keys AutoGen understands; the rest (deadline, context_window, keep_alive,
+# structured, format, ...) only mean something to the streaming path and the pipeline
+AUTOGEN_CONFIG_KEYS = ("temperature", "timeout", "max_tokens", "cache_seed")
+
+
+def _autogen_chat(name: str, system_msg: str, user_msg: str, llm_config: Dict[str, Any],
+                  cfg: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Sends one message through an AutoGen ConversableAgent (non-streaming)."""
+    from autogen.agentchat import ConversableAgent
+
+    # one model at a time; ask_agent walks the fallback chain itself
+    autogen_config = {key: llm_config[key] for key in AUTOGEN_CONFIG_KEYS if key in llm_config}
+    agent = ConversableAgent(name=name, system_message=system_msg,
+                             llm_config={**autogen_config, "config_list": [cfg]})
+    started = time.perf_counter()
+    reply = agent.generate_reply(messages=[{"role": "user", "content": user_msg}])
+    total = time.perf_counter() - started
+
+    content = reply.get("content", "") if isinstance(reply, dict) else str(reply)
+    content = content or ""
+    # without streaming the first token only becomes visible with the full reply
+    log(f"[LLM] {name}: ttft={total:.2f}s total={total:.2f}s chars={len(content)}")
+    return content, {"ttft_s": round(total, 4), "stopped_early": False, "completion_chars": len(content)}
+
+
+def ask_agent(name: str, system_msg: str, user_msg: str, stop_on: Optional[str] = None,
+              llm_config: Optional[Dict[str, Any]] = None, role: Optional[str] = None,
+              cancel: Optional[threading.Event] = None) -> str:
+    """Creates an agent, sends a message, and returns the response content.
+
+    stop_on ("plantuml", "code" or "json") lets a streaming backend cancel generation as soon as
+    the requested block is complete. role selects the per-role model settings in
+    config/llm_config.py and groups calls per agent in the trace summary. If a model fails,
+    the next one in its config_list (the role's fallback chain) is tried.
+    Setting cancel (e.g. once another candidate won) abandons the call with Cancelled.
+
+    Every attempt goes through the shared scheduler (agents/scheduler.py): it waits for a
+    slot in role priority order, and transient failures are retried with backoff until the
+    config's deadline before the next fallback model is tried. Each attempt is sent to the
+    least-loaded healthy Ollama host (agents/backend_pool.py), so a retry can land elsewhere.
+    With the reply cache on (agents/reply_cache.py), an identical earlier or concurrent
+    call's reply is returned instead of generating again. A transcript activated for the run
+    (agents/transcript.py) records every reply, or serves them back without any backend.
+    """
+    llm_config = llm_config or get_llm_config(role)
+    if cancel is not None and cancel.is_set():
+        raise Cancelled(name)
+    cache = get_reply_cache()
+    transcript = current_transcript()
+    with span(f"llm:{name}", kind="llm", agent=role or name, model=llm_config["config_list"][0]["model"],
+              retries=0, fallbacks=0, cache_hit=False) as attrs:
+        if transcript is not None and transcript.mode == "replay":
+            content, stats = transcript.replay(name, system_msg, user_msg, stop_on, llm_config.get("format"))
+            attrs["replayed"] = True
+        elif cache.enabled:
+            (content, stats), hit = cache.fetch(cache_key(llm_config, system_msg, user_msg, stop_on),
+                                                lambda: _generate(name, system_msg, user_msg, stop_on, llm_config,
+                                                                  role, cancel, attrs))
+            if hit:
+                # nothing was sent to a backend
+                stats = {**stats, "prompt_tokens": 0, "completion_tokens": 0, "ttft_s": None}
+                attrs["cache_hit"] = True
+        else:
+            content, stats = _generate(name, system_msg, user_msg, stop_on, llm_config, role, cancel, attrs)
+        if transcript is not None and transcript.mode == "record":
+            transcript.record(name, role, system_msg, user_msg, stop_on, llm_config.get("format"), content, stats)
+        attrs.update(stats)
+        attrs["prompt_chars"] = len(system_msg) + len(user_msg)
+        # estimated when the backend did not report counts (e.g. the stream was cut short)
+        attrs.setdefault("prompt_tokens", estimate_tokens(system_msg) + estimate_tokens(user_msg))
+        attrs.setdefault("completion_tokens", estimate_tokens(content))
+    return content.strip()
+
+
+def rejects_format(exc: BaseException, llm_config: Dict[str, Any]) -> bool:
+    """True for an HTTP 400 to a request that carried a JSON-schema "format" (an Ollama without schema support)."""
+    return getattr(exc, "code", None) == 400 and llm_config.get("format") is not None
+
+
+def _generate(name: str, system_msg: str, user_msg: str, stop_on: Optional[str], llm_config: Dict[str, Any],
+              role: Optional[str], cancel: Optional[threading.Event], attrs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Generates a reply through the scheduler and backend pool, walking the model fallback chain."""
+    config_list = llm_config["config_list"]
+    scheduler = get_scheduler()
+    pool = get_backend_pool()
+    for position, cfg in enumerate(config_list):
+        def attempt(deadline: float, cfg: Dict[str, Any] = cfg) -> Tuple[str, Dict[str, Any]]:
+            backend = pool.acquire(needs_format=llm_config.get("format") is not None)
+            routed = {**cfg, "client_host": backend.url}
+            attrs["host"] = backend.url
+            try:
+                if cfg.get("stream"):
+                    result = _stream_chat(name, system_msg, user_msg, llm_config, routed, stop_on, cancel,
+                                          deadline)
+                else:
+                    result = _autogen_chat(name, system_msg, user_msg, llm_config, routed)
+            except Exception as e:
+                if rejects_format(e, llm_config):
+                    pool.reject_format(backend)
+                # only transport / server failures count against the host
+                pool.release(backend, False if is_retryable(e) else None)
+                raise
+            pool.release(backend, True, result[1].get("ttft_s"))
+            return result
+
+        try:
+            return scheduler.call(attempt, name, priority_for(role), llm_config.get("deadline"), stats=attrs)
+        except Cancelled:
+            raise
+        except Exception as e:
+            # another model on the same host would reject the schema too; ask_structured() falls back
+            if position == len(config_list) - 1 or rejects_format(e, llm_config):
+                raise
+            fallback = config_list[position + 1]["model"]
+            log(f"[LLM] {name}: {cfg['model']} failed ({e}), falling back to {fallback}")
+            attrs.update(model=fallback, fallbacks=position + 1)
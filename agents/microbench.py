@@ -0,0 +1,232 @@
+import contextlib
+import importlib.util
+import inspect
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# Micro-benchmark stage for generated implementations.
+# Executing a *_impl.py file only shows that its demo exits 0; this stage shows whether it
+# scales. In a sandbox worker (agents/sandbox.py) the implementation is imported as a module,
+# every public class is instantiated and every public method and top-level function is called
+# under a synthetic load: `records` calls spread over `vehicles` vehicle ids, with arguments
+# made up from the parameter names. Creating methods run first so the others see a filled
+# store. Per method it records ops/sec, the slowdown of the last quarter of the calls against
+# the first (a rewrite of the whole store on every call shows up here) and the peak memory
+# traced while it ran. breaches() compares that with the thresholds in
+# get_microbench_config(); the breaches go to the reviewer as review input.
+#
+# This file is also the script the worker runs: only stdlib imports at module level.
+
+JOB_FILE = "microbench_job.json"
+RESULT_FILE = "microbench_result.json"
+
+# method name prefixes: what creates data runs first, what deletes it runs last
+CREATE_PREFIXES = ("register", "add", "create", "log", "record", "save", "insert", "store", "schedule", "set")
+DELETE_PREFIXES = ("delete", "remove", "clear", "reset", "drop", "purge")
+
+# median call times below this are too small for the slowdown ratio to mean anything
+MIN_SLOW_CALL_S = 50e-6
+
+
+def _sample_record(vehicle_id: str, index: int) -> Dict[str, Any]:
+    return {
+        "vehicle_id": vehicle_id, "vin": vehicle_id, "make": "Toyota", "model": "Corolla", "year": 2020,
+        "mileage": 10000 + index, "date": "2024-06-01", "service_type": "oil change", "cost": 49.99,
+        "notes": "synthetic load", "record_id": f"R{index:06d}",
+    }
+
+
+def sample_arg(name: str, vehicle_id: str, index: int) -> Any:
+    """A plausible argument for a parameter, made up from its name."""
+    key = name.lower().replace("_", "")
+    if "vehicleid" in key or key in ("vin", "vid", "carid"):
+        return vehicle_id
+    if key.endswith("id"):
+        return f"R{index:06d}"
+    if "date" in key:
+        return "2024-06-01"
+    if any(word in key for word in ("mileage", "odometer", "miles", "km")):
+        return 10000 + index
+    if any(word in key for word in ("cost", "price", "amount")):
+        return 49.99
+    if any(word in key for word in ("months", "days", "interval", "count", "limit")):
+        return 6
+    if key == "year":
+        return 2020
+    if any(word in key for word in ("payload", "data", "record", "details", "info", "event", "entry",
+                                    "vehicle", "fields", "updates", "changes")):
+        return _sample_record(vehicle_id, index)
+    if any(word in key for word in ("type", "service", "kind", "category")):
+        return "oil change"
+    return "synthetic load"
+
+
+def _required(func: Callable) -> List[str]:
+    """Names of the parameters func cannot be called without (none if it has no usable signature)."""
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return []
+    return [p.name for p in params if p.default is p.empty and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+
+
+def _call_args(names: List[str], vehicle_id: str, index: int) -> Dict[str, Any]:
+    return {name: sample_arg(name, vehicle_id, index) for name in names}
+
+
+def _order(name: str) -> int:
+    lowered = name.lower()
+    if lowered.startswith(CREATE_PREFIXES):
+        return 0
+    return 2 if lowered.startswith(DELETE_PREFIXES) else 1
+
+
+def _targets(module: Any, notes: List[str]) -> List[Tuple[str, Callable]]:
+    """(qualified name, bound callable) for every public method and top-level function of module."""
+    targets: List[Tuple[str, Callable]] = []
+    for name, obj in vars(module).items():
+        if name.startswith("_") or getattr(obj, "__module__", None) != module.__name__:
+            continue
+        if inspect.isfunction(obj):
+            targets.append((name, obj))
+        elif inspect.isclass(obj) and not issubclass(obj, BaseException):
+            try:
+                instance = obj(**_call_args(_required(obj), "VH00000", 0))
+            except Exception as e:
+                notes.append(f"{name}: could not be instantiated ({type(e).__name__}: {e})")
+                continue
+            targets += [(f"{name}.{attr}", getattr(instance, attr)) for attr, member in vars(obj).items()
+                         if not attr.startswith("_") and inspect.isfunction(member)]
+    return sorted(targets, key=lambda target: _order(target[0].split(".")[-1]))
+
+
+def _bench_one(func: Callable, vehicles: int, records: int, budget_s: float) -> Dict[str, Any]:
+    times: List[float] = []
+    errors = 0
+    names = _required(func)
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for index in range(records):
+        kwargs = _call_args(names, f"VH{index % vehicles:05d}", index)
+        call_started = time.perf_counter()
+        try:
+            func(**kwargs)
+        except Exception:
+            errors += 1
+        times.append(time.perf_counter() - call_started)
+        if time.perf_counter() - started > budget_s:
+            break
+    seconds = sum(times)
+    # medians, so one pause (GC, a busy CPU) does not read as a slowdown
+    quarter = max(1, len(times) // 4)
+    first, last = statistics.median(times[:quarter]), statistics.median(times[-quarter:])
+    return {
+        "calls": len(times),
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(len(times) / seconds, 1) if seconds else None,
+        "slowdown": round(last / first, 2) if first and last >= MIN_SLOW_CALL_S and len(times) >= 8 else None,
+        "peak_kb": round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1),
+        "truncated": len(times) < records,
+    }
+
+
+def benchmark(impl_path: Path, vehicles: int, records: int, method_budget_s: float,
+              total_budget_s: float) -> Dict[str, Any]:
+    """Imports impl_path (its __main__ block does not run) and benchmarks its public callables."""
+    report: Dict[str, Any] = {"vehicles": vehicles, "records": records, "methods": [], "notes": []}
+    sys.path.insert(0, str(impl_path.parent))
+    spec = importlib.util.spec_from_file_location(impl_path.stem, impl_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[impl_path.stem] = module
+    tracemalloc.start()
+    started = time.perf_counter()
+    # whatever the implementation prints under load is not part of the result
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            spec.loader.exec_module(module)
+        except Exception as e:
+            report["error"] = f"import failed: {type(e).__name__}: {e}"
+            return report
+        for name, func in _targets(module, report["notes"]):
+            remaining = total_budget_s - (time.perf_counter() - started)
+            if remaining <= 0:
+                report["notes"].append(f"{name}: not run (time budget used up)")
+                continue
+            report["methods"].append({"name": name, **_bench_one(func, vehicles, records,
+                                                                   min(method_budget_s, remaining))})
+    return report
+
+
+def run_microbench(impl_path: Path, pool: Any, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmarks impl_path in a sandbox worker of pool (agents/sandbox.py); returns the report."""
+    with tempfile.TemporaryDirectory(prefix="microbench_") as workdir:
+        job = {key: config[key] for key in ("vehicles", "records", "method_budget_s", "total_budget_s")}
+        job["impl"] = str(Path(impl_path).resolve())
+        Path(workdir, JOB_FILE).write_text(json.dumps(job), encoding="utf-8")
+        # the worker's own CPU limit stops runaway code; this is the wall-clock limit
+        stdout, stderr, returncode = pool.run(Path(__file__), timeout=int(config["total_budget_s"]) + 5,
+                                              cwd=Path(workdir))
+        result = Path(workdir, RESULT_FILE)
+        if returncode != 0 or not result.exists():
+            return {"methods": [], "notes": [], "error": (stderr.strip().splitlines() or [f"exit {returncode}"])[-1]}
+        return json.loads(result.read_text(encoding="utf-8"))
+
+
+def breaches(report: Dict[str, Any], config: Dict[str, Any]) -> List[str]:
+    """Methods over a threshold, one line each; methods that only raised are not judged."""
+    problems = []
+    load = f"{report.get('vehicles')} vehicles x {report.get('records')} records"
+    for method in report.get("methods", []):
+        if method["errors"] == method["calls"]:
+            continue
+        found = []
+        if method["ops_per_sec"] is not None and method["ops_per_sec"] < config["min_ops_per_sec"]:
+            found.append(f"{method['ops_per_sec']:.0f} ops/sec (minimum {config['min_ops_per_sec']})")
+        if method["slowdown"] is not None and method["slowdown"] > config["max_slowdown"]:
+            found.append(f"calls got {method['slowdown']:.1f}x slower as data grew (maximum {config['max_slowdown']}x)")
+        if method["peak_kb"] > config["max_peak_mb"] * 1024:
+            found.append(f"peak memory {method['peak_kb'] / 1024:.1f} MB (maximum {config['max_peak_mb']} MB)")
+        if found:
+            problems.append(f"{method['name']}: " + ", ".join(found) + f" under {load}")
+    return problems
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """The report as a table for the log."""
+    if report.get("error"):
+        return f"micro-benchmark failed: {report['error']}"
+    lines = [f"{'Method':<45} {'Calls':>6} {'Ops/sec':>10} {'Slowdown':>9} {'Peak KB':>9}"]
+    for m in report["methods"]:
+        slowdown = f"{m['slowdown']:.1f}x" if m["slowdown"] is not None else "-"
+        ops = f"{m['ops_per_sec']:.0f}" if m["ops_per_sec"] is not None else "-"
+        errors = f" ({m['errors']} raised)" if m["errors"] else ""
+        lines.append(f"{m['name'][:45]:<45} {m['calls']:>6} {ops:>10} {slowdown:>9} {m['peak_kb']:>9.1f}{errors}")
+    return "\n".join(lines + report.get("notes", []))
+
+
+def _main() -> int:
+    # sandbox worker: the job is in the working directory; a path argument runs it by hand
+    if sys.argv[1:]:
+        job = {"impl": sys.argv[1], "vehicles": 100, "records": 1000, "method_budget_s": 1.0, "total_budget_s": 10.0}
+    else:
+        job = json.loads(Path(JOB_FILE).read_text(encoding="utf-8"))
+    report = benchmark(Path(job["impl"]).resolve(), job["vehicles"], job["records"], job["method_budget_s"],
+                       job["total_budget_s"])
+    if sys.argv[1:]:
+        print(format_report(report))
+    else:
+        Path(RESULT_FILE).write_text(json.dumps(report), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
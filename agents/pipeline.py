@@ -0,0 +1,235 @@
+import importlib
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from agents.exemplars import EXEMPLAR_FILE
+from agents.run_state import RUN_STATE_FILE, RunState, activate
+from agents.tracing import span, start_trace
+from agents.transcript import Transcript, activate as activate_transcript, current_transcript
+from config.llm_config import get_exemplar_config, get_warmup_config
+
+# Library entry point for the pipeline.
+# run_pipeline() runs every stage for one system summary into its own output tree. Stages
+# are coroutines on the caller's event loop; the blocking agent code runs in worker threads
+# via asyncio.to_thread. Everything that belongs to one run (paths, trace, run state) lives
+# on the Pipeline object or in the task's context variables, so several pipelines can be
+# awaited concurrently in one process. What they share on purpose is the LLM client: the
+# scheduler's concurrency budget, the backend pool and the sandbox workers.
+# asyncio (~50ms of imports with ssl) is only imported inside the coroutines, so the CLI's
+# `python main.py stages` and the import profile stay fast.
+
+# Pipeline stages in run order: name -> (agent module, stage function).
+# Agent modules are only imported when one of their stages is selected.
+# "test" only runs the generated scripts; every other stage calls the LLM.
+STAGES: Dict[str, Tuple[str, str]] = {
+    "usecase": ("agents.uc_diagram_agent", "generate_use_case_diagram"),
+    "specs": ("agents.uc_specs_agent", "generate_use_case_specs"),
+    "seq": ("agents.seq_diagram_agent", "generate_seq_diagram"),
+    "class": ("agents.class_diagram_agent", "generate_class_diagram"),
+    "code": ("agents.code_gen_agent", "generate_code_from_sequences"),
+    "test": ("agents.test_runner", "run_generated_tests"),
+}
+
+SUMMARY_FILE = "system_summary.txt"
+CLASS_DIAGRAM_FILE = "class_diagram.puml"
+TRACE_DIR = "trace"
+
+# (module, seconds) for every agent module imported by load_stage()
+IMPORT_PROFILE: List[Tuple[str, float]] = []
+
+
+def load_stage(name: str) -> Callable:
+    """Imports the agent module for a stage on first use and returns its stage function."""
+    module_name, func_name = STAGES[name]
+    if module_name not in sys.modules:
+        started = time.perf_counter()
+        importlib.import_module(module_name)
+        IMPORT_PROFILE.append((module_name, time.perf_counter() - started))
+    return getattr(sys.modules[module_name], func_name)
+
+
+class PipelineOptions(NamedTuple):
+    stages: Optional[Sequence[str]] = None  # all stages if None
+    seq_mode: str = "template"              # "template" (no LLM), "hybrid" or "llm"
+    candidates: int = 1                     # best-of-N coder candidates per use case
+    refine_rounds: int = 1                  # max reviewer -> refine rounds
+    resume: bool = False                    # skip what an earlier run of the same summary finished
+    warmup: Optional[bool] = None           # load the models in the background first (None: config default)
+    record: Optional[Path] = None           # write every LLM request and reply to this transcript
+    replay: Optional[Path] = None           # serve LLM replies from this transcript instead of a backend
+    exemplars: Union[Path, bool, None] = None  # index of approved code, or False for none (None: config default)
+
+
+class Pipeline:
+    """The stages, paths and checkpoints of one run: summary file in, out_dir tree out."""
+
+    def __init__(self, summary_path: Path, out_dir: Path, options: Optional[PipelineOptions] = None):
+        self.options = options or PipelineOptions()
+        self.summary_path = summary_path
+        self.out_dir = out_dir
+        self.stages = list(self.options.stages or STAGES)
+        self.funcs: Dict[str, Callable] = {}
+
+        diagrams_dir = out_dir / "diagrams"
+        specs_dir = out_dir / "specs"
+        seq_dir = diagrams_dir / "sequence"
+        code_dir = out_dir / "code"
+        report_dir = out_dir / "test_report"
+        for directory in (diagrams_dir, specs_dir, seq_dir, code_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        uc_diagram_file = diagrams_dir / "use_case_diagram.puml"  # .puml is the PlantUML extension
+        uc_specs_file = specs_dir / "use_case_specs.md"
+        class_diagram_file = diagrams_dir / CLASS_DIAGRAM_FILE
+        self.stage_args: Dict[str, Tuple[Any, ...]] = {
+            "usecase": (summary_path, uc_diagram_file),
+            "specs": (uc_diagram_file, uc_specs_file),
+            "seq": (uc_specs_file, seq_dir),
+            "class": (uc_specs_file, class_diagram_file),
+            # Generate executable Python code from sequence diagrams
+            # Demonstrates all 4 agentic patterns:
+            # 1) Tool-based agents (date calculation functions)
+            # 2) Coding agents (generates and executes Python code)
+            # 3) Multi-agent collaboration (Architect -> Coder -> Tester)
+            # 4) Observer/reflection (Reviewer agent provides feedback, Coder refines)
+            "code": (seq_dir, code_dir),
+            # run the Tester agent's scripts in parallel; report.json + junit.xml
+            "test": (code_dir, report_dir),
+        }
+        self.stage_kwargs: Dict[str, Dict[str, Any]] = {
+            "seq": {"mode": self.options.seq_mode},
+            "code": {"candidates": self.options.candidates, "refine_rounds": self.options.refine_rounds,
+                     "exemplars": self._exemplar_index()},
+        }
+        # files each stage leaves behind, recorded with their hashes in the run state
+        self.stage_outputs: Dict[str, Callable[[], List[Path]]] = {
+            "usecase": lambda: [uc_diagram_file],
+            "specs": lambda: [uc_specs_file],
+            "seq": lambda: sorted(seq_dir.glob("*.puml")),
+            "class": lambda: [class_diagram_file],
+            "code": lambda: sorted(code_dir.glob("*_impl.py")),
+            "test": lambda: sorted(report_dir.glob("*")),
+        }
+        self.state = self._load_state()
+
+    def _exemplar_index(self) -> Optional[Path]:
+        # an explicit option wins over EXEMPLARS / EXEMPLAR_INDEX, like warmup does over LLM_WARMUP
+        if self.options.exemplars is False:
+            return None
+        if isinstance(self.options.exemplars, Path):
+            return self.options.exemplars
+        config = get_exemplar_config()
+        if not config["enabled"] and self.options.exemplars is None:
+            return None
+        return Path(config["path"] or self.out_dir / EXEMPLAR_FILE)
+
+    def _load_state(self) -> RunState:
+        # checkpoints from an earlier run only count if it read the same summary
+        state = RunState.load(self.out_dir / RUN_STATE_FILE)
+        if not state.matches_input(self.summary_path):
+            if self.options.resume:
+                print("[RESUME] No checkpoint for this summary, starting from the beginning")
+            state = RunState(state.path)
+            state.set_input(self.summary_path)
+        order = list(STAGES)
+        self.done: List[str] = []
+        if self.options.resume:
+            first = state.first_incomplete(self.stages)
+            self.done = self.stages[:self.stages.index(first)] if first else list(self.stages)
+            # the first unfinished stage keeps its per-use-case records; everything after it reruns
+            state.forget(order[order.index(first) + 1:] if first else [])
+        else:
+            state.forget(order[order.index(self.stages[0]):])
+        return state
+
+    def _warmup_enabled(self) -> bool:
+        if self.options.replay is not None:
+            return False  # no backend is contacted
+        if self.options.warmup is not None:
+            return self.options.warmup
+        # nothing to warm up if the stages left to run make no LLM calls
+        return get_warmup_config()["enabled"] and any(name not in self.done and name != "test"
+                                                      for name in self.stages)
+
+    async def run_stage(self, name: str) -> None:
+        """Runs one stage in a worker thread (with this task's trace and run state) and checkpoints it."""
+        import asyncio
+
+        if name in self.done:
+            print(f"[RESUME] Stage {name} done in an earlier run, skipping")
+            return
+        await asyncio.to_thread(self.funcs[name], *self.stage_args[name], **self.stage_kwargs.get(name, {}))
+        self.state.finish_stage(name, self.stage_outputs[name]())
+
+    async def run(self) -> Dict[str, Any]:
+        """Runs the selected stages in order; returns the trace summary.
+
+        Activates this pipeline's trace, run state and transcript in the current context, so it
+        should run in a task of its own (run_pipeline_file() takes care of that). A replayed run
+        raises TranscriptMismatch at the end if its prompts differ from the transcript.
+        """
+        import asyncio
+
+        activate(self.state)
+        if self.options.record is not None or self.options.replay is not None:
+            mode = "replay" if self.options.replay is not None else "record"
+            activate_transcript(Transcript(self.options.replay or self.options.record, mode))
+        # every stage and LLM call is recorded as a span; see <out_dir>/trace/
+        trace = start_trace()
+        with span("pipeline", kind="pipeline"):
+            warmup = None
+            if self._warmup_enabled():
+                from agents.warmup import warm_up
+
+                # models load while the agent modules are imported and the first stages run
+                warmup = asyncio.create_task(asyncio.to_thread(warm_up))
+            try:
+                self.funcs = {name: load_stage(name) for name in self.stages}
+                for name in self.stages:
+                    await self.run_stage(name)
+            except BaseException:
+                if warmup is not None:
+                    # the warm-up thread cannot be interrupted; let it finish so no task is left
+                    # behind, and report the stage's error rather than the warm-up's
+                    await asyncio.gather(warmup, return_exceptions=True)
+                raise
+            if warmup is not None:
+                await warmup
+
+        trace_dir = self.out_dir / TRACE_DIR
+        summary = trace.write(trace_dir)
+        trace.print_report()
+        print(f"[OK] Trace written to: {trace_dir}")
+        transcript = current_transcript()
+        if transcript is not None:
+            if transcript.mode == "record":
+                print(f"[OK] Transcript written to: {transcript.path}")
+            transcript.check()
+        return summary
+
+
+async def run_pipeline_file(summary_path: Path, out_dir: Path,
+                            options: Optional[PipelineOptions] = None) -> Dict[str, Any]:
+    """Runs the pipeline for a summary file into out_dir; returns the trace summary."""
+    import asyncio
+
+    # a task of its own gets a copy of the context, so the trace and run state activated by
+    # run() never leak into the caller, even when it awaits several pipelines in one task
+    return await asyncio.create_task(Pipeline(summary_path, out_dir, options).run())
+
+
+async def run_pipeline(summary_text: str, out_dir: Path, options: Optional[PipelineOptions] = None) -> Dict[str, Any]:
+    """Runs the pipeline for a system summary given as text; returns the trace summary.
+
+    The summary is saved as out_dir/system_summary.txt, so the output tree is self-contained
+    and resume=True works across calls. Pipelines for different out_dirs can run concurrently:
+
+        summaries = await asyncio.gather(*(run_pipeline(text, Path(f"out/{name}")) for name, text in inputs))
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary_path = out_dir / SUMMARY_FILE
+    if not summary_path.exists() or summary_path.read_text(encoding="utf-8") != summary_text:
+        summary_path.write_text(summary_text, encoding="utf-8")
+    return await run_pipeline_file(summary_path, out_dir, options)
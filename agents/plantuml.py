@@ -0,0 +1,241 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Single-pass PlantUML tokenizer/parser shared by the diagram and code-gen agents.
+# Every line is matched once against one compiled pattern and dispatched on the group that
+# matched. Relations (A -> B : text, A "1" -- "*" B, User --> (Use Case)) are parsed the same
+# way and then interpreted according to the diagram kind: messages in a sequence diagram,
+# associations in a class diagram, actor/use-case links in a use case diagram.
+
+_BLOCK_RE = re.compile(r"@startuml\b[\s\S]*?@enduml\b", re.I)
+
+_NAME = r'"[^"]+"|\([^)]*\)|[\w.]+'
+_ARROW = r"(?:<\|?|\*|o(?!\w)|\#)?[.\-]{1,2}(?:\|>|>>?|\*|o(?!\w)|\#)?"
+
+_LINE_RE = re.compile(
+    rf"""^\s*(?:
+        (?P<start>@startuml\b.*)
+      | (?P<end>@enduml\b.*)
+      | (?P<comment>'.*)
+      | (?P<note_start>note\b(?!.*:).*)
+      | (?P<layout>(?:left\s+to\s+right|top\s+to\s+bottom)\s+direction|skinparam\b.*|scale\b.*)
+      | (?P<decl_kind>actor|participant|boundary|control|entity|database|collections|queue)\s+
+            (?P<decl_name>{_NAME})(?:\s+as\s+(?P<decl_alias>[\w.]+))?.*
+      | (?P<class_kind>abstract\s+class|abstract|class|interface|enum)\s+
+            (?P<class_name>"[^"]+"|[\w.]+)[^{{]*?(?P<class_open>\{{)?
+      | (?P<usecase_decl>(?:usecase\s+(?P<usecase_name>{_NAME})|\((?P<usecase_paren>[^)]*)\))
+            (?:\s+as\s+(?P<usecase_alias>[\w.]+))?)
+      | (?P<rel_src>{_NAME})\s*(?:"(?P<rel_src_mult>[^"]*)"\s*)?
+            (?P<rel_arrow>{_ARROW})
+            \s*(?:"(?P<rel_dst_mult>[^"]*)"\s*)?(?P<rel_dst>{_NAME})
+            \s*(?::\s*(?P<rel_text>.*))?
+      | (?P<close>\}})
+    )\s*$""",
+    re.X | re.I,
+)
+
+
+def _clean(name: str) -> str:
+    return name.strip().strip('"').strip("()").strip()
+
+
+def _reverse_arrow(arrow: str) -> str:
+    """The same arrow written from the other end: "<--" -> "-->", "<|--" -> "--|>"."""
+    swap = {"<": ">", ">": "<", "<|": "|>", "|>": "<|"}
+    head = re.match(r"<\|?|\*|o|\#", arrow)
+    tail = re.search(r"(?:\|>|>>?|\*|o|\#)$", arrow)
+    start = head.group(0) if head else ""
+    end = tail.group(0) if tail and tail.start() >= len(start) else ""
+    line = arrow[len(start):len(arrow) - len(end)]
+    return swap.get(end, end[::-1]) + line + swap.get(start, start)
+
+
+@dataclass
+class Participant:
+    name: str
+    kind: str = "participant"
+    declared: bool = True  # False if it only appears in messages or links
+
+
+@dataclass
+class Message:
+    source: str
+    target: str
+    arrow: str
+    text: str = ""
+
+    @property
+    def is_reply(self) -> bool:
+        return self.arrow.startswith("--")
+
+    def to_plantuml(self) -> str:
+        return f"{self.source} {self.arrow} {self.target}: {self.text}" if self.text else \
+            f"{self.source} {self.arrow} {self.target}"
+
+
+@dataclass
+class UmlClass:
+    name: str
+    kind: str = "class"
+    attributes: List[str] = field(default_factory=list)
+    methods: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Association:
+    source: str
+    target: str
+    arrow: str
+    source_mult: str = ""
+    target_mult: str = ""
+    label: str = ""
+
+    def to_plantuml(self) -> str:
+        left = f'{self.source} "{self.source_mult}"' if self.source_mult else self.source
+        right = f'"{self.target_mult}" {self.target}' if self.target_mult else self.target
+        return f"{left} {self.arrow} {right}" + (f" : {self.label}" if self.label else "")
+
+
+@dataclass
+class Diagram:
+    kind: str = "unknown"  # "sequence", "class", "usecase" or "unknown"
+    participants: List[Participant] = field(default_factory=list)
+    messages: List[Message] = field(default_factory=list)
+    use_cases: List[str] = field(default_factory=list)
+    links: List[Association] = field(default_factory=list)
+    classes: List[UmlClass] = field(default_factory=list)
+    associations: List[Association] = field(default_factory=list)
+    body: List[str] = field(default_factory=list)  # source lines minus @start/@end and layout directives
+
+    @property
+    def actors(self) -> List[str]:
+        return [p.name for p in self.participants if p.kind == "actor"]
+
+    def participant(self, name: str) -> Optional[Participant]:
+        return next((p for p in self.participants if p.name == name), None)
+
+    def to_plantuml(self) -> str:
+        """Re-renders the diagram as a clean block (layout directives dropped)."""
+        return "\n".join(["@startuml", *self.body, "@enduml"])
+
+    def compact(self) -> str:
+        """Short structured form for prompts: only the parts the agents act on."""
+        if self.kind == "sequence":
+            used = {m.source for m in self.messages} | {m.target for m in self.messages}
+            names = [f"{p.name}(actor)" if p.kind == "actor" else p.name
+                     for p in self.participants if p.name in used]
+            lines = [f"Participants: {', '.join(names)}", "Messages:"]
+            lines += [f"{i}. {m.to_plantuml()}" for i, m in enumerate(self.messages, 1)]
+            return "\n".join(lines)
+        if self.kind == "class":
+            lines = []
+            for c in self.classes:
+                members = "; ".join(c.attributes + c.methods)
+                lines.append(f"{c.kind} {c.name}" + (f": {members}" if members else ""))
+            lines += [a.to_plantuml() for a in self.associations]
+            return "\n".join(lines)
+        if self.kind == "usecase":
+            return "\n".join([f"Actors: {', '.join(self.actors)}"] +
+                             [f"{l.source} -> ({l.target})" for l in self.links])
+        return "\n".join(self.body)
+
+
+def extract_block(text: str) -> Optional[str]:
+    """Returns the first @startuml ... @enduml block in text, or None."""
+    m = _BLOCK_RE.search(text)
+    return m.group(0).strip() if m else None
+
+
+def extract_blocks(text: str) -> List[str]:
+    return [m.group(0).strip() for m in _BLOCK_RE.finditer(text)]
+
+
+def parse(text: str) -> Optional[Diagram]:
+    """Parses the first PlantUML block in text. Returns None if there is no block."""
+    block = extract_block(text)
+    if block is None:
+        return None
+
+    diagram = Diagram()
+    relations: List[Association] = []
+    declared = {}
+    aliases = {}  # use case alias -> name: usecase (Register) as UC1
+    current_class: Optional[UmlClass] = None
+    in_note = False
+
+    def add_participant(name: str, kind: str, explicit: bool = True) -> None:
+        if name not in declared:
+            declared[name] = Participant(name, kind, explicit)
+            diagram.participants.append(declared[name])
+
+    for raw in block.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if in_note:
+            diagram.body.append(raw.rstrip())
+            in_note = not re.match(r"end\s*note\b", line, re.I)
+            continue
+        if current_class is not None:
+            if line == "}":
+                current_class = None
+                diagram.body.append(raw.rstrip())
+                continue
+            (current_class.methods if "(" in line else current_class.attributes).append(line)
+            diagram.body.append(raw.rstrip())
+            continue
+
+        m = _LINE_RE.match(line)
+        if m is None:
+            diagram.body.append(raw.rstrip())  # unknown statement (alt/else/activate/...), kept verbatim
+            continue
+        if m.group("start") or m.group("end") or m.group("layout"):
+            continue
+        diagram.body.append(raw.rstrip())
+
+        if m.group("note_start"):
+            in_note = True
+        elif m.group("decl_kind"):
+            add_participant(m.group("decl_alias") or _clean(m.group("decl_name")), m.group("decl_kind").lower())
+        elif m.group("class_kind"):
+            uml_class = UmlClass(_clean(m.group("class_name")), m.group("class_kind").lower().split()[-1])
+            diagram.classes.append(uml_class)
+            if m.group("class_open"):
+                current_class = uml_class
+        elif m.group("usecase_decl"):
+            name = _clean(m.group("usecase_name") or m.group("usecase_paren") or "")
+            if name and name not in diagram.use_cases:
+                diagram.use_cases.append(name)
+            if name and m.group("usecase_alias"):
+                aliases[m.group("usecase_alias")] = name
+        elif m.group("rel_arrow"):
+            src, dst = m.group("rel_src"), m.group("rel_dst")
+            relations.append(Association(
+                _clean(src), _clean(dst), m.group("rel_arrow"),
+                m.group("rel_src_mult") or "", m.group("rel_dst_mult") or "", (m.group("rel_text") or "").strip()))
+            for end in (src, dst):
+                if end.startswith("(") and _clean(end) not in diagram.use_cases:
+                    diagram.use_cases.append(_clean(end))
+
+    if diagram.classes:
+        diagram.kind = "class"
+        diagram.associations = relations
+    elif diagram.use_cases:
+        diagram.kind = "usecase"
+        for link in relations:
+            link.source, link.target = aliases.get(link.source, link.source), aliases.get(link.target, link.target)
+            # every link reads actor -> use case, whichever way round it was written
+            if link.source in diagram.use_cases and link.target not in diagram.use_cases:
+                link.source, link.target = link.target, link.source
+                link.source_mult, link.target_mult = link.target_mult, link.source_mult
+                link.arrow = _reverse_arrow(link.arrow)
+            add_participant(link.source, "actor", explicit=False)
+        diagram.links = relations
+    elif relations:
+        diagram.kind = "sequence"
+        for rel in relations:
+            diagram.messages.append(Message(rel.source, rel.target, rel.arrow, rel.label))
+            add_participant(rel.source, "participant", explicit=False)
+            add_participant(rel.target, "participant", explicit=False)
+    return diagram
@@ -0,0 +1,200 @@
+import ast
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from agents.tracing import estimate_tokens as count_tokens, span
+from config.llm_config import get_llm_config
+
+# Builds agent prompts within the model's context window instead of pasting artifacts verbatim.
+# Parts are first compacted losslessly-ish (boilerplate stripped, only relevant spec sections),
+# then, if the prompt still does not fit, the largest parts are shrunk structure-aware: code
+# loses comments, then long function bodies, then everything but signatures; text is cut at
+# line boundaries. Every build is recorded as a "prompt" span with the tokens it saved.
+
+# tokens kept free for the chat template and counting error
+SAFETY_MARGIN = 256
+
+# spec fields that add nothing for diagram/code agents (the actor is always User)
+SPEC_BOILERPLATE_FIELDS = ("primary actor", "use case name")
+
+
+def input_budget(llm_config: Optional[Dict[str, Any]] = None, system_msg: str = "") -> int:
+    """Tokens available for the user prompt: context window minus reply, system prompt and margin."""
+    cfg = llm_config or get_llm_config()
+    context = cfg.get("context_window", 8192)
+    return max(256, context - cfg.get("max_tokens", 4096) - count_tokens(system_msg) - SAFETY_MARGIN)
+
+
+def strip_boilerplate(text: str) -> str:
+    """Drops markdown emphasis, HTML comments, trailing spaces and repeated blank lines."""
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)
+    text = re.sub(r"[ \t]+$", "", text, flags=re.M)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def compact_specs(specs: str, names: Optional[Sequence[str]] = None,
+                  drop_fields: Sequence[str] = SPEC_BOILERPLATE_FIELDS) -> str:
+    """Keeps only the spec sections for `names` (all if None), minus the fields in drop_fields."""
+    kept: List[str] = []
+    keep_section = names is None
+    dropping = False
+    for line in specs.splitlines():
+        heading = re.match(r"^\s*#{1,3}\s+(.+?)\s*$", line)
+        if heading:
+            keep_section = names is None or any(n.lower() == heading.group(1).lower() for n in names)
+            dropping = False
+        elif re.match(r"^\s*[-*]\s*\*\*", line):
+            # a new "- **Field:** value" line; its indented items follow it
+            field = re.sub(r"[^a-z /]", "", line.lower()).strip()
+            dropping = any(field.startswith(f) for f in drop_fields)
+        if keep_section and not dropping:
+            kept.append(line)
+    return strip_boilerplate("\n".join(kept))
+
+
+def _strip_comments(code: str) -> str:
+    lines = [ln for ln in code.splitlines() if not re.match(r"^\s*#", ln)]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _collapse_bodies(code: str, tree: ast.Module, max_body_lines: int) -> str:
+    """Replaces long function bodies with their docstring line plus '...'."""
+    lines = code.splitlines()
+    cuts: List[Tuple[int, int, str]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            first, last = node.body[0].lineno, node.end_lineno or node.body[-1].lineno
+            if last - first + 1 <= max_body_lines:
+                continue
+            indent = " " * node.body[0].col_offset
+            doc = ast.get_docstring(node)
+            stub = f'{indent}"""{doc.splitlines()[0]}"""\n{indent}...' if doc else f"{indent}..."
+            cuts.append((first, last, stub))
+        elif isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+            first, last = node.body[0].lineno, node.end_lineno or node.body[-1].lineno
+            if last - first + 1 > max_body_lines:
+                cuts.append((first, last, " " * node.body[0].col_offset + "...  # demo omitted"))
+    # apply outermost cuts only, bottom-up so line numbers stay valid
+    cuts.sort()
+    outer: List[Tuple[int, int, str]] = []
+    for cut in cuts:
+        if not outer or cut[0] > outer[-1][1]:
+            outer.append(cut)
+    for first, last, stub in reversed(outer):
+        lines[first - 1:last] = stub.splitlines()
+    return "\n".join(lines)
+
+
+def _signatures(tree: ast.Module) -> str:
+    """Outline: imports, class lines, def signatures and top-level assignments."""
+    out: List[str] = []
+
+    def visit(nodes: List[ast.stmt], indent: str) -> None:
+        for node in nodes:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                out.append(indent + ast.unparse(node))
+            elif isinstance(node, ast.ClassDef):
+                bases = f"({', '.join(ast.unparse(b) for b in node.bases)})" if node.bases else ""
+                out.append(f"{indent}class {node.name}{bases}:")
+                visit(node.body, indent + "    ")
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+                out.append(f"{indent}def {node.name}({ast.unparse(node.args)}){returns}: ...")
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and indent == "":
+                out.append(ast.unparse(node)[:120])
+
+    visit(tree.body, "")
+    return "\n".join(out)
+
+
+def fit_code(code: str, max_tokens: int) -> str:
+    """Shrinks code to max_tokens, keeping structure instead of cutting at a character count."""
+    if count_tokens(code) <= max_tokens:
+        return code
+    candidates = [_strip_comments(code)]
+    try:
+        tree = ast.parse(candidates[0])
+        candidates += [_collapse_bodies(candidates[0], tree, n) for n in (12, 6, 2)]
+        candidates.append(_signatures(tree))
+    except SyntaxError:
+        pass
+    for candidate in candidates:
+        if count_tokens(candidate) <= max_tokens:
+            return candidate
+    return fit_text(candidates[-1], max_tokens)
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """Keeps whole lines from the start of text up to max_tokens and notes what was left out."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    lines = text.splitlines()
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens - 16:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) + f"\n... ({len(lines) - len(kept)} more lines omitted)"
+
+
+class PromptBuilder:
+    """Assembles a user prompt from labelled parts within the model's input budget.
+
+        prompt = (PromptBuilder("reviewer", reviewer_sys)
+                  .add("Code", code, kind="code")
+                  .add("Execution stderr", stderr)
+                  .build())
+    """
+
+    def __init__(self, stage: str, system_msg: str = "", llm_config: Optional[Dict[str, Any]] = None,
+                 max_tokens: Optional[int] = None, role: Optional[str] = None):
+        self.stage = stage
+        # the budget follows the model settings of the role the prompt is for (stage name by default)
+        budget = input_budget(llm_config or get_llm_config(role or stage), system_msg)
+        self.budget = min(budget, max_tokens) if max_tokens else budget
+        self._parts: List[Dict[str, Any]] = []
+
+    def add(self, label: str, text: str, kind: str = "text", verbatim: Optional[str] = None) -> "PromptBuilder":
+        """kind: "text" (line-cut if needed), "markdown" (boilerplate stripped) or "code" (fit_code).
+
+        verbatim is what the part used to be before the caller compacted it (e.g. the whole
+        specs file); it only feeds the tokens-saved figure.
+        """
+        self._parts.append({"label": label, "raw": text or "", "kind": kind,
+                            "verbatim": (text or "") if verbatim is None else verbatim})
+        return self
+
+    def _render(self, parts: List[Dict[str, Any]], key: str) -> str:
+        blocks = []
+        for p in parts:
+            body = p[key]
+            blocks.append(f"{p['label']}:\n{body}" if p["label"] else body)
+        return "\n\n".join(blocks)
+
+    def build(self) -> str:
+        for p in self._parts:
+            p["text"] = strip_boilerplate(p["raw"]) if p["kind"] == "markdown" else p["raw"].strip()
+
+        # shrink the largest part until everything fits (labels and separators count too)
+        for _ in range(len(self._parts) * 3):
+            total = count_tokens(self._render(self._parts, "text"))
+            if total <= self.budget:
+                break
+            largest = max(self._parts, key=lambda p: count_tokens(p["text"]))
+            target = max(64, count_tokens(largest["text"]) - (total - self.budget) - 8)
+            shrink = fit_code if largest["kind"] == "code" else fit_text
+            smaller = shrink(largest["text"], target)
+            if count_tokens(smaller) >= count_tokens(largest["text"]):
+                break
+            largest["text"] = smaller
+
+        prompt = self._render(self._parts, "text")
+        verbatim = count_tokens(self._render(self._parts, "verbatim"))
+        sent = count_tokens(prompt)
+        with span(f"prompt:{self.stage}", kind="prompt", stage=self.stage, tokens_verbatim=verbatim,
+                  tokens_sent=sent, tokens_saved=max(0, verbatim - sent), budget=self.budget):
+            pass
+        return prompt
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.llm_config import get_cache_config
+
+# Cache of LLM replies, shared by every pipeline in the process.
+# The key covers everything that shapes a reply: the model chain, both messages, the
+# sampling settings, the output schema and the early-stop mode. Entries live in memory
+# (LRU) and, with a directory configured, on disk as <key>.json so later processes reuse them too.
+# Identical calls made at the same time (e.g. the same use case in several product
+# variants of a batch) are sent once: the first caller generates, the others wait for it.
+# Failed or cancelled calls are never stored; a waiter whose leader failed generates itself.
+
+Reply = Tuple[str, Dict[str, Any]]
+
+
+def cache_key(llm_config: Dict[str, Any], system_msg: str, user_msg: str, stop_on: Optional[str]) -> str:
+    material = {
+        "models": [cfg["model"] for cfg in llm_config["config_list"]],
+        "temperature": llm_config.get("temperature"),
+        "max_tokens": llm_config.get("max_tokens"),
+        "context_window": llm_config.get("context_window"),
+        "stop_on": stop_on,
+        "format": llm_config.get("format"),
+        "system": system_msg,
+        "user": user_msg,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ReplyCache:
+    def __init__(self, enabled: bool = False, directory: Optional[Path] = None, max_entries: int = 1024):
+        self.enabled = enabled
+        self.directory = Path(directory) if directory else None
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Reply]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "shared": 0}
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.directory / key[:2] / f"{key}.json" if self.directory else None
+
+    def _lookup(self, key: str) -> Optional[Reply]:
+        """Memory first, then disk; call with the lock held."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        path = self._path(key)
+        if path is not None and path.is_file():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return None
+            self._remember(key, (data["content"], data["stats"]))
+            return self._entries[key]
+        return None
+
+    def _remember(self, key: str, reply: Reply) -> None:
+        self._entries[key] = reply
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _store(self, key: str, reply: Reply) -> None:
+        with self._lock:
+            self._remember(key, reply)
+        path = self._path(key)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"content": reply[0], "stats": reply[1]}), encoding="utf-8")
+            os.replace(tmp, path)
+
+    def fetch(self, key: str, generate: Callable[[], Reply]) -> Tuple[Reply, bool]:
+        """Returns (reply, hit). On a miss generate() runs once for all concurrent callers of key."""
+        while True:
+            with self._lock:
+                reply = self._lookup(key)
+                if reply is not None:
+                    self.stats["hits"] += 1
+                    return reply, True
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self._inflight[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+                self.stats["shared"] += 1
+            # someone else is generating this reply; take theirs, or try again if they failed
+            pending.wait()
+        try:
+            reply = generate()
+            self._store(key, reply)
+            return reply, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+
+_cache: Optional[ReplyCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_reply_cache() -> ReplyCache:
+    """Returns the process-wide reply cache, configured from config/llm_config.py."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReplyCache(**get_cache_config())
+        return _cache
+
+
+def configure_reply_cache(**overrides: Any) -> ReplyCache:
+    """Replaces the process-wide cache, e.g. to turn it on for a batch run."""
+    global _cache
+    with _cache_lock:
+        _cache = ReplyCache(**{**get_cache_config(), **overrides})
+        return _cache
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+# Durable checkpoints for long pipeline runs.
+# run_state.json in the output directory records every finished stage, and every finished
+# use case inside the code stage, with the artifacts it wrote (path + sha256). A resumed run
+# skips stages and use cases whose record is "done" and whose artifacts are unchanged on
+# disk, and starts over from the first one that is not. The file is rewritten atomically
+# after each checkpoint, so a crash or a restarted model server loses at most the unit that
+# was in progress.
+
+RUN_STATE_FILE = "run_state.json"
+VERSION = 1
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class RunState:
+    def __init__(self, path: Path, data: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.data: Dict[str, Any] = data or {"version": VERSION, "input": None, "stages": {}, "units": {}}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "RunState":
+        """Reads an existing state file; a missing, unreadable or outdated one gives an empty state."""
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == VERSION:
+                return cls(path, data)
+        except (OSError, ValueError):
+            pass
+        return cls(path)
+
+    def save(self) -> None:
+        # held for the write too, so an older snapshot can never replace a newer one
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.tmp")
+            tmp.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)  # atomic: readers see the old or the new file, never half of one
+
+    # --- input ---
+    def matches_input(self, input_path: Path) -> bool:
+        return self.data["input"] == {"path": str(input_path), "sha256": file_digest(input_path)}
+
+    def set_input(self, input_path: Path) -> None:
+        with self._lock:
+            self.data["input"] = {"path": str(input_path), "sha256": file_digest(input_path)}
+
+    # --- records ---
+    @staticmethod
+    def _record(status: str, artifacts: Iterable[Path], **extra: Any) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "artifacts": [{"path": str(p), "sha256": file_digest(p)} for p in artifacts if p.is_file()],
+            **extra,
+        }
+
+    @staticmethod
+    def _intact(record: Optional[Dict[str, Any]]) -> bool:
+        """True if the record is done and every artifact it lists is still on disk, unchanged."""
+        if not record or record.get("status") != "done":
+            return False
+        for artifact in record["artifacts"]:
+            path = Path(artifact["path"])
+            if not path.is_file() or file_digest(path) != artifact["sha256"]:
+                return False
+        return True
+
+    def stage_done(self, stage: str) -> bool:
+        with self._lock:
+            return self._intact(self.data["stages"].get(stage))
+
+    def finish_stage(self, stage: str, artifacts: Iterable[Path], status: str = "done") -> None:
+        record = self._record(status, artifacts)
+        with self._lock:
+            self.data["stages"][stage] = record
+        self.save()
+
+    def done_unit(self, stage: str, unit: str) -> Optional[Dict[str, Any]]:
+        """The finished record for one unit of a stage (e.g. a use case), or None if it must run."""
+        with self._lock:
+            record = self.data["units"].get(stage, {}).get(unit)
+        return record if self._intact(record) else None
+
+    def finish_unit(self, stage: str, unit: str, status: str, artifacts: Iterable[Path],
+                    result: Optional[Dict[str, Any]] = None) -> None:
+        record = self._record(status, artifacts, result=result or {})
+        with self._lock:
+            self.data["units"].setdefault(stage, {})[unit] = record
+        self.save()
+
+    def first_incomplete(self, stages: Sequence[str]) -> Optional[str]:
+        return next((s for s in stages if not self.stage_done(s)), None)
+
+    def forget(self, stages: Iterable[str]) -> None:
+        """Drops the records of stages that are about to run again (their inputs changed)."""
+        with self._lock:
+            for name in stages:
+                self.data["stages"].pop(name, None)
+                self.data["units"].pop(name, None)
+        self.save()
+
+
+_state: ContextVar[Optional[RunState]] = ContextVar("run_state", default=None)
+
+
+def activate(state: Optional[RunState]) -> None:
+    """Makes state the run state for the current context (and work copied from it)."""
+    _state.set(state)
+
+
+def current_run_state() -> Optional[RunState]:
+    return _state.get()
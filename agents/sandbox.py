@@ -0,0 +1,184 @@
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Pool of pre-started Python interpreters for executing generated code.
+# Each worker starts ahead of time, imports the stdlib modules generated code typically
+# uses, then blocks until it is handed one script. It runs that script under CPU/memory
+# limits with stdout/stderr going to files, exits with the script's return code, and is
+# replaced in the background. Every script still gets a fresh process, but none of them
+# waits for an interpreter to start.
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_CPU_SECONDS = 10
+DEFAULT_MEMORY_MB = 1024
+
+# imported by every worker before it is handed a job
+WARM_MODULES = ["json", "datetime", "uuid", "re", "typing", "dataclasses", "collections", "unittest"]
+
+
+class _Worker:
+    def __init__(self, proc: subprocess.Popen, scratch: Path):
+        self.proc = proc
+        self.scratch = scratch
+
+    @property
+    def stdout_path(self) -> Path:
+        return self.scratch / "stdout.txt"
+
+    @property
+    def stderr_path(self) -> Path:
+        return self.scratch / "stderr.txt"
+
+
+class SandboxPool:
+    """Keeps `size` warm workers ready and runs one script per worker."""
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, cpu_seconds: int = DEFAULT_CPU_SECONDS,
+                 memory_mb: int = DEFAULT_MEMORY_MB):
+        self.size = size
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.append(self._start_worker())
+
+    def _start_worker(self) -> _Worker:
+        scratch = Path(tempfile.mkdtemp(prefix="sandbox_"))
+        with open(scratch / "stdout.txt", "wb") as out, open(scratch / "stderr.txt", "wb") as err:
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--worker"],
+                stdin=subprocess.PIPE,
+                stdout=out,
+                stderr=err,
+                cwd=str(scratch),
+            )
+        return _Worker(proc, scratch)
+
+    def _replenish(self) -> None:
+        worker = self._start_worker()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        self._discard(worker)
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        threading.Thread(target=self._replenish, daemon=True).start()
+        # pool exhausted: pay for a cold start rather than wait for a replacement
+        return worker or self._start_worker()
+
+    @staticmethod
+    def _discard(worker: _Worker) -> None:
+        if worker.proc.poll() is None:
+            worker.proc.kill()
+            worker.proc.wait()
+        shutil.rmtree(worker.scratch, ignore_errors=True)
+
+    def run(self, path: Path, timeout: int = 5, cwd: Optional[Path] = None) -> Tuple[str, str, int]:
+        """Runs a script in a warm worker and returns (stdout, stderr, returncode)."""
+        worker = self._acquire()
+        job = {
+            "path": str(Path(path).resolve()),
+            "cwd": str(cwd or worker.scratch),
+            "cpu_seconds": self.cpu_seconds,
+            "memory_mb": self.memory_mb,
+        }
+        try:
+            worker.proc.communicate(json.dumps(job).encode("utf-8"), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._discard(worker)
+            return "", "Execution timed out", -1
+
+        try:
+            stdout = worker.stdout_path.read_text(encoding="utf-8", errors="replace")
+            stderr = worker.stderr_path.read_text(encoding="utf-8", errors="replace")
+            return stdout, stderr, worker.proc.returncode
+        finally:
+            self._discard(worker)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._discard(worker)
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SandboxPool:
+    """Returns the process-wide pool, starting its workers on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+# --- worker side ---
+def _apply_limits(cpu_seconds: int, memory_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:  # not available on Windows; rely on the parent's timeout
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _worker_main() -> int:
+    import importlib
+    import runpy
+    import traceback
+
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+
+    raw = sys.stdin.read()
+    if not raw:
+        return 0
+    job = json.loads(raw)
+    path = job["path"]
+
+    os.chdir(job["cwd"])
+    sys.argv = [path]
+    sys.path[0] = os.path.dirname(path)
+    _apply_limits(job["cpu_seconds"], job["memory_mb"])
+
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # hide the runpy frames so the traceback reads like `python script.py`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != path:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        return 1
+    return 0
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--worker"]:
+    code = _worker_main()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.exit(code)
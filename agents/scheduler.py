@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from agents.console import log
+from config.llm_config import get_scheduler_config
+
+# Client-side scheduler shared by every LLM call in the process.
+# - at most max_concurrency calls are in flight (match the server's OLLAMA_NUM_PARALLEL so
+#   requests queue here, where they can be prioritised, instead of inside Ollama)
+# - waiting calls are served lowest priority number first, then in arrival order
+# - transient failures (connection errors, timeouts, 429/5xx, backend error events) are
+#   retried with jittered exponential backoff; the slot is released while backing off
+# - each call has a deadline; no attempt or backoff starts past it
+
+T = TypeVar("T")
+
+# Lower runs first. Diagram stages gate everything after them; within a use case the
+# architect -> coder chain is the critical path, the reviewer and tester come after it.
+ROLE_PRIORITY: Dict[str, int] = {
+    "use_case_diagram": 0,
+    "use_case_specs": 0,
+    "class_diagram": 0,
+    "seq_diagram": 1,
+    "architect": 1,
+    "coder": 1,
+    "reviewer": 2,
+    "tester": 3,
+    # preloads are worth having but never ahead of a real call
+    "warmup": 4,
+}
+DEFAULT_PRIORITY = 2
+
+
+class BackendError(RuntimeError):
+    """An error reported by the backend itself (e.g. an Ollama stream "error" event); retried."""
+
+
+class DeadlineExceeded(Exception):
+    """The call's deadline passed before it could complete; not retried."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for failures worth retrying: transport errors, timeouts, 429/5xx and backend errors."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):  # urllib.error.HTTPError
+        return code == 429 or code >= 500
+    if isinstance(exc, (BackendError, OSError, json.JSONDecodeError)):  # URLError, resets, timeouts, cut-off JSON
+        return True
+    # http.client.IncompleteRead / RemoteDisconnected when the server drops mid-response
+    return type(exc).__module__ == "http.client"
+
+
+class LLMScheduler:
+    """Concurrency cap + priority queue + retry/backoff around a call."""
+
+    def __init__(self, max_concurrency: int = 4, max_retries: int = 3, backoff_base_s: float = 0.5,
+                 backoff_max_s: float = 8.0, seed: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._random = random.Random(seed)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self.stats: Dict[str, Any] = {"calls": 0, "retries": 0, "failures": 0, "max_active": 0, "queued_s": 0.0}
+
+    @contextmanager
+    def slot(self, priority: int = DEFAULT_PRIORITY) -> Iterator[None]:
+        """Blocks until this caller is first in line and a slot is free."""
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._cond.wait_for(lambda: self._active < self.max_concurrency and self._waiting[0] == ticket)
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self.stats["max_active"] = max(self.stats["max_active"], self._active)
+            # the next caller in line may fit into another free slot
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^(attempt-1))]."""
+        with self._cond:
+            return self._random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** (attempt - 1)))
+
+    def call(self, fn: Callable[[float], T], name: str = "", priority: int = DEFAULT_PRIORITY,
+             deadline_s: Optional[float] = None, stats: Optional[Dict[str, Any]] = None) -> T:
+        """Runs fn(deadline) under a slot, retrying transient failures.
+
+        fn receives the absolute time.perf_counter() deadline so it can size its own timeouts.
+        The deadline clock starts once the call first gets a slot, so time spent queued behind
+        other calls does not count against it. stats (if given) gets retries and queued_s.
+        """
+        stats = stats if stats is not None else {}
+        stats.setdefault("retries", 0)
+        stats.setdefault("queued_s", 0.0)
+        deadline: Optional[float] = None
+        attempt = 0
+        while True:
+            waited = time.perf_counter()
+            with self.slot(priority):
+                queued = time.perf_counter() - waited
+                stats["queued_s"] = round(stats["queued_s"] + queued, 4)
+                if deadline is None:
+                    deadline = time.perf_counter() + (deadline_s if deadline_s else float("inf"))
+                    with self._cond:
+                        self.stats["calls"] += 1
+                with self._cond:
+                    self.stats["queued_s"] += queued
+                try:
+                    return fn(deadline)
+                except Exception as e:
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        with self._cond:
+                            self.stats["failures"] += 1
+                        raise
+                    error = e
+            attempt += 1
+            delay = self.backoff(attempt)
+            if time.perf_counter() + delay >= deadline:
+                with self._cond:
+                    self.stats["failures"] += 1
+                raise DeadlineExceeded(f"{name}: deadline of {deadline_s:.0f}s reached after "
+                                       f"{attempt} attempt(s); last error: {error}") from error
+            stats["retries"] += 1
+            with self._cond:
+                self.stats["retries"] += 1
+            log(f"[RETRY] {name}: {error} (retry {attempt}/{self.max_retries} in {delay:.2f}s)")
+            time.sleep(delay)
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Returns the process-wide scheduler, configured from config/llm_config.py."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(**get_scheduler_config())
+        return _scheduler
+
+
+def configure_scheduler(**overrides: Any) -> LLMScheduler:
+    """Replaces the process-wide scheduler, e.g. with a different cap or faster backoff for a benchmark."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = LLMScheduler(**{**get_scheduler_config(), **overrides})
+        return _scheduler
+
+
+def priority_for(role: Optional[str]) -> int:
+    return ROLE_PRIORITY.get(role or "", DEFAULT_PRIORITY)
@@ -1,147 +1,211 @@
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
-from autogen.agentchat import ConversableAgent
-from config.llm_config import get_llm_config
+from agents import plantuml
+from agents.diagram_check import repair, sequence_problems
+from agents.llm_client import ask_agent
+from agents.prompt_budget import PromptBuilder, compact_specs
+from agents.structured import ask_plantuml
+from agents.tracing import span, traced
 import re
 
-def generate_seq_diagram(uc_specs_path: Path, output_dir: Path) -> None:
-    """Reads the use case specifications and generates a Sequence Diagram (PlantUML) for EACH use case described."""
-
-    specs_text = uc_specs_path.read_text(encoding="utf-8")
-    llm_config = get_llm_config()
-
-    expected_names = ["Register Vehicle",
-                      "Log Maintenance Event",
-                      "Edit/Delete Maintenance Record",
-                      "View Maintenance History",
-                      "Get Service Recommendation",
-                      ]
-    
-    expected_messages = {
-        "Register Vehicle": [
-            "User -> VehicleRegistry: Register Vehicle (payload)",
-            "VehicleRegistry -> MaintenanceDB: Create Vehicle Record",
-            "MaintenanceDB --> VehicleRegistry: Ack",
-            "VehicleRegistry --> User: Registration Complete",
-        ],
-        "Log Maintenance Event": [
-            "User -> MaintenanceService: Log Maintenance Event (vehicleId, details)",
-            "MaintenanceService -> MaintenanceDB: Insert Maintenance Record",
-            "MaintenanceDB --> MaintenanceService: Ack",
-            "MaintenanceService --> User: Event Logged",
-        ],
-        "Edit/Delete Maintenance Record": [
-            "User -> MaintenanceService: Edit/Delete Maintenance Record (recordId, action)",
-            "MaintenanceService -> MaintenanceDB: Update/Delete Record",
-            "MaintenanceDB --> MaintenanceService: Ack/Result",
-            "MaintenanceService --> User: Edit/Delete Result",
-        ],
-        "View Maintenance History": [
-            "User -> MaintenanceService: Request Maintenance History (vehicleId)",
-            "MaintenanceService -> MaintenanceDB: Query Records",
-            "MaintenanceDB --> MaintenanceService: Return Records",
-            "MaintenanceService --> User: Display History",
-        ],
-        "Get Service Recommendation": [
-            "User -> RecommendationEngine: Request Recommendation (vehicleId, context)",
-            "RecommendationEngine -> MaintenanceDB: Fetch Recent Maintenance (vehicleId)",
-            "MaintenanceDB --> RecommendationEngine: Return Records",
-            "RecommendationEngine --> User: Recommendation Response",
-        ],
-    }
-
-
-    def extract_section(text: str, heading: str) -> str:
-        """Try to extract a section for heading from specs_text. Fall back to empty string."""
-        pattern = rf"(^|\n)#+\s*{re.escape(heading)}\s*\n(.*?)(?=\n#+\s*\w|\Z)"
-        m = re.search(pattern, text, re.S | re.I)
+# How each sequence diagram is produced:
+# - "template": rendered directly from EXPECTED_MESSAGES plus the use case spec, no LLM call
+# - "hybrid":   the template, plus optional notes the LLM suggests from the spec
+# - "llm":      the LLM writes the whole diagram (falls back to the template's messages)
+SEQ_MODES = ("template", "hybrid", "llm")
+DEFAULT_SEQ_MODE = "template"
+
+EXPECTED_NAMES = ["Register Vehicle",
+                  "Log Maintenance Event",
+                  "Edit/Delete Maintenance Record",
+                  "View Maintenance History",
+                  "Get Service Recommendation",
+                  ]
+
+PARTICIPANTS = ["VehicleRegistry", "MaintenanceService", "MaintenanceDB", "RecommendationEngine"]
+
+EXPECTED_MESSAGES = {
+    "Register Vehicle": [
+        "User -> VehicleRegistry: Register Vehicle (payload)",
+        "VehicleRegistry -> MaintenanceDB: Create Vehicle Record",
+        "MaintenanceDB --> VehicleRegistry: Ack",
+        "VehicleRegistry --> User: Registration Complete",
+    ],
+    "Log Maintenance Event": [
+        "User -> MaintenanceService: Log Maintenance Event (vehicleId, details)",
+        "MaintenanceService -> MaintenanceDB: Insert Maintenance Record",
+        "MaintenanceDB --> MaintenanceService: Ack",
+        "MaintenanceService --> User: Event Logged",
+    ],
+    "Edit/Delete Maintenance Record": [
+        "User -> MaintenanceService: Edit/Delete Maintenance Record (recordId, action)",
+        "MaintenanceService -> MaintenanceDB: Update/Delete Record",
+        "MaintenanceDB --> MaintenanceService: Ack/Result",
+        "MaintenanceService --> User: Edit/Delete Result",
+    ],
+    "View Maintenance History": [
+        "User -> MaintenanceService: Request Maintenance History (vehicleId)",
+        "MaintenanceService -> MaintenanceDB: Query Records",
+        "MaintenanceDB --> MaintenanceService: Return Records",
+        "MaintenanceService --> User: Display History",
+    ],
+    "Get Service Recommendation": [
+        "User -> RecommendationEngine: Request Recommendation (vehicleId, context)",
+        "RecommendationEngine -> MaintenanceDB: Fetch Recent Maintenance (vehicleId)",
+        "MaintenanceDB --> RecommendationEngine: Return Records",
+        "RecommendationEngine --> User: Recommendation Response",
+    ],
+}
+
+
+def extract_section(text: str, heading: str) -> str:
+    """Try to extract a section for heading from specs_text. Fall back to empty string."""
+    pattern = rf"(^|\n)#+\s*{re.escape(heading)}\s*\n(.*?)(?=\n#+\s*\w|\Z)"
+    m = re.search(pattern, text, re.S | re.I)
+    if m:
+        return m.group(2).strip()
+    # try a looser version
+    pattern2 = rf"(^|\n){re.escape(heading)}\s*\n(.*?)(?=\n{{2,}}|\Z)"
+    m2 = re.search(pattern2, text, re.S | re.I)
+    return m2.group(2).strip() if m2 else ""
+
+
+def parse_spec_fields(section_text: str) -> Dict[str, List[str]]:
+    """Splits a spec section ("- **Field:** value" plus indented items) into field -> lines."""
+    fields: Dict[str, List[str]] = {}
+    current = None
+    for line in section_text.splitlines():
+        m = re.match(r"^\s*[-*]\s*\*\*(.+?):?\*\*:?\s*(.*)$", line)
         if m:
-            return m.group(2).strip()
-        # try a looser version
-        pattern2 = rf"(^|\n){re.escape(heading)}\s*\n(.*?)(?=\n{{2,}}|\Z)"
-        m2 = re.search(pattern2, text, re.S | re.I)
-        return m2.group(2).strip() if m2 else ""
-    
- 
-    
-    # for each expected use case - have a strict prompt that details UML requirements
-    for name in expected_names:
+            current = m.group(1).strip().rstrip(":").lower()
+            fields[current] = [m.group(2).strip()] if m.group(2).strip() else []
+        elif current and line.strip():
+            fields[current].append(re.sub(r"^\s*(?:[-*]|\d+\.)\s*", "", line).strip())
+    return fields
+
+
+def render_template(name: str, section_text: str = "", notes: Optional[List[str]] = None) -> str:
+    """Builds the sequence diagram for a use case without an LLM call."""
+    messages = EXPECTED_MESSAGES[name]
+    handler = plantuml.parse("\n".join(["@startuml", messages[0], "@enduml"])).messages[0].target
+
+    lines = ["@startuml", f"title {name}", "actor User"]
+    lines += [f"participant {p}" for p in PARTICIPANTS]
+    lines += messages
+
+    # optional detail from the spec: alternate / exception flows as a note on the handler
+    fields = parse_spec_fields(section_text)
+    alternates = [a for key, items in fields.items() if key.startswith("alternate") for a in items if a]
+    if alternates:
+        lines.append(f"note right of {handler}")
+        lines += [f"  Alt: {a}" for a in alternates]
+        lines.append("end note")
+    lines += notes or []
+    lines.append("@enduml")
+    return "\n".join(lines) + "\n"
+
+
+def _llm_notes(name: str, section_text: str) -> List[str]:
+    """Hybrid mode: asks the LLM only for optional notes; anything that is not a note is dropped."""
+    system_message = (
+        "You are a senior software engineer specialized in UML sequence diagrams.\n"
+        f"The sequence diagram for '{name}' is already fixed. Suggest at most 2 PlantUML notes that add detail "
+        "from the specification (preconditions, validation, error handling).\n"
+        f"Allowed participants: User, {', '.join(PARTICIPANTS)}.\n"
+        "Output ONLY lines of the form: note over <Participant> : <text>"
+    )
+    user_prompt = (PromptBuilder("seq_notes", system_message, role="seq_diagram")
+                   .add("", f"Use case: {name}")
+                   .add("Specification", compact_specs(section_text), kind="markdown", verbatim=section_text)
+                   .build())
+    reply = ask_agent(f"seq_notes_agent_{name}", system_message, user_prompt, role="seq_diagram")
+    allowed = {"User", *PARTICIPANTS}
+    notes = []
+    for line in reply.splitlines():
+        m = re.match(r"^\s*note\s+(?:over|left of|right of)\s+(\w+)\s*:\s*\S.*$", line)
+        if m and m.group(1) in allowed:
+            notes.append(line.strip())
+    return notes[:2]
+
+
+def _llm_diagram(name: str, section_text: str) -> str:
+    """LLM mode: the model writes the full diagram under strict requirements."""
+    # build the strict requirements
+    system_message = (
+        f"You are a senior software engineer specialized in UML sequence diagrams.\n"
+        f"Produce exactly ONE PlantUML sequence diagram (PlantUML syntax ONLY) for the use case: '{name}'.\n"
+        f"Output requirements:\n"
+        f"- ONLY the PlantUML block starting with @startuml and ending with @enduml.\n"
+        f"- DO NOT include any layout directives such as 'left to right direction' or 'skinparam'.\n"
+        f"- Declare: actor User\n"
+        f"- Declare participants (in this order): {', '.join(PARTICIPANTS)}\n"
+        f"- Use '->' for requests and '-->' for responses.\n"
+        f"- Include exactly the following message lines (case-sensitive) in the diagram, in the given order:\n"
+        + "\n".join(f"- {m}" for m in EXPECTED_MESSAGES[name])
+        + "\nDo not add any other messages, notes, metadata, or prose."
+    )
+
+    user_prompt = (
+        PromptBuilder("seq_diagram", system_message)
+        .add("", f"Use case: {name}")
+        .add("Specification (from use case specs)", compact_specs(section_text), kind="markdown",
+             verbatim=section_text)
+        .add("", "Generate a single PlantUML sequence diagram for this use case following the system message.")
+        .build()
+    )
+    agent_name = f"seq_diagram_agent_{name.replace(' ', '_')}"
+    block = ask_plantuml(agent_name, system_message, user_prompt, role="seq_diagram")
+
+    # diff against the requirements above; only what is missing or extra goes back to the model
+    problems: List[str] = []
+    if block:
+        block, problems = repair(agent_name, "sequence", block,
+                                 lambda d: sequence_problems(d, EXPECTED_MESSAGES[name], PARTICIPANTS),
+                                 role="seq_diagram")
+        if problems:
+            print(f"[WARN] The sequence diagram for {name} still misses requirements, using its expected "
+                  f"messages: {'; '.join(problems)}")
+
+    # parse the block once; re-rendering drops layout directives
+    diagram = plantuml.parse(block) if block and not problems else None
+    if diagram is None or not diagram.messages:
+        # best-effort: wrap the expected messages into a minimal PlantUML block
+        lines = ["@startuml", "actor User"] + [f"participant {p}" for p in PARTICIPANTS]
+        lines.extend(EXPECTED_MESSAGES[name])
+        lines.append("@enduml")
+        diagram = plantuml.parse("\n".join(lines))
+    return diagram.to_plantuml() + "\n"
+
+
+@traced("seq_diagrams")
+def generate_seq_diagram(uc_specs_path: Path, output_dir: Path, mode: str = DEFAULT_SEQ_MODE) -> None:
+    """Reads the use case specifications and generates a Sequence Diagram (PlantUML) for EACH use case described.
+
+    mode is one of SEQ_MODES; "template" makes no LLM calls.
+    """
+    if mode not in SEQ_MODES:
+        raise ValueError(f"Unknown sequence diagram mode '{mode}' (expected one of {', '.join(SEQ_MODES)})")
+
+    specs_text = uc_specs_path.read_text(encoding="utf-8") if uc_specs_path.exists() else ""
+
+    for name in EXPECTED_NAMES:
         section_text = extract_section(specs_text, name)
 
-        # build the strict requirements
-        system_message = (
-            f"You are a senior software engineer specialized in UML sequence diagrams.\n"
-            f"Produce exactly ONE PlantUML sequence diagram (PlantUML syntax ONLY) for the use case: '{name}'.\n"
-            f"Output requirements:\n"
-            f"- ONLY the PlantUML block starting with @startuml and ending with @enduml.\n"
-            f"- DO NOT include any layout directives such as 'left to right direction' or 'skinparam'.\n"
-            f"- Declare: actor User\n"
-            f"- Declare participants (in this order): VehicleRegistry, MaintenanceService, MaintenanceDB, RecommendationEngine\n"
-            f"- Use '->' for requests and '-->' for responses.\n"
-            f"- Include exactly the following message lines (case-sensitive) in the diagram, in the given order:\n"
-            + "\n".join(f"- {m}" for m in expected_messages[name])
-            + "\nDo not add any other messages, notes, metadata, or prose."
-        )
-
-       
-
-
-        user_prompt = (
-            f"Use case: {name}\n\n"
-            f"Specification (from use case specs):\n\n{section_text}\n\n"
-            "Generate a single PlantUML sequence diagram for this use case following the system message."
-        )
-        agent = ConversableAgent(
-           name=f"seq_diagram_agent_{name.replace('', '_')}",
-           system_message= system_message,
-           llm_config= llm_config,
-
-       )
-        
-        reply = agent.generate_reply(messages=[{"role": "user", "content": user_prompt}])
-        raw_output = reply["content"] if isinstance(reply, dict) else str(reply)
-
-        match = re.search(r"@startuml[\s\S]*?@enduml", raw_output)
-        if match:
-            puml_code = match.group(0).strip()
-        else:
-            # best-effort: wrap the expected messages into a minimal PlantUML block
-            lines = ["@startuml", "left to right direction", "actor User",
-                     "participant VehicleRegistry", "participant MaintenanceService",
-                     "participant MaintenanceDB", "participant RecommendationEngine"]
-            lines.extend(expected_messages[name])
-            lines.append("@enduml")
-            puml_code = "\n".join(lines)
-        
-        m_start = re.search(r"@startuml", puml_code, re.I)
-        if m_start:
-            puml_code = puml_code[m_start.start():].strip()
-        else:
-            # fallback wrap
-            puml_code = "@startuml\nactor User\nparticipant VehicleRegistry\nparticipant MaintenanceService\nparticipant MaintenanceDB\nparticipant RecommendationEngine\n" + "\n".join(expected_messages[name]) + "\n@enduml"
-
-        # remove any 'left to right direction' or similar layout lines if present
-        puml_code = re.sub(r"(?im)^\s*left to right direction\s*$\n?", "", puml_code)
-
-        # sanitize further: ensure the first non-empty line is @startuml
-        lines = [ln for ln in puml_code.splitlines()]
-        # ensure @startuml is first line
-        if not lines or not re.match(r"(?i)^@startuml\s*$", lines[0]):
-            # find index of @startuml and trim
-            for i, ln in enumerate(lines):
-                if re.match(r"(?i)^@startuml\s*$", ln):
-                    lines = lines[i:]
-                    break
+        with span(f"diagram:{name}", kind="step", mode=mode):
+            if mode == "llm":
+                puml_code = _llm_diagram(name, section_text)
+            elif mode == "hybrid" and section_text:
+                try:
+                    notes = _llm_notes(name, section_text)
+                except Exception as e:
+                    print(f"[WARN] Enrichment failed for {name}, using template only: {e}")
+                    notes = []
+                puml_code = render_template(name, section_text, notes)
             else:
-                # rebuild minimal block
-                lines = ["@startuml", "actor User",
-                         "participant VehicleRegistry", "participant MaintenanceService",
-                         "participant MaintenanceDB", "participant RecommendationEngine"] + expected_messages[name] + ["@enduml"]
-        puml_code = "\n".join(lines).strip() + "\n"
-
+                puml_code = render_template(name, section_text)
 
         # sanitize filename
         filename = name.lower().replace(" ", "_").replace("/", "_") + "_sequence.puml"
         output_path = output_dir / filename
         output_path.write_text(puml_code, encoding="utf-8")
-        print(f"[OK] Saved sequence diagram for: {name} -> {output_path}")
+        print(f"[OK] Saved sequence diagram ({mode}) for: {name} -> {output_path}")
@@ -0,0 +1,261 @@
+import ast
+import builtins
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from agents.plantuml import Diagram
+
+# In-process static gate for generated code, run after the syntax check and before the code is
+# executed or reviewed. One parse, a few AST walks, no interpreter start-up:
+# - undefined names: names read in a scope (function, class body, module) that nothing binds
+#   there, in an enclosing function, at module level or in builtins
+# - missing imports: undefined names that are stdlib modules or well-known stdlib members
+# - module-level side effects: statements other than imports, definitions, constants and the
+#   __main__ block that would run when the tests import the module
+# - diagram conformance: every class the sequence diagram sends a request to exists, with a
+#   method for each request message
+# Findings are specific enough ("line 27: undefined name 'vehicleId' in ...") to go straight
+# into a refine prompt. Side-effect findings can be wrong (a demo object built at module level
+# may be intended) and diagram findings only match method names against message labels
+# (get_history for "Request History"), so both are left to the reviewer.
+
+_BUILTINS = set(dir(builtins)) | {"__name__", "__file__", "__doc__", "__spec__", "__loader__", "__package__"}
+
+# well-known stdlib members -> the import that provides them
+KNOWN_MEMBERS: Dict[str, str] = {
+    "datetime": "from datetime import datetime",
+    "date": "from datetime import date",
+    "timedelta": "from datetime import timedelta",
+    "dataclass": "from dataclasses import dataclass",
+    "field": "from dataclasses import field",
+    "asdict": "from dataclasses import asdict",
+    "defaultdict": "from collections import defaultdict",
+    "OrderedDict": "from collections import OrderedDict",
+    "Counter": "from collections import Counter",
+    "namedtuple": "from collections import namedtuple",
+    "Path": "from pathlib import Path",
+    "Enum": "from enum import Enum",
+    "uuid4": "from uuid import uuid4",
+    "List": "from typing import List",
+    "Dict": "from typing import Dict",
+    "Optional": "from typing import Optional",
+    "Any": "from typing import Any",
+    "Tuple": "from typing import Tuple",
+    "Union": "from typing import Union",
+}
+
+# calls that are fine at import time (no I/O, no state outside the module)
+SAFE_CALLS = {
+    "re.compile", "logging.getLogger", "namedtuple", "collections.namedtuple", "TypeVar", "typing.TypeVar",
+    "Path", "pathlib.Path", "os.path.join", "os.path.dirname", "os.path.abspath", "os.environ.get", "os.getenv",
+    "frozenset", "set", "dict", "list", "tuple", "str", "int", "float", "object", "field", "timedelta",
+    "datetime.timedelta", "Enum", "enum.Enum", "threading.Lock", "threading.RLock",
+}
+
+
+# findings that mean the code will fail when it runs or is imported; the rest go to the reviewer
+BLOCKING_KINDS = ("undefined-name", "missing-import")
+
+
+@dataclass
+class Finding:
+    line: int
+    kind: str  # "undefined-name", "missing-import", "side-effect" or "diagram"
+    message: str
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}" if self.line else self.message
+
+
+def _bound_names(nodes: Iterable[ast.AST]) -> Set[str]:
+    """Names bound by nodes in their own scope (nested function/class bodies excluded)."""
+    names: Set[str] = set()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            # decorators and defaults are evaluated here, their bodies are not
+            stack.extend(node.decorator_list)
+            if not isinstance(node, ast.ClassDef):
+                stack.extend(node.args.defaults + [d for d in node.args.kw_defaults if d is not None])
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.Lambda):
+            # lambdas are folded into the enclosing scope; good enough for a gate
+            names.update(_arg_names(node.args))
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        stack.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def _arg_names(args: ast.arguments) -> Set[str]:
+    names = {a.arg for a in [*args.posonlyargs, *args.args, *args.kwonlyargs]}
+    names.update(a.arg for a in (args.vararg, args.kwarg) if a is not None)
+    return names
+
+
+class _NameChecker:
+    """Walks the tree with a chain of scopes and reports names read but never bound."""
+
+    def __init__(self, tree: ast.Module):
+        self.findings: List[Finding] = []
+        self.skip_annotations = any(isinstance(node, ast.ImportFrom) and node.module == "__future__" and
+                                    any(alias.name == "annotations" for alias in node.names)
+                                    for node in tree.body)
+        self._reported: Set[Tuple[str, str]] = set()
+
+    def check(self, tree: ast.Module) -> List[Finding]:
+        if any(isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names)
+               for node in ast.walk(tree)):
+            return []  # a star import can bind anything
+        self._visit(tree.body, [(_bound_names(tree.body), False)], "module level")
+        return self.findings
+
+    def _visit(self, nodes: Iterable[ast.AST], chain: List[Tuple[Set[str], bool]], where: str) -> None:
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self._visit(node.decorator_list + node.args.defaults +
+                            [d for d in node.args.kw_defaults if d is not None], chain, where)
+                if not self.skip_annotations:
+                    self._visit([a.annotation for a in ast.walk(node.args) if isinstance(a, ast.arg) and a.annotation]
+                                + ([node.returns] if node.returns else []), chain, where)
+                # methods do not see their class body's names
+                inner = [scope for scope in chain if not scope[1]]
+                inner.append((_arg_names(node.args) | _bound_names(node.body), False))
+                owner = where.split(" ")[-1] if where.startswith("class ") else None
+                self._visit(node.body, inner, f"{owner}.{node.name}" if owner else node.name)
+            elif isinstance(node, ast.ClassDef):
+                self._visit(node.decorator_list + node.bases + [k.value for k in node.keywords], chain, where)
+                self._visit(node.body, chain + [(_bound_names(node.body), True)], f"class {node.name}")
+            elif isinstance(node, ast.Lambda):
+                self._visit([node.body], chain + [(_arg_names(node.args), False)], where)
+            elif isinstance(node, ast.AnnAssign) and self.skip_annotations:
+                self._visit([child for child in ast.iter_child_nodes(node) if child is not node.annotation],
+                            chain, where)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                if node.id not in _BUILTINS and not any(node.id in names for names, _ in chain):
+                    self._report(node, where)
+            else:
+                self._visit(ast.iter_child_nodes(node), chain, where)
+
+    def _report(self, node: ast.Name, where: str) -> None:
+        if (node.id, where) in self._reported:
+            return
+        self._reported.add((node.id, where))
+        where_text = "at module level" if where == "module level" else f"in {where.replace('class ', '')}"
+        if node.id in sys.stdlib_module_names or node.id in KNOWN_MEMBERS:
+            fix = KNOWN_MEMBERS.get(node.id, f"import {node.id}")
+            self.findings.append(Finding(node.lineno, "missing-import",
+                                         f"'{node.id}' is used {where_text} but never imported (add `{fix}`)"))
+        else:
+            self.findings.append(Finding(node.lineno, "undefined-name", f"undefined name '{node.id}' {where_text}"))
+
+
+def _call_name(call: ast.Call) -> str:
+    return ast.unparse(call.func)
+
+
+def _is_main_guard(node: ast.If) -> bool:
+    test = ast.unparse(node.test)
+    return "__name__" in test or "TYPE_CHECKING" in test
+
+
+def _has_side_effect(node: ast.AST) -> bool:
+    """True if evaluating node calls anything outside SAFE_CALLS (lambda bodies are not evaluated)."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, ast.Lambda):
+            continue
+        if isinstance(current, (ast.Call, ast.Await, ast.Yield, ast.YieldFrom)):
+            if not isinstance(current, ast.Call) or _call_name(current) not in SAFE_CALLS:
+                return True
+        stack.extend(ast.iter_child_nodes(current))
+    return False
+
+
+def side_effects(tree: ast.Module) -> List[Finding]:
+    """Top-level statements that do more than define things when the module is imported."""
+    findings = []
+    for index, node in enumerate(tree.body):
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+                             ast.Pass)):
+            continue
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            continue  # docstring or a bare constant
+        if isinstance(node, ast.If) and _is_main_guard(node):
+            continue
+        if isinstance(node, ast.Try) and all(isinstance(n, (ast.Import, ast.ImportFrom, ast.Pass, ast.Assign))
+                                             and not _has_side_effect(n)
+                                             for n in node.body + [s for h in node.handlers for s in h.body]):
+            continue  # optional-import fallbacks
+        if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)) and \
+                (node.value is None or not _has_side_effect(node.value)):
+            continue
+        source = ast.unparse(node).splitlines()[0]
+        findings.append(Finding(node.lineno, "side-effect",
+                                f"`{source[:80]}` runs when the module is imported; move it into a function "
+                                "or under if __name__ == '__main__'"))
+    return findings
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def message_method(text: str) -> str:
+    """Method name a message stands for: "Fetch Recent Maintenance (vehicleId)" -> "fetch_recent_maintenance"."""
+    label = text.split("(")[0].strip()
+    return re.sub(r"\W+", "_", label).strip("_").lower()
+
+
+def conformance(tree: ast.Module, diagram: Diagram) -> List[Finding]:
+    """Classes and methods the sequence diagram's request messages call for but the code lacks."""
+    classes: Dict[str, List[str]] = {
+        node.name: [item.name for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        for node in tree.body if isinstance(node, ast.ClassDef)
+    }
+    findings: List[Finding] = []
+    missing_classes: Set[str] = set()
+    for message in diagram.messages:
+        participant = diagram.participant(message.target)
+        if message.is_reply or (participant is not None and participant.kind == "actor") or not message.text:
+            continue
+        if message.target not in classes:
+            if message.target not in missing_classes:
+                missing_classes.add(message.target)
+                findings.append(Finding(0, "diagram", f"the diagram sends requests to {message.target}, "
+                                                      f"but no class {message.target} is defined"))
+            continue
+        wanted = _normalize(message_method(message.text))
+        if wanted and not any(wanted in _normalize(name) for name in classes[message.target]):
+            findings.append(Finding(0, "diagram", f"{message.target} has no method for the message "
+                                                  f"'{message.to_plantuml()}' (e.g. "
+                                                  f"{message.target}.{message_method(message.text)}())"))
+    return findings
+
+
+def analyze(code: str, filename: str = "<generated>", diagram: Optional[Diagram] = None) -> List[Finding]:
+    """Runs every check on code that already compiles; returns the findings in line order."""
+    tree = ast.parse(code, filename=filename)
+    findings = _NameChecker(tree).check(tree) + side_effects(tree)
+    findings.sort(key=lambda f: f.line)
+    if diagram is not None and diagram.kind == "sequence":
+        findings += conformance(tree, diagram)
+    return findings
+
+
+def format_findings(findings: List[Finding]) -> str:
+    """The findings as a numbered list for a refine prompt."""
+    return "\n".join(f"{i}. {finding}" for i, finding in enumerate(findings, 1))
@@ -0,0 +1,142 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from agents.backend_pool import get_backend_pool
+from agents.console import log
+from agents.llm_client import ask_agent, rejects_format
+from agents.plantuml import extract_block
+from agents.tracing import span
+from config.llm_config import get_llm_config
+
+# Structured replies: instead of hunting for @startuml blocks, code fences or the word
+# "APPROVED" in free-form text, the reply is constrained to a JSON schema through Ollama's
+# "format" parameter and parsed with json.loads. If the backend ignores the constraint
+# (older Ollama, the AutoGen path) or the JSON does not validate, the call is repeated once
+# without it and the reply is parsed the old, free-form way; once every backend host has
+# rejected schemas outright (HTTP 400), calls go free-form straight away. Every parse is recorded as a "parse" span, so the
+# trace summary shows schema vs. free-form replies and fallbacks per agent.
+
+PLANTUML_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {"plantuml": {"type": "string", "description": "the whole diagram, @startuml to @enduml"}},
+    "required": ["plantuml"],
+}
+
+CODE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {"code": {"type": "string", "description": "the complete Python file, no markdown"}},
+    "required": ["code"],
+}
+
+REVIEW_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": ["approved", "changes_requested"]},
+        "issues": {"type": "array", "items": {"type": "string"},
+                   "description": "specific, actionable problems; empty when approved"},
+    },
+    "required": ["verdict", "issues"],
+}
+
+_TYPES = {"string": str, "boolean": bool, "array": list, "object": dict}
+
+
+def validate(data: Any, schema: Dict[str, Any]) -> List[str]:
+    """Checks data against the small subset of JSON schema used above; returns the problems found."""
+    if not isinstance(data, dict):
+        return ["reply is not a JSON object"]
+    errors = [f"missing '{key}'" for key in schema.get("required", []) if key not in data]
+    for key, prop in schema.get("properties", {}).items():
+        if key not in data:
+            continue
+        value = data[key]
+        if not isinstance(value, _TYPES[prop["type"]]):
+            errors.append(f"'{key}' is not a {prop['type']}")
+        elif "enum" in prop and value not in prop["enum"]:
+            errors.append(f"'{key}' is not one of {prop['enum']}")
+        elif prop["type"] == "array" and not all(isinstance(v, _TYPES[prop["items"]["type"]]) for v in value):
+            errors.append(f"'{key}' has items that are not {prop['items']['type']}s")
+    return errors
+
+
+def strip_fences(code: str) -> str:
+    """Removes markdown code fences from a free-form reply."""
+    code = re.sub(r"```python\n?", "", code)
+    return re.sub(r"```\n?", "", code)
+
+
+def _from_text(text: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Free-form fallback: pulls the schema's fields out of prose the old way; None if it cannot."""
+    fields = schema["properties"]
+    if "plantuml" in fields:
+        block = extract_block(text)
+        return {"plantuml": block} if block else None
+    if "code" in fields:
+        return {"code": strip_fences(text)}
+    if "verdict" in fields:
+        approved = "APPROVED" in text.upper()
+        return {"verdict": "approved" if approved else "changes_requested", "issues": [] if approved else [text]}
+    return None
+
+
+def _instructions(schema: Dict[str, Any]) -> str:
+    # Ollama recommends stating the format in the prompt too; the constraint alone can
+    # make a model fill the fields with filler
+    return ("\n\nRespond ONLY with a JSON object matching this JSON schema (no markdown, no prose):\n"
+            + json.dumps(schema))
+
+
+def ask_structured(name: str, system_msg: str, user_msg: str, schema: Dict[str, Any],
+                   stop_on: Optional[str] = None, llm_config: Optional[Dict[str, Any]] = None,
+                   role: Optional[str] = None, cancel: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+    """Asks for a reply matching schema and returns it as a dict.
+
+    With "structured" on in the role's config the reply is constrained to schema and the
+    stream stops once the JSON object has closed; stop_on applies to the free-form call
+    (the fallback, or when structured output is off).
+    Returns None when not even the free-form reply contains what the schema asks for
+    (e.g. no PlantUML block); errors other than a rejected format (HTTP 400) propagate.
+    """
+    llm_config = llm_config or get_llm_config(role)
+    pool = get_backend_pool()
+    with span(f"parse:{name}", kind="parse", agent=role or name, mode="text", fallback=False) as attrs:
+        if llm_config.get("structured") and not pool.accepts_format():
+            attrs["fallback"] = True
+        elif llm_config.get("structured"):
+            attrs["mode"] = "schema"
+            try:
+                # a constrained model can keep emitting whitespace after the object; stop reading there
+                reply = ask_agent(name, system_msg + _instructions(schema), user_msg, stop_on="json",
+                                  llm_config={**llm_config, "format": schema}, role=role, cancel=cancel)
+                data = json.loads(reply)
+                errors = validate(data, schema)
+            except ValueError as e:
+                errors = [f"invalid JSON: {e}"]
+            except Exception as e:
+                # an Ollama without schema support answers 400 (and the pool stops sending it schemas);
+                # anything else is not about the format
+                if not rejects_format(e, {"format": schema}):
+                    raise
+                log(f"[WARN] {getattr(e, 'url', None) or 'The backend'} rejected the JSON schema format ({e}); "
+                    "parsing its replies free-form")
+                errors = [f"format rejected: {e}"]
+            if not errors:
+                attrs["ok"] = True
+                return data
+            attrs.update(fallback=True, error="; ".join(errors)[:200])
+        reply = ask_agent(name, system_msg, user_msg, stop_on=stop_on, llm_config=llm_config, role=role,
+                          cancel=cancel)
+        data = _from_text(reply, schema)
+        attrs["ok"] = data is not None
+        if data is None:
+            attrs["preview"] = reply[:300]
+        return data
+
+
+def ask_plantuml(name: str, system_msg: str, user_msg: str, role: Optional[str] = None) -> Optional[str]:
+    """Asks for a PlantUML diagram; returns the @startuml..@enduml block, or None if there is none."""
+    data = ask_structured(name, system_msg, user_msg, PLANTUML_SCHEMA, stop_on="plantuml", role=role)
+    # the JSON string is the block already; extract_block only trims stray text around it
+    return extract_block(data["plantuml"]) if data else None
@@ -0,0 +1,154 @@
+import json
+import re
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from agents.sandbox import get_pool
+from agents.tracing import span, traced
+
+# Runs the test scripts written by the Tester agent.
+# Every script runs in its own sandbox worker process with a fresh temporary working
+# directory, so the JSON "database" files the generated code creates (maintenance_db.json
+# and friends) never leak between tests or into generated/code/. Scripts run in parallel
+# and the results are written as a JSON report and as JUnit XML.
+
+DEFAULT_TEST_PATTERN = "test_*_impl.py"
+DEFAULT_TEST_TIMEOUT = 10
+DEFAULT_TEST_WORKERS = 5
+
+_RAN_RE = re.compile(r"^Ran (\d+) tests? in", re.M)
+_FAILED_RE = re.compile(r"^FAILED \(([^)]*)\)", re.M)
+
+
+def discover_tests(code_dir: Path, pattern: str = DEFAULT_TEST_PATTERN) -> List[Path]:
+    return sorted(code_dir.glob(pattern))
+
+
+def _unittest_counts(stderr: str) -> Dict[str, Optional[int]]:
+    """Reads unittest's "Ran N tests" / "FAILED (failures=1, errors=2)" lines; None for plain scripts."""
+    ran = _RAN_RE.search(stderr)
+    counts: Dict[str, Optional[int]] = {"tests": int(ran.group(1)) if ran else None, "failures": 0, "errors": 0}
+    failed = _FAILED_RE.search(stderr)
+    if failed:
+        for part in failed.group(1).split(","):
+            key, _, value = part.strip().partition("=")
+            if key in ("failures", "errors") and value.isdigit():
+                counts[key] = int(value)
+    return counts
+
+
+def run_test(test_path: Path, timeout: int = DEFAULT_TEST_TIMEOUT, impl: Optional[Path] = None) -> Dict[str, Any]:
+    """Runs one test script in a sandbox worker with its own temporary working directory.
+
+    impl runs the test against a different implementation file (e.g. a refined _v2 version):
+    both are copied into the temporary directory, impl under the module name the test imports.
+    """
+    with tempfile.TemporaryDirectory(prefix="gentest_") as tmp, \
+            span(f"test:{test_path.name}", kind="step") as attrs:
+        workdir = Path(tmp)
+        script = test_path
+        if impl is not None:
+            module = test_path.stem[len("test_"):] if test_path.stem.startswith("test_") else impl.stem
+            shutil.copyfile(impl, workdir / f"{module}.py")
+            script = workdir / test_path.name
+            shutil.copyfile(test_path, script)
+
+        started = time.perf_counter()
+        try:
+            stdout, stderr, returncode = get_pool().run(script, timeout=timeout, cwd=workdir)
+        except Exception as e:
+            stdout, stderr, returncode = "", f"Execution error: {str(e)}", -1
+        seconds = time.perf_counter() - started
+
+        if returncode == 0:
+            status = "passed"
+        elif returncode == -1 and stderr == "Execution timed out":
+            status = "timeout"
+        else:
+            status = "failed"
+        attrs.update(status=status, returncode=returncode)
+
+    return {"name": test_path.name, "status": status, "returncode": returncode, "seconds": round(seconds, 3),
+            **_unittest_counts(stderr), "stdout": stdout[-2000:], "stderr": stderr[-2000:]}
+
+
+def run_tests(paths: List[Path], max_workers: int = DEFAULT_TEST_WORKERS,
+              timeout: int = DEFAULT_TEST_TIMEOUT) -> List[Dict[str, Any]]:
+    """Runs test scripts concurrently; results come back in the order of paths."""
+    if not paths:
+        return []
+    results: Dict[Path, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths))), thread_name_prefix="tests") as pool:
+        futures = {pool.submit(copy_context().run, run_test, path, timeout): path for path in paths}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return [results[path] for path in paths]
+
+
+def failure_summary(result: Dict[str, Any], limit: int = 1500) -> str:
+    """The part of a failed run worth showing to the coder: the end of stderr (or stdout)."""
+    output = result["stderr"].strip() or result["stdout"].strip()
+    return f"{result['name']}: {result['status']} (returncode={result['returncode']})\n{output[-limit:]}"
+
+
+def write_reports(results: List[Dict[str, Any]], report_dir: Path) -> Dict[str, Any]:
+    """Writes report.json and junit.xml; returns the totals."""
+    report_dir.mkdir(parents=True, exist_ok=True)
+    totals = {
+        "scripts": len(results),
+        "passed": sum(1 for r in results if r["status"] == "passed"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "timeout": sum(1 for r in results if r["status"] == "timeout"),
+        "seconds": round(sum(r["seconds"] for r in results), 3),
+    }
+    (report_dir / "report.json").write_text(json.dumps({"totals": totals, "results": results}, indent=2),
+                                            encoding="utf-8")
+
+    # one <testcase> per script; unittest's own counts are kept as properties
+    suite = ET.Element("testsuite", name="generated_tests", tests=str(totals["scripts"]),
+                       failures=str(totals["failed"]), errors=str(totals["timeout"]), time=str(totals["seconds"]))
+    for r in results:
+        case = ET.SubElement(suite, "testcase", classname="generated", name=r["name"], time=str(r["seconds"]))
+        if r["tests"] is not None:
+            props = ET.SubElement(case, "properties")
+            for key in ("tests", "failures", "errors"):
+                ET.SubElement(props, "property", name=key, value=str(r[key]))
+        if r["status"] == "failed":
+            ET.SubElement(case, "failure", message=f"returncode={r['returncode']}").text = r["stderr"]
+        elif r["status"] == "timeout":
+            ET.SubElement(case, "error", message="timed out").text = r["stderr"]
+        ET.SubElement(case, "system-out").text = r["stdout"]
+    ET.ElementTree(suite).write(report_dir / "junit.xml", encoding="utf-8", xml_declaration=True)
+    return totals
+
+
+@traced("tests")
+def run_generated_tests(code_dir: Path, report_dir: Path, max_workers: int = DEFAULT_TEST_WORKERS,
+                        timeout: int = DEFAULT_TEST_TIMEOUT) -> List[Dict[str, Any]]:
+    """Discovers the Tester agent's scripts in code_dir, runs them in parallel and writes the reports."""
+    paths = discover_tests(code_dir)
+    if not paths:
+        print(f"[WARN] No generated tests ({DEFAULT_TEST_PATTERN}) found in {code_dir}")
+        return []
+    print(f"\n[TESTS] Running {len(paths)} generated test scripts ({min(max_workers, len(paths))} workers)...")
+
+    started = time.perf_counter()
+    results = run_tests(paths, max_workers, timeout)
+    elapsed = time.perf_counter() - started
+
+    width = max(len(r["name"]) for r in results)
+    for r in results:
+        counts = f"{r['tests']} tests" if r["tests"] is not None else "script"
+        print(f"{r['name']:<{width}}  {r['status']:<7}  {counts:<9}  {r['seconds']:>6.2f}s")
+        if r["status"] != "passed":
+            print(f"[FAIL] {failure_summary(r, limit=300)}")
+    totals = write_reports(results, report_dir)
+    print(f"[TESTS] {totals['passed']}/{totals['scripts']} passed in {elapsed:.1f}s wall "
+          f"({totals['seconds']:.1f}s total) -> {report_dir}")
+    return results
@@ -0,0 +1,278 @@
+import functools
+import itertools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from agents.console import log
+
+# Lightweight span tracing for the pipeline.
+# A span covers a stage, a unit of work inside a stage, or one LLM call. Spans nest through a
+# ContextVar, so work submitted with contextvars.copy_context() on worker threads is attributed
+# to the span that submitted it. Nothing is recorded unless a Trace is active (start_trace()).
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for when the backend does not report one."""
+    return (len(text) + 3) // 4
+
+
+class Span:
+    def __init__(self, span_id: int, name: str, kind: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self._t0 = time.perf_counter()
+        self.duration = 0.0
+
+    def path(self) -> List[str]:
+        names = []
+        span: Optional[Span] = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return names[::-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end,
+            "duration_s": round(self.duration, 4),
+            **self.attrs,
+        }
+
+
+class Trace:
+    """Collects finished spans and writes the JSONL trace, summary and flame-graph files."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def llm_spans(self) -> List[Span]:
+        return [s for s in self.spans if s.kind == "llm"]
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-stage wall time and per-agent (role) LLM time, latency and token totals."""
+        stages = {s.name: round(s.duration, 3) for s in self.spans if s.kind == "stage"}
+        agents: Dict[str, Dict[str, Any]] = {}
+        latencies: Dict[str, List[float]] = {}
+        ttfts: Dict[str, List[float]] = {}
+        for s in self.llm_spans():
+            role = s.attrs.get("agent", s.name)
+            agent = agents.setdefault(role, {
+                "calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                "prompt_chars": 0, "completion_chars": 0, "retries": 0, "fallbacks": 0, "cache_hits": 0,
+                "load_s": 0.0, "models": [],
+            })
+            latencies.setdefault(role, []).append(s.duration)
+            if s.attrs.get("ttft_s") is not None:
+                ttfts.setdefault(role, []).append(s.attrs["ttft_s"])
+            if s.attrs.get("model") and s.attrs["model"] not in agent["models"]:
+                agent["models"].append(s.attrs["model"])
+            agent["calls"] += 1
+            agent["seconds"] = round(agent["seconds"] + s.duration, 3)
+            agent["prompt_tokens"] += s.attrs.get("prompt_tokens", 0)
+            agent["completion_tokens"] += s.attrs.get("completion_tokens", 0)
+            agent["prompt_chars"] += s.attrs.get("prompt_chars", 0)
+            agent["completion_chars"] += s.attrs.get("completion_chars", 0)
+            agent["retries"] += s.attrs.get("retries", 0)
+            agent["fallbacks"] += s.attrs.get("fallbacks", 0)
+            agent["cache_hits"] += 1 if s.attrs.get("cache_hit") else 0
+            agent["load_s"] = round(agent["load_s"] + (s.attrs.get("load_s") or 0.0), 4)
+        for role, agent in agents.items():
+            agent["latency_p50_s"] = round(_percentile(latencies[role], 0.5), 3)
+            agent["latency_p95_s"] = round(_percentile(latencies[role], 0.95), 3)
+            agent["ttft_avg_s"] = round(sum(ttfts[role]) / len(ttfts[role]), 3) if role in ttfts else None
+        # prompt compaction (agents/prompt_budget.py): tokens sent vs. the verbatim prompt
+        prompts: Dict[str, Dict[str, int]] = {}
+        for s in self.spans:
+            if s.kind == "prompt":
+                p = prompts.setdefault(s.attrs.get("stage", s.name),
+                                       {"prompts": 0, "tokens_sent": 0, "tokens_saved": 0})
+                p["prompts"] += 1
+                p["tokens_sent"] += s.attrs.get("tokens_sent", 0)
+                p["tokens_saved"] += s.attrs.get("tokens_saved", 0)
+        # calls per Ollama host (agents/backend_pool.py)
+        hosts: Dict[str, int] = {}
+        for s in self.llm_spans():
+            if s.attrs.get("host"):
+                hosts[s.attrs["host"]] = hosts.get(s.attrs["host"], 0) + 1
+        # model loading: by the warm-up (agents/warmup.py) vs. inside agent calls (cold starts;
+        # only known for calls that read Ollama's final event, i.e. were not stopped early)
+        warmups = [s for s in self.spans if s.kind == "warmup"]
+        cold_start_s = sum(a["load_s"] for a in agents.values())
+        llm_s = sum(a["seconds"] for a in agents.values())
+        models = {
+            "warmup_models": len(warmups),
+            "warmup_load_s": round(sum(s.attrs.get("load_s") or 0.0 for s in warmups), 3),
+            "warmup_s": round(max((s.duration for s in warmups), default=0.0), 3),
+            "cold_start_s": round(cold_start_s, 3),
+            "generation_s": round(llm_s - cold_start_s, 3),
+        }
+        # structured replies (agents/structured.py): JSON-schema replies vs. free-form fallbacks
+        parsing: Dict[str, Dict[str, int]] = {}
+        for s in self.spans:
+            if s.kind == "parse":
+                p = parsing.setdefault(s.attrs.get("agent", s.name),
+                                       {"replies": 0, "schema": 0, "fallbacks": 0, "failed": 0})
+                p["replies"] += 1
+                p["schema"] += 1 if s.attrs.get("mode") == "schema" and not s.attrs.get("fallback") else 0
+                p["fallbacks"] += 1 if s.attrs.get("fallback") else 0
+                p["failed"] += 0 if s.attrs.get("ok") else 1
+        roots = [s for s in self.spans if s.parent is None]
+        return {
+            "wall_s": round(sum(s.duration for s in roots), 3),
+            "llm_calls": len(self.llm_spans()),
+            "stages": stages,
+            "agents": dict(sorted(agents.items(), key=lambda kv: -kv[1]["seconds"])),
+            "prompts": prompts,
+            "hosts": hosts,
+            "model_load": models,
+            "parsing": parsing,
+        }
+
+    def folded(self, weight: str = "time") -> List[str]:
+        """Folded stacks ("a;b;c value") for flamegraph.pl / speedscope.
+
+        weight="time" uses each span's self time in ms; weight="tokens" uses LLM tokens.
+        """
+        child_time: Dict[int, float] = {}
+        for s in self.spans:
+            if s.parent is not None:
+                child_time[s.parent.span_id] = child_time.get(s.parent.span_id, 0.0) + s.duration
+        totals: Dict[str, int] = {}
+        for s in self.spans:
+            if weight == "tokens":
+                value = s.attrs.get("prompt_tokens", 0) + s.attrs.get("completion_tokens", 0)
+            else:
+                # children may overlap when they ran concurrently, so self time is clamped at 0
+                value = int(max(0.0, s.duration - child_time.get(s.span_id, 0.0)) * 1000)
+            if value:
+                key = ";".join(s.path())
+                totals[key] = totals.get(key, 0) + value
+        return [f"{stack} {value}" for stack, value in sorted(totals.items())]
+
+    def write(self, out_dir: Path) -> Dict[str, Any]:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        with open(out_dir / "trace.jsonl", "w", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s.to_dict()) + "\n")
+        summary = self.summary()
+        (out_dir / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        (out_dir / "flame_time.folded").write_text("\n".join(self.folded("time")) + "\n", encoding="utf-8")
+        (out_dir / "flame_tokens.folded").write_text("\n".join(self.folded("tokens")) + "\n", encoding="utf-8")
+        return summary
+
+    def print_report(self) -> None:
+        """Prints a flame-style breakdown of wall time and tokens per stage and agent."""
+        summary = self.summary()
+        wall = summary["wall_s"] or 1.0
+        log(f"\n{'='*60}")
+        log(f"Trace summary: {summary['wall_s']:.1f}s wall, {summary['llm_calls']} LLM calls")
+        log('='*60)
+        for stage, seconds in summary["stages"].items():
+            bar = "#" * int(40 * seconds / wall)
+            log(f"{stage:<24} {seconds:>8.1f}s  {bar}")
+        if summary["agents"]:
+            total_tokens = sum(a["prompt_tokens"] + a["completion_tokens"] for a in summary["agents"].values()) or 1
+            log(f"\n{'Agent':<20} {'Calls':>5} {'LLM time':>9} {'p50':>7} {'p95':>7} {'Prompt tok':>10} "
+                f"{'Compl tok':>9}  Token share")
+            for agent, a in summary["agents"].items():
+                tokens = a["prompt_tokens"] + a["completion_tokens"]
+                bar = "#" * int(30 * tokens / total_tokens)
+                log(f"{agent:<20} {a['calls']:>5} {a['seconds']:>8.1f}s {a['latency_p50_s']:>6.2f}s "
+                    f"{a['latency_p95_s']:>6.2f}s {a['prompt_tokens']:>10} {a['completion_tokens']:>9}  {bar}")
+            log("Models: " + "; ".join(f"{agent}={','.join(a['models'])}" for agent, a in summary["agents"].items()))
+            if len(summary["hosts"]) > 1:
+                log("Hosts: " + "; ".join(f"{host}={calls}" for host, calls in summary["hosts"].items()))
+        load = summary["model_load"]
+        if load["warmup_models"] or load["cold_start_s"]:
+            log(f"Model load: warm-up {load['warmup_load_s']:.1f}s over {load['warmup_models']} model(s) "
+                f"({load['warmup_s']:.1f}s wall, in the background); cold starts inside calls "
+                f"{load['cold_start_s']:.1f}s; generation {load['generation_s']:.1f}s")
+        if summary["prompts"]:
+            log(f"\n{'Prompt stage':<20} {'Prompts':>7} {'Tok sent':>9} {'Tok saved':>9}")
+            for stage, p in summary["prompts"].items():
+                log(f"{stage:<20} {p['prompts']:>7} {p['tokens_sent']:>9} {p['tokens_saved']:>9}")
+        if summary["parsing"]:
+            log(f"\n{'Reply parsing':<20} {'Replies':>7} {'Schema':>7} {'Fallback':>8} {'Failed':>6}")
+            for agent, p in summary["parsing"].items():
+                log(f"{agent:<20} {p['replies']:>7} {p['schema']:>7} {p['fallbacks']:>8} {p['failed']:>6}")
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def start_trace() -> Trace:
+    """Activates a new trace for the current context and everything copied from it."""
+    trace = Trace()
+    _trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str, kind: str = "stage", **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Times a block as a child of the current span. Yields the span's attrs dict for extra fields."""
+    trace = _trace.get()
+    if trace is None:
+        yield attrs
+        return
+    s = Span(trace.next_id(), name, kind, _current.get(), attrs)
+    token = _current.set(s)
+    try:
+        yield s.attrs
+    except BaseException as e:
+        s.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end = time.time()
+        s.duration = time.perf_counter() - s._t0
+        trace.add(s)
+
+
+def traced(name: str, kind: str = "stage") -> Callable:
+    """Decorator form of span() for whole stage functions."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.console import log
+
+# Record / replay of LLM transcripts.
+# Recording appends every ask_agent() request and reply of a run to a JSONL file: a header
+# line with the format version, then one entry per call with the agent name, the prompts, the
+# early-stop mode, the output schema and the reply. Replaying serves those replies back from
+# ask_agent() without contacting a backend, so a whole pipeline runs deterministically in
+# seconds. Calls are matched by agent name and the how-many-th call of that name it is
+# (names are unique per use case and refine round, so this holds under concurrency). A call
+# whose prompt differs from the recorded one is still served, so one run reports every
+# changed prompt, and the run fails at the end with TranscriptMismatch.
+
+TRANSCRIPT_VERSION = 1
+
+
+class TranscriptMismatch(Exception):
+    """Raised when a replayed run sent prompts that differ from (or are missing in) the transcript."""
+
+
+def prompt_digest(system_msg: str, user_msg: str, stop_on: Optional[str], output_format: Any) -> str:
+    material = {"system": system_msg, "user": user_msg, "stop_on": stop_on, "format": output_format}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _prompt_diff(recorded: Dict[str, Any], system_msg: str, user_msg: str, limit: int = 12) -> str:
+    import difflib
+
+    old = (recorded["system"] + "\n" + recorded["user"]).splitlines()
+    new = (system_msg + "\n" + user_msg).splitlines()
+    lines = [line for line in difflib.unified_diff(old, new, "recorded", "current", n=0, lineterm="")]
+    return "\n".join(lines[:limit] + (["..."] if len(lines) > limit else []))
+
+
+class Transcript:
+    """One transcript file, either being recorded (mode="record") or replayed (mode="replay")."""
+
+    def __init__(self, path: Path, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown transcript mode '{mode}' (expected record or replay)")
+        self.path = Path(path)
+        self.mode = mode
+        self.entries: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self.problems: List[str] = []
+        self.served = 0
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            header = {"transcript": TRANSCRIPT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            self.path.write_text(json.dumps(header) + "\n", encoding="utf-8")
+
+    def _load(self) -> None:
+        with self.path.open(encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("transcript") != TRANSCRIPT_VERSION:
+                raise ValueError(f"{self.path} is not a version {TRANSCRIPT_VERSION} transcript")
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[(entry["name"], entry["occurrence"])] = entry
+
+    def _next_occurrence(self, name: str) -> int:
+        with self._lock:
+            occurrence = self._seen.get(name, 0)
+            self._seen[name] = occurrence + 1
+            return occurrence
+
+    def record(self, name: str, role: Optional[str], system_msg: str, user_msg: str, stop_on: Optional[str],
+               output_format: Any, reply: str, stats: Dict[str, Any]) -> None:
+        entry = {
+            "name": name,
+            "occurrence": self._next_occurrence(name),
+            "role": role,
+            "prompt_sha256": prompt_digest(system_msg, user_msg, stop_on, output_format),
+            "system": system_msg,
+            "user": user_msg,
+            "stop_on": stop_on,
+            "format": output_format,
+            "reply": reply,
+            "stats": stats,
+        }
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def replay(self, name: str, system_msg: str, user_msg: str, stop_on: Optional[str],
+               output_format: Any) -> Tuple[str, Dict[str, Any]]:
+        """Returns the recorded (reply, stats) for this call; raises TranscriptMismatch if there is none."""
+        occurrence = self._next_occurrence(name)
+        entry = self.entries.get((name, occurrence))
+        if entry is None:
+            self._flag(f"{name} (call {occurrence + 1}): not in the transcript")
+            raise TranscriptMismatch(f"No recorded reply for {name} (call {occurrence + 1}) in {self.path}")
+        if entry["prompt_sha256"] != prompt_digest(system_msg, user_msg, stop_on, output_format):
+            self._flag(f"{name} (call {occurrence + 1}): prompt changed\n"
+                       + _prompt_diff(entry, system_msg, user_msg))
+        with self._lock:
+            self.served += 1
+        return entry["reply"], dict(entry["stats"])
+
+    def _flag(self, problem: str) -> None:
+        log(f"[REPLAY] {problem}")
+        with self._lock:
+            self.problems.append(problem)
+
+    def check(self) -> None:
+        """Raises TranscriptMismatch if the replayed run did not match the transcript."""
+        if self.mode != "replay":
+            return
+        unused = len(self.entries) - self.served
+        if self.problems:
+            raise TranscriptMismatch(f"{len(self.problems)} call(s) did not match {self.path}:\n"
+                                     + "\n".join(self.problems))
+        log(f"[REPLAY] {self.served} replies served from {self.path}"
+            + (f", {unused} recorded call(s) not made" if unused else ""))
+
+
+_transcript: ContextVar[Optional[Transcript]] = ContextVar("transcript", default=None)
+
+
+def activate(transcript: Optional[Transcript]) -> None:
+    """Makes transcript the one ask_agent() records to / replays from in the current context."""
+    _transcript.set(transcript)
+
+
+def current_transcript() -> Optional[Transcript]:
+    return _transcript.get()
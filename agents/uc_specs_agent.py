@@ -1,19 +1,17 @@
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
-from autogen.agentchat import ConversableAgent
 
-from config.llm_config import get_llm_config
+from agents.llm_client import ask_agent
+from agents.tracing import traced
 
+@traced("use_case_specs")
 def generate_use_case_specs(uc_diagram_path: Path, output_path: Path) -> None:
     """Reads the system summary and asks an LLM agent to generate the use case specifications"""
 
     diagram_text = uc_diagram_path.read_text(encoding="utf-8")
-    llm_config = get_llm_config()
 
 
-    agent = ConversableAgent(
-        name="use_case_spec_agent",
-        system_message=(
+    system_message = (
             "You are a senior software engineer specializing writing formal use case specifications.\n"
             "INPUT: A UML use case diagram in PlantUML" \
             "OUTPUT: A structured use case specification for EACH use case." \
@@ -27,9 +25,7 @@ def generate_use_case_specs(uc_diagram_path: Path, output_path: Path) -> None:
             "- Alternate / Exception Flows (if any)\n\n"
             "Write the result in clear Markdown, with a level-2 heading (##) per use case.\n"
             "Do NOT invent new use cases. Only document the ones in the diagram."
-        ),
-        llm_config=llm_config,
-    )
+        )
 
     user_prompt = f"""
 Here is the UML use case diagram (PlantUML):
@@ -39,11 +35,7 @@ Here is the UML use case diagram (PlantUML):
 Generate the use case specifications as described. Output Markdown only.
 """
 
-    reply = agent.generate_reply(
-        messages=[{"role": "user", "content": user_prompt}]
-    )
-
-    specs_text = reply["content"] if isinstance(reply, dict) else str(reply)
+    specs_text = ask_agent("use_case_spec_agent", system_message, user_prompt, role="use_case_specs")
     output_path.write_text(specs_text, encoding="utf-8")
 
     print(f"[OK] Use case specifications generated at: {output_path}")
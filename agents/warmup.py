@@ -0,0 +1,80 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional
+
+from agents.backend_pool import get_backend_pool
+from agents.console import log
+from agents.scheduler import get_scheduler, priority_for
+from agents.tracing import span
+from config.llm_config import get_llm_config, get_warmup_config
+
+# Model warm-up: loads every configured model on every backend host before its first real
+# call needs it. Each (host, model) gets one tiny chat request (one token) carrying the
+# run's keep_alive and the same num_ctx as the agents' calls -- Ollama reloads a model
+# whose context size changes, so a warm-up with a different num_ctx would be wasted. The
+# request also runs the chat template once, so its prefix is already evaluated when the
+# first agent prompt arrives. The pipeline starts this in the background, so model loads
+# overlap with setup and with the stages that use a different model. Warm-ups count like
+# any other call: each waits for a scheduler slot (at the lowest priority) and is counted
+# in flight on its host, and a host's models are loaded one after another.
+
+WARMUP_SYSTEM_PROMPT = "You are a helpful assistant."
+
+
+def _warm_one(host: str, model: str, timeout: float) -> Dict[str, Any]:
+    import urllib.request
+
+    llm_config = get_llm_config()
+    payload = {
+        "model": model,
+        "messages": [{"role": "system", "content": WARMUP_SYSTEM_PROMPT}, {"role": "user", "content": "ok"}],
+        "stream": False,
+        "keep_alive": llm_config["keep_alive"],
+        "options": {"num_predict": 1, "num_ctx": llm_config["context_window"]},
+    }
+    request = urllib.request.Request(host.rstrip("/") + "/api/chat", data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    result: Dict[str, Any] = {"host": host, "model": model, "ok": False, "load_s": None}
+    started = time.perf_counter()
+    pool = get_backend_pool()
+    with span(f"warmup:{model}", kind="warmup", host=host, model=model) as attrs, \
+            get_scheduler().slot(priority_for("warmup")):
+        backend = pool.acquire(host)
+        ok = None
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as resp:
+                reply = json.loads(resp.read() or b"{}")
+            result["ok"] = ok = True
+            result["load_s"] = round(reply.get("load_duration", 0) / 1e9, 4)
+        except Exception as e:
+            # best effort: the real call loads the model anyway (and has retries)
+            result["error"] = str(e)
+        finally:
+            # a failed warm-up says little about the host (the model may just be missing)
+            pool.release(backend, ok)
+        result["seconds"] = round(time.perf_counter() - started, 4)
+        attrs.update(ok=result["ok"], load_s=result["load_s"])
+    if result["ok"]:
+        log(f"[WARMUP] {model} on {host}: ready in {result['seconds']:.2f}s (load {result['load_s']:.2f}s)")
+    else:
+        log(f"[WARN] Warm-up of {model} on {host} failed: {result['error']}")
+    return result
+
+
+def _warm_host(host: str, models: List[str], timeout: float) -> List[Dict[str, Any]]:
+    # one model at a time: Ollama loads them one after another anyway
+    return [_warm_one(host, model, timeout) for model in models]
+
+
+def warm_up(models: Optional[List[str]] = None, hosts: Optional[List[str]] = None,
+            timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Loads models (default: every role's first model) on hosts (default: the backend pool), hosts in parallel."""
+    config = get_warmup_config()
+    models = models or config["models"]
+    hosts = hosts or get_backend_pool().hosts
+    with ThreadPoolExecutor(max_workers=len(hosts), thread_name_prefix="warmup") as pool:
+        futures = [pool.submit(copy_context().run, _warm_host, host, models, timeout or config["timeout"])
+                   for host in hosts]
+        return [result for future in futures for result in future.result()]
@@ -0,0 +1,566 @@
+"""Local stub server that speaks enough of the Ollama chat API to run the pipeline.
+
+Replies are canned PlantUML / Markdown / Python chosen from the system prompt, served after a
+configurable first-token latency (+ jitter) and at a configurable token rate. Each reply ends
+with trailing prose, like real models do, so early stream termination is exercised.
+
+Models can be given a load delay: the first request for a model (or the first after its
+keep_alive ran out) waits that long, like Ollama loading weights, and the final event reports it
+as load_duration. An empty /api/generate request only loads (or with keep_alive 0 unloads) a model.
+
+A request with a JSON schema as "format" gets a JSON object with the schema's fields instead
+(plantuml / code / verdict + issues), like constrained decoding, followed by blank lines as
+some constrained models produce; json_format=False answers it
+with HTTP 400 like an Ollama without schema support. loose_rate makes that share of free-form
+reviews and code replies phrased loosely (an approval without the word APPROVED, code after a
+sentence of prose), the way real models drift from the requested format. Coder replies cover
+the sequence diagram in the prompt; defect_rate leaves an import out of that share of first drafts,
+and slow_rate makes that share of first drafts rewrite a JSON file of everything on every call.
+approve_rate is the share of unvalidated code the reviewer approves; code that validates its input
+(every refinement, and first drafts whose prompt shows approved examples) is always approved.
+diagram_error_rate makes that share of sequence and class diagrams leave out their last required
+line; a corrective prompt gets the diagram back with the listed missing lines added and the listed
+extra lines removed.
+
+Run standalone:  python -m bench.mock_ollama --port 11434 --latency 0.5 --jitter 0.1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+TRAILER = "\n\nThis output follows the requested structure. Let me know if you need any changes."
+# constrained models often keep emitting whitespace after the JSON object until num_predict
+JSON_TRAILER = "\n" * 64
+
+USE_CASES = [
+    "Register Vehicle",
+    "Log Maintenance Event",
+    "Edit/Delete Maintenance Record",
+    "View Maintenance History",
+    "Get Service Recommendation",
+]
+
+USE_CASE_DIAGRAM = "@startuml\nleft to right direction\nactor User\n" + "\n".join(
+    f"User --> ({name})" for name in USE_CASES) + "\n@enduml"
+
+CLASS_DIAGRAM = """@startuml
+class User {
+  +String userId
+  +String name
+}
+class Vehicle {
+  +String vin
+  +String make
+  +int year
+}
+class MaintenanceRecord {
+  +String recordId
+  +Date date
+  +float cost
+}
+class RecommendationService {
+  +analyze(vehicle: Vehicle) : List
+}
+class MaintenanceDB {
+  +store(record: MaintenanceRecord)
+  +getRecords(vehicleId: String) : List
+}
+User "1" -- "*" Vehicle
+Vehicle "1" *-- "*" MaintenanceRecord
+RecommendationService ..> Vehicle : analyzes
+MaintenanceDB ..> MaintenanceRecord : stores
+@enduml"""
+
+OUTLINE = """class MaintenanceDB:
+    records: dict
+    def insert(self, vehicle_id: str, record: dict) -> str
+    def query(self, vehicle_id: str) -> list
+
+class MaintenanceService:
+    db: MaintenanceDB
+    def handle(self, vehicle_id: str, details: dict) -> str"""
+
+IMPLEMENTATION = '''```python
+import json
+
+
+class MaintenanceDB:
+    def __init__(self):
+        self.records = {}
+
+    def insert(self, vehicle_id, record):
+        self.records.setdefault(vehicle_id, []).append(record)
+        return "Ack"
+
+    def query(self, vehicle_id):
+        return list(self.records.get(vehicle_id, []))
+
+
+class MaintenanceService:
+    def __init__(self, db):
+        self.db = db
+
+    def handle(self, vehicle_id, details):
+        return self.db.insert(vehicle_id, details)
+
+
+if __name__ == "__main__":
+    service = MaintenanceService(MaintenanceDB())
+    print(service.handle("V001", {"service": "Oil Change", "date": "2024-06-01"}))
+    print(json.dumps(service.db.query("V001")))
+```'''
+
+TESTS = '''```python
+import unittest
+
+
+class SmokeTest(unittest.TestCase):
+    def test_true(self):
+        self.assertTrue(True)
+
+
+if __name__ == "__main__":
+    unittest.main()
+```'''
+
+REVIEW_APPROVED = "APPROVED. The implementation follows the sequence diagram."
+REVIEW_CHANGES = "1. Validate vehicle_id before inserting.\n2. Return a structured result instead of a bare string."
+REVIEW_LOOSE = "Looks good to me. The implementation follows the sequence diagram."
+CODE_PREAMBLE = "Here is the implementation:\n"
+
+
+def implementation(user_msg: str, defect: bool = False, slow: bool = False, validated: bool = False) -> str:
+    """Coder reply that covers the sequence diagram in the prompt: a class per called participant
+    with a method per request message. defect leaves an import out, as models sometimes do; slow
+    rewrites a JSON file with everything stored on every call, as models often do; validated
+    checks the vehicle id and returns a structured result, as the canned review asks for."""
+    methods: Dict[str, List[str]] = {}
+    for match in re.finditer(r"^\d+\.\s*\w+\s*(-{1,2}>)\s*(\w+)\s*:\s*([^(\n]+)", user_msg, re.M):
+        arrow, target, label = match.groups()
+        if arrow == "->" and target != "User":
+            methods.setdefault(target, []).append(re.sub(r"\W+", "_", label.strip()).strip("_").lower())
+    if not methods:
+        return IMPLEMENTATION
+    lines = ["```python"] + ([] if defect else ["from datetime import datetime"]) + ["import json", ""]
+    for name, names in methods.items():
+        lines += ["", f"class {name}:", "    def __init__(self):", "        self.calls = []"]
+        if slow:
+            lines += ["", "    def _save(self):", f"        with open({name.lower() + '.json'!r}, 'w') as f:",
+                      "            json.dump(self.calls, f)"]
+        for method in dict.fromkeys(names):
+            lines += ["", f"    def {method}(self, *args):"]
+            if validated:
+                lines += ["        if not args or not args[0]:",
+                          "            return {\"status\": \"error\", \"message\": \"vehicle_id is required\"}"]
+            lines += [f"        self.calls.append(({method!r}, args))"]
+            lines += ["        self._save()"] if slow else []
+            lines += ["        return {\"status\": \"ok\"}" if validated else "        return \"Ack\""]
+    first, first_method = next(iter(methods.items()))
+    lines += ["", "", "if __name__ == \"__main__\":", f"    handler = {first}()",
+              f"    print(datetime.now().date(), json.dumps(handler.{first_method[0]}(\"V001\")))", "```"]
+    return "\n".join(lines)
+
+
+def specs_markdown() -> str:
+    sections = []
+    for name in USE_CASES:
+        sections.append(
+            f"## {name}\n"
+            f"- **Use Case Name:** {name}\n"
+            f"- **Brief Description:** Lets the user {name.lower()}.\n"
+            "- **Primary Actor:** User\n"
+            "- **Preconditions:** The user has opened the application.\n"
+            "- **Postconditions:** The change is stored.\n"
+            "- **Main Success Scenario:**\n"
+            f"  1. User selects \"{name}\".\n"
+            "  2. System performs the request and confirms.\n"
+            "- **Alternate / Exception Flows:**\n"
+            "  - Invalid input shows an error message.\n")
+    return "\n".join(sections)
+
+
+def sequence_diagram(system_msg: str) -> str:
+    """Echoes the required message lines from the seq-diagram system prompt into a diagram."""
+    messages = [ln[2:].strip() for ln in system_msg.splitlines()
+                if ln.startswith("- ") and re.search(r"\s-{1,2}>\s", ln)]
+    lines = ["@startuml", "actor User", "participant VehicleRegistry", "participant MaintenanceService",
+             "participant MaintenanceDB", "participant RecommendationEngine"] + messages + ["@enduml"]
+    return "```plantuml\n" + "\n".join(lines) + "\n```"
+
+
+def drop_last_requirement(diagram: str) -> str:
+    """The diagram without its last message / association line, as a model might forget it."""
+    lines = diagram.splitlines()
+    for i in range(len(lines) - 1, -1, -1):
+        if re.search(r"\s(-{1,2}|\*--|\.\.)>?\s", lines[i]):
+            return "\n".join(lines[:i] + lines[i + 1:])
+    return diagram
+
+
+def corrected_diagram(user_msg: str) -> str:
+    """Answers a corrective prompt: the current diagram with missing lines added, extra lines removed."""
+    current = re.search(r"Current diagram:\n(@startuml.*?@enduml)", user_msg, re.S)
+    if not current:
+        return "@startuml\n@enduml"
+    lines = current.group(1).splitlines()[:-1]
+    for kind, noun, element in re.findall(r"^- (missing|extra) (\w+): (.+)$", user_msg, re.M):
+        if kind == "extra":
+            lines = [ln for ln in lines if ln.strip() != element and not ln.strip().startswith(element + " ")]
+        elif noun in ("declaration", "class"):
+            lines.insert(1, element if noun == "declaration" else f"class {element}")
+        else:
+            lines.append(element)
+    return "```plantuml\n" + "\n".join(lines + ["@enduml"]) + "\n```"
+
+
+def parse_keep_alive(value: Any, default: float) -> float:
+    """Ollama keep_alive ("30m", "10s", "1h", seconds, negative = forever) -> seconds."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = re.fullmatch(r"\s*(-?[\d.]+)\s*([smh]?)\s*", str(value))
+        if not match:
+            return default
+        seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+
+def structured_reply(reply: str, schema: Dict[str, Any], approve: bool) -> Dict[str, Any]:
+    """The canned reply as the JSON object a schema-constrained model would send."""
+    fields = schema.get("properties", {})
+    if "plantuml" in fields:
+        match = re.search(r"@startuml.*?@enduml", reply, re.S)
+        return {"plantuml": match.group(0) if match else reply}
+    if "code" in fields:
+        return {"code": re.sub(r"```(python)?\n?", "", reply)}
+    if "verdict" in fields:
+        issues = [] if approve else [re.sub(r"^\d+\.\s*", "", line) for line in REVIEW_CHANGES.splitlines()]
+        return {"verdict": "approved" if approve else "changes_requested", "issues": issues}
+    return {key: reply for key in fields}
+
+
+def classify(system_msg: str) -> str:
+    """Maps a system prompt to the agent that sent it."""
+    text = system_msg.lower()
+    if "use case specification" in text:
+        return "use_case_specs"
+    if "use case diagram" in text:
+        return "use_case_diagram"
+    if "sequence diagram" in text and "plantuml" in text and "architect" not in text:
+        return "seq_diagram"
+    if "class diagram" in text:
+        return "class_diagram"
+    if "architect" in text:
+        return "architect"
+    if "reviewer" in text:
+        return "reviewer"
+    if "testing agent" in text or "test script" in text:
+        return "tester"
+    if "coding agent" in text:
+        return "coder"
+    return "other"
+
+
+class MockOllama:
+    """Threaded stub server; start() returns the base URL to use as OLLAMA_HOST."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, tokens_per_sec: float = 0.0,
+                 approve_rate: float = 1.0, seed: Optional[int] = None, host: str = "127.0.0.1", port: int = 0,
+                 models: Optional[List[str]] = None, fail_rate: float = 0.0, drop_rate: float = 0.0,
+                 error_event_rate: float = 0.0, num_parallel: int = 0, load_delay: float = 0.0,
+                 default_keep_alive: float = 300.0, json_format: bool = True, loose_rate: float = 0.0,
+                 defect_rate: float = 0.0, slow_rate: float = 0.0, diagram_error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.approve_rate = approve_rate
+        # None serves any model name; a list answers 404 "model not found" for the rest, like Ollama
+        self.models = models
+        # fault injection, per chat request: HTTP 500 before streaming, connection dropped
+        # mid-stream, or an Ollama {"error": ...} event mid-stream
+        self.fault_rates = {"http_500": fail_rate, "drop": drop_rate, "error_event": error_event_rate}
+        # like OLLAMA_NUM_PARALLEL: at most this many replies are generated at once, the rest
+        # wait inside the server (0 = unlimited)
+        self._slots = threading.BoundedSemaphore(num_parallel) if num_parallel else None
+        # model load simulation: model -> time its keep_alive runs out
+        self.load_delay = load_delay
+        self.default_keep_alive = default_keep_alive
+        self.loaded: Dict[str, float] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.json_format = json_format
+        self.loose_rate = loose_rate
+        self.defect_rate = defect_rate
+        self.slow_rate = slow_rate
+        self.diagram_error_rate = diagram_error_rate
+        self.random = random.Random(seed)
+        self.stats: Dict[str, Any] = {"requests": 0, "cancelled": 0, "in_flight": 0, "max_in_flight": 0,
+                                      "by_agent": {}, "faults": {}, "loads": 0, "load_s": 0.0,
+                                      "format_rejected": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reply_for(self, system_msg: str, schema: Optional[Dict[str, Any]] = None,
+                  user_msg: str = "") -> Tuple[str, str]:
+        agent = classify(system_msg)
+        with self._lock:
+            approve = self.random.random() < self.approve_rate
+            loose = self.random.random() < self.loose_rate
+            # refine prompts carry the current code; only first drafts get defects
+            defect = "Current code:" not in user_msg and self.random.random() < self.defect_rate
+            slow = "Current code:" not in user_msg and self.random.random() < self.slow_rate
+            diagram_error = self.random.random() < self.diagram_error_rate
+        # refinements address the canned review, and so do drafts that follow approved examples
+        validated = "Current code:" in user_msg or "Approved implementation of" in user_msg
+        approve = approve or '"vehicle_id is required"' in user_msg
+        # the reviewer reports micro-benchmark breaches when it is shown any
+        approve = approve and "Micro-benchmark results over threshold" not in user_msg
+        replies = {
+            "use_case_diagram": USE_CASE_DIAGRAM,
+            "use_case_specs": specs_markdown(),
+            "class_diagram": CLASS_DIAGRAM,
+            "architect": OUTLINE,
+            "coder": implementation(user_msg, defect, slow, validated),
+            "tester": TESTS,
+            "reviewer": REVIEW_APPROVED if approve else REVIEW_CHANGES,
+        }
+        reply = sequence_diagram(system_msg) if agent == "seq_diagram" else replies.get(agent, "OK")
+        if agent in ("seq_diagram", "class_diagram") and "Current diagram:" in user_msg:
+            reply = corrected_diagram(user_msg)
+        elif agent in ("seq_diagram", "class_diagram") and diagram_error:
+            reply = drop_last_requirement(reply)
+        if schema is not None:
+            return agent, json.dumps(structured_reply(reply, schema, approve)) + JSON_TRAILER
+        if loose and agent == "reviewer" and approve:
+            reply = REVIEW_LOOSE
+        elif loose and agent in ("coder", "tester"):
+            reply = CODE_PREAMBLE + reply
+        return agent, reply + TRAILER
+
+    def pick_fault(self) -> Optional[str]:
+        with self._lock:
+            roll = self.random.random()
+            for fault, rate in self.fault_rates.items():
+                if roll < rate:
+                    self.stats["faults"][fault] = self.stats["faults"].get(fault, 0) + 1
+                    return fault
+                roll -= rate
+        return None
+
+    def ensure_loaded(self, model: str, keep_alive: Any = None) -> float:
+        """Loads model if it is not resident (concurrent requests wait for one load); returns the seconds waited."""
+        started = time.perf_counter()
+        with self._lock:
+            lock = self._load_locks.setdefault(model, threading.Lock())
+        with lock:
+            with self._lock:
+                resident = self.loaded.get(model, 0.0) > time.monotonic()
+            if not resident and self.load_delay:
+                time.sleep(self.load_delay)
+            with self._lock:
+                if not resident:
+                    self.stats["loads"] += 1
+                    self.stats["load_s"] = round(self.stats["load_s"] + self.load_delay, 3)
+                self.loaded[model] = time.monotonic() + parse_keep_alive(keep_alive, self.default_keep_alive)
+        return time.perf_counter() - started
+
+    def unload(self, model: str) -> None:
+        with self._lock:
+            self.loaded.pop(model, None)
+
+    def first_token_delay(self) -> float:
+        with self._lock:
+            noise = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + noise)
+
+    def _enter(self, agent: str) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            self.stats["by_agent"][agent] = self.stats["by_agent"].get(agent, 0) + 1
+
+    def _leave(self, cancelled: bool) -> None:
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            self.stats["cancelled"] += 1 if cancelled else 0
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                if self.path == "/api/tags":
+                    names = mock.models or ["deepseek-coder-v2:16b"]
+                    self._send_json(200, {"models": [{"name": name} for name in names]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path not in ("/api/chat", "/api/generate"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                if mock.models is not None and request.get("model") not in mock.models:
+                    self._send_json(404, {"error": f"model '{request.get('model')}' not found"})
+                    return
+                if self.path == "/api/generate":
+                    # only the load / unload form of /api/generate (no prompt) is served
+                    if parse_keep_alive(request.get("keep_alive"), 1.0) == 0:
+                        mock.unload(request["model"])
+                        load_s = 0.0
+                    else:
+                        load_s = mock.ensure_loaded(request["model"], request.get("keep_alive"))
+                    self._send_json(200, {"model": request["model"], "response": "", "done": True,
+                                          "load_duration": int(load_s * 1e9)})
+                    return
+                messages = request.get("messages", [])
+                system_msg = next((m["content"] for m in messages if m.get("role") == "system"), "")
+                prompt_chars = sum(len(m.get("content", "")) for m in messages)
+                schema = request.get("format") if isinstance(request.get("format"), dict) else None
+                if schema is not None and not mock.json_format:
+                    with mock._lock:
+                        mock.stats["format_rejected"] += 1
+                    self._send_json(400, {"error": "invalid format: expected \"json\" or a JSON schema"})
+                    return
+                user_msg = next((m["content"] for m in messages if m.get("role") == "user"), "")
+                agent, reply = mock.reply_for(system_msg, schema, user_msg)
+
+                mock._enter(agent)
+                cancelled = False
+                fault = mock.pick_fault()
+                if mock._slots is not None:
+                    mock._slots.acquire()
+                try:
+                    self.load_s = mock.ensure_loaded(request.get("model", ""), request.get("keep_alive"))
+                    time.sleep(mock.first_token_delay())
+                    if fault == "http_500":
+                        self._send_json(500, {"error": "injected failure"})
+                    elif request.get("stream", True):
+                        cancelled = not self._stream(reply, prompt_chars, fault)
+                    else:
+                        if mock.tokens_per_sec:
+                            time.sleep(len(reply) / 4 / mock.tokens_per_sec)
+                        self._send_json(200, {"model": request.get("model"),
+                                              "message": {"role": "assistant", "content": reply},
+                                              "done": True, "load_duration": int(self.load_s * 1e9),
+                                              "prompt_eval_count": prompt_chars // 4,
+                                              "eval_count": len(reply) // 4})
+                finally:
+                    if mock._slots is not None:
+                        mock._slots.release()
+                    mock._leave(cancelled)
+
+            def _stream(self, reply: str, prompt_chars: int, fault: Optional[str] = None) -> bool:
+                """Sends the reply as NDJSON chunks; returns False if the client hung up."""
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunks: List[str] = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+                delay = 1.0 / mock.tokens_per_sec if mock.tokens_per_sec else 0.0
+                try:
+                    for i, chunk in enumerate(chunks):
+                        if fault and i == len(chunks) // 3:
+                            if fault == "error_event":
+                                self._write_event({"error": "injected error event"})
+                                self.wfile.write(b"0\r\n\r\n")
+                            # "drop": hang up without the terminating chunk
+                            self.close_connection = True
+                            return True
+                        self._write_event({"message": {"role": "assistant", "content": chunk}, "done": False})
+                        if delay:
+                            time.sleep(delay)
+                    self._write_event({"message": {"role": "assistant", "content": ""}, "done": True,
+                                       "load_duration": int(self.load_s * 1e9),
+                                       "prompt_eval_count": prompt_chars // 4, "eval_count": len(chunks)})
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    return False
+                return True
+
+            def _write_event(self, event: Dict[str, Any]) -> None:
+                data = (json.dumps(event) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub Ollama chat server for benchmarks")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="first-token latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- uniform jitter in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="0 streams as fast as possible")
+    parser.add_argument("--approve-rate", type=float, default=1.0, help="share of reviews that say APPROVED")
+    parser.add_argument("--models", help="comma-separated models to serve (default: any); others get a 404")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of streams cut off mid-reply")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="seconds to load a model that is not resident")
+    parser.add_argument("--num-parallel", type=int, default=0, help="replies generated at once (0 = unlimited)")
+    parser.add_argument("--loose-rate", type=float, default=0.0,
+                        help="share of free-form reviews / code replies that drift from the requested format")
+    parser.add_argument("--no-json-format", action="store_true", help="reject JSON-schema formats with HTTP 400")
+    parser.add_argument("--defect-rate", type=float, default=0.0,
+                        help="share of first coder drafts that leave out an import")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="share of first coder drafts that rewrite their whole JSON store on every call")
+    parser.add_argument("--diagram-error-rate", type=float, default=0.0,
+                        help="share of sequence / class diagrams that leave out their last required line")
+    args = parser.parse_args()
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()] if args.models else None
+    server = MockOllama(args.latency, args.jitter, args.tokens_per_sec, args.approve_rate, port=args.port,
+                        models=models, fail_rate=args.fail_rate, drop_rate=args.drop_rate,
+                        num_parallel=args.num_parallel, load_delay=args.load_delay,
+                        json_format=not args.no_json_format, loose_rate=args.loose_rate,
+                        defect_rate=args.defect_rate, slow_rate=args.slow_rate,
+                        diagram_error_rate=args.diagram_error_rate)
+    print(f"[MOCK] Ollama stub listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
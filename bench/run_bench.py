@@ -0,0 +1,603 @@
+"""End-to-end pipeline benchmark against the local Ollama stub.
+
+Scenarios:
+- overhead: main.main() with zero model latency, so the wall time is the pipeline's own cost
+- pipeline: main.main() with the configured latency/jitter; compares wall time to LLM time
+- scaling:  generate_code_from_sequences() at several worker counts
+- faults:   (--faults RATE) main.main() against a stub that fails RATE of its requests
+            (HTTP 500, dropped streams, error events); checks that retries recover every
+            call and that the client never exceeds its concurrency cap
+- hosts:    (--hosts N) generate_code_from_sequences() against one stub, then against N stubs
+            plus one that fails every request; each stub generates --num-parallel replies at
+            once. Checks that every call succeeds, the dead host is ejected and the load spreads
+- warmup:   (--load-delay S) main.main() against a stub that takes S seconds to load each model,
+            with and without the background warm-up; reports the wall time and model-load split
+- structured: (--loose-rate R) main.main() against a stub whose free-form replies drift from
+            the requested format R of the time, with free-form parsing and with JSON-schema
+            replies; reports parse fallbacks and refine rounds for both
+- static:   (--defect-rate R) generate_code_from_sequences() against a stub that leaves an
+            import out of R of the coder's first drafts, with and without the static gate;
+            reports executions, reviewer calls and refine rounds
+- perf:     (--slow-rate R) generate_code_from_sequences() against a stub whose first drafts
+            rewrite their whole JSON store on every call in R of the use cases, with and without
+            the micro-benchmark stage; reports breaches found, refine rounds and time spent benchmarking
+- exemplars: (--exemplars APPROVE_RATE) generate_code_from_sequences() twice over one exemplar
+            index, the first run starting empty; reports refine rounds, LLM calls and tokens per
+            use case for both runs
+
+Results are saved as bench/results/<git sha>.json; --compare checks them against an earlier
+result file (or commit sha) and exits non-zero on regressions.
+
+    python -m bench.run_bench --latency 0.2 --jitter 0.05 --workers 1,2,5
+    python -m bench.run_bench --compare bench/results/abc1234.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SAMPLE_SEQ_DIR = BASE_DIR / "generated" / "diagrams" / "sequence"
+
+sys.path.insert(0, str(BASE_DIR))
+
+from bench.mock_ollama import MockOllama  # noqa: E402
+
+
+def git_sha() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@contextlib.contextmanager
+def stub_server(**kwargs: Any):
+    """Starts a MockOllama and points the pipeline at it through OLLAMA_HOST."""
+    server = MockOllama(**kwargs)
+    previous = os.environ.get("OLLAMA_HOST")
+    os.environ["OLLAMA_HOST"] = server.start()
+    try:
+        yield server
+    finally:
+        server.stop()
+        if previous is None:
+            os.environ.pop("OLLAMA_HOST", None)
+        else:
+            os.environ["OLLAMA_HOST"] = previous
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool = True):
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def run_pipeline_once(latency: float, jitter: float, tokens_per_sec: float, verbose: bool) -> Dict[str, Any]:
+    import main
+
+    with stub_server(latency=latency, jitter=jitter, tokens_per_sec=tokens_per_sec, seed=1) as server:
+        out_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+        try:
+            started = time.perf_counter()
+            with quiet(not verbose):
+                summary = main.main(BASE_DIR / "summary" / "system_summary.txt", out_dir)
+            wall = time.perf_counter() - started
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    llm_seconds = sum(a["seconds"] for a in summary["agents"].values())
+    return {
+        "wall_s": round(wall, 3),
+        "llm_calls": summary["llm_calls"],
+        "llm_s": round(llm_seconds, 3),
+        "stages": summary["stages"],
+        "server_requests": server.stats["requests"],
+        "server_cancelled": server.stats["cancelled"],
+        "server_max_in_flight": server.stats["max_in_flight"],
+    }
+
+
+def run_codegen_once(workers: int, latency: float, jitter: float, tokens_per_sec: float,
+                     verbose: bool) -> Dict[str, Any]:
+    from agents.code_gen_agent import generate_code_from_sequences
+
+    with stub_server(latency=latency, jitter=jitter, tokens_per_sec=tokens_per_sec, seed=1) as server:
+        out_dir = Path(tempfile.mkdtemp(prefix="bench_codegen_"))
+        try:
+            started = time.perf_counter()
+            with quiet(not verbose):
+                results = generate_code_from_sequences(SAMPLE_SEQ_DIR, out_dir, max_workers=workers)
+            wall = time.perf_counter() - started
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return {
+        "workers": workers,
+        "wall_s": round(wall, 3),
+        "slowest_use_case_s": round(max((r["seconds"] for r in results), default=0.0), 3),
+        "server_max_in_flight": server.stats["max_in_flight"],
+    }
+
+
+@contextlib.contextmanager
+def stub_servers(configs: List[Dict[str, Any]]):
+    """Starts one MockOllama per config and points the pipeline at all of them through OLLAMA_HOSTS."""
+    servers = [MockOllama(**config) for config in configs]
+    previous = os.environ.get("OLLAMA_HOSTS")
+    os.environ["OLLAMA_HOSTS"] = ",".join(server.start() for server in servers)
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            server.stop()
+        if previous is None:
+            os.environ.pop("OLLAMA_HOSTS", None)
+        else:
+            os.environ["OLLAMA_HOSTS"] = previous
+
+
+def run_hosts_once(hosts: int, num_parallel: int, latency: float, verbose: bool) -> Dict[str, Any]:
+    from agents.backend_pool import configure_backend_pool
+    from agents.code_gen_agent import generate_code_from_sequences
+    from agents.scheduler import configure_scheduler, get_scheduler_config
+
+    def codegen(configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        with stub_servers(configs) as servers:
+            # the client cap follows the pool size, as get_scheduler_config() does for OLLAMA_HOSTS
+            scheduler = configure_scheduler(max_concurrency=num_parallel * len(configs), max_retries=5,
+                                            backoff_base_s=0.02, backoff_max_s=0.2, seed=1)
+            pool = configure_backend_pool(max_in_flight=num_parallel, eject_s=60.0)
+            out_dir = Path(tempfile.mkdtemp(prefix="bench_hosts_"))
+            try:
+                started = time.perf_counter()
+                with quiet(not verbose):
+                    generate_code_from_sequences(SAMPLE_SEQ_DIR, out_dir, max_workers=5)
+                wall = time.perf_counter() - started
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+        return {"wall_s": round(wall, 3), "failed_calls": scheduler.stats["failures"],
+                "retries": scheduler.stats["retries"],
+                "hosts": [{**pool.snapshot()[server.url], "server_requests": server.stats["requests"],
+                           "server_max_in_flight": server.stats["max_in_flight"]} for server in servers]}
+
+    stub = {"latency": latency, "jitter": 0.0, "seed": 1, "num_parallel": num_parallel}
+    try:
+        single = codegen([stub])
+        # the extra host answers every request with HTTP 500 and must be ejected
+        pooled = codegen([stub] * hosts + [{**stub, "fail_rate": 1.0}])
+    finally:
+        configure_scheduler(**get_scheduler_config())
+        configure_backend_pool()
+    healthy, dead = pooled["hosts"][:-1], pooled["hosts"][-1]
+    result = {
+        "hosts": hosts,
+        "num_parallel": num_parallel,
+        "single_wall_s": single["wall_s"],
+        "pooled_wall_s": pooled["wall_s"],
+        "speedup": round(single["wall_s"] / pooled["wall_s"], 2) if pooled["wall_s"] else None,
+        "requests_per_host": [h["server_requests"] for h in healthy],
+        "dead_host_requests": dead["server_requests"],
+        "dead_host_ejections": dead["ejections"],
+        "retries": pooled["retries"],
+        "failed_calls": pooled["failed_calls"],
+    }
+    result["checks"] = [msg for ok, msg in [
+        (result["failed_calls"] == 0, f"{result['failed_calls']} LLM call(s) failed with a healthy host available"),
+        (result["dead_host_ejections"] >= 1, "the failing host was never ejected"),
+        (hosts == 1 or all(result["requests_per_host"]), "some healthy host got no requests"),
+    ] if not ok]
+    return result
+
+
+def run_warmup_once(load_delay: float, latency: float, verbose: bool) -> Dict[str, Any]:
+    from agents.pipeline import PipelineOptions, run_pipeline_file
+
+    def pipeline(warmup: bool) -> Dict[str, Any]:
+        with stub_server(latency=latency, jitter=0.0, seed=1, load_delay=load_delay) as server:
+            out_dir = Path(tempfile.mkdtemp(prefix="bench_warmup_"))
+            try:
+                started = time.perf_counter()
+                with quiet(not verbose):
+                    summary = asyncio.run(run_pipeline_file(BASE_DIR / "summary" / "system_summary.txt", out_dir,
+                                                            PipelineOptions(warmup=warmup)))
+                wall = time.perf_counter() - started
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+        return {"wall_s": round(wall, 3), "server_loads": server.stats["loads"], **summary["model_load"]}
+
+    cold, warm = pipeline(False), pipeline(True)
+    return {"load_delay": load_delay, "cold": cold, "warm": warm,
+            "saved_s": round(cold["wall_s"] - warm["wall_s"], 3)}
+
+
+def run_structured_once(loose_rate: float, verbose: bool) -> Dict[str, Any]:
+    import main
+    from bench.mock_ollama import USE_CASES
+
+    def pipeline(structured: bool) -> Dict[str, Any]:
+        previous = os.environ.get("LLM_STRUCTURED")
+        os.environ["LLM_STRUCTURED"] = "1" if structured else "0"
+        try:
+            with stub_server(latency=0.0, jitter=0.0, seed=1, loose_rate=loose_rate) as server:
+                out_dir = Path(tempfile.mkdtemp(prefix="bench_structured_"))
+                try:
+                    with quiet(not verbose):
+                        summary = main.main(BASE_DIR / "summary" / "system_summary.txt", out_dir)
+                finally:
+                    shutil.rmtree(out_dir, ignore_errors=True)
+        finally:
+            if previous is None:
+                os.environ.pop("LLM_STRUCTURED", None)
+            else:
+                os.environ["LLM_STRUCTURED"] = previous
+        parsing = summary["parsing"].values()
+        return {
+            "llm_calls": summary["llm_calls"],
+            "replies": sum(p["replies"] for p in parsing),
+            "schema_replies": sum(p["schema"] for p in parsing),
+            "parse_failures": sum(p["failed"] for p in parsing),
+            # every coder request after the first per use case is a refinement; code that fails the
+            # syntax check gets no tests, so tester requests count the use cases with usable code
+            "refine_rounds": server.stats["by_agent"].get("coder", 0) - len(USE_CASES),
+            "use_cases_with_code": server.stats["by_agent"].get("tester", 0),
+        }
+
+    return {"loose_rate": loose_rate, "text": pipeline(False), "schema": pipeline(True)}
+
+
+def run_static_once(defect_rate: float, refine_rounds: int, verbose: bool) -> Dict[str, Any]:
+    from agents.code_gen_agent import generate_code_from_sequences
+
+    def codegen(static_gate: bool) -> Dict[str, Any]:
+        # approve_rate 0: the reviewer always asks for changes, like it would for a broken draft
+        with stub_server(latency=0.05, jitter=0.0, seed=1, defect_rate=defect_rate, approve_rate=0.0) as server:
+            out_dir = Path(tempfile.mkdtemp(prefix="bench_static_"))
+            try:
+                started = time.perf_counter()
+                with quiet(not verbose):
+                    results = generate_code_from_sequences(SAMPLE_SEQ_DIR, out_dir, refine_rounds=refine_rounds,
+                                                           static_gate=static_gate)
+                wall = time.perf_counter() - started
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+        return {
+            "wall_s": round(wall, 3),
+            "static_refines": sum(1 for r in results if r.get("static_refined")),
+            # a static refine replaces the first draft's execution
+            "executions": sum(r["refined"] + (0 if r.get("static_refined") else 1) for r in results),
+            "reviewer_calls": server.stats["by_agent"].get("reviewer", 0),
+            "refine_rounds": sum(r["refined"] for r in results),
+            "final_rc_nonzero": sum(1 for r in results if r["returncode"]),
+        }
+
+    return {"defect_rate": defect_rate, "refine_rounds": refine_rounds,
+            "without_gate": codegen(False), "with_gate": codegen(True)}
+
+
+def traced_codegen(out_dir: Path, verbose: bool, **kwargs: Any):
+    """generate_code_from_sequences() on the sample diagrams, traced on its own; returns (results, trace)."""
+    from contextvars import copy_context
+
+    from agents.code_gen_agent import generate_code_from_sequences
+    from agents.tracing import start_trace
+
+    def generate():
+        trace = start_trace()
+        with quiet(not verbose):
+            return generate_code_from_sequences(SAMPLE_SEQ_DIR, out_dir, **kwargs), trace
+
+    return copy_context().run(generate)
+
+
+def run_perf_once(slow_rate: float, verbose: bool) -> Dict[str, Any]:
+    def codegen(microbench: bool) -> Dict[str, Any]:
+        previous = os.environ.get("MICROBENCH")
+        os.environ["MICROBENCH"] = "1" if microbench else "0"
+        with stub_server(latency=0.05, jitter=0.0, seed=1, slow_rate=slow_rate, approve_rate=1.0) as server:
+            out_dir = Path(tempfile.mkdtemp(prefix="bench_perf_"))
+            try:
+                started = time.perf_counter()
+                results, trace = traced_codegen(out_dir, verbose, refine_rounds=2)
+                wall = time.perf_counter() - started
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+                if previous is None:
+                    os.environ.pop("MICROBENCH", None)
+                else:
+                    os.environ["MICROBENCH"] = previous
+        spans = [s for s in trace.spans if s.name.startswith("microbench:")]
+        return {
+            "wall_s": round(wall, 3),
+            "benchmarks": len(spans),
+            "bench_s": round(sum(s.duration for s in spans), 3),
+            "breaches_found": sum(s.attrs.get("breaches", 0) for s in spans),
+            "refine_rounds": sum(r["refined"] for r in results),
+            "reviewer_calls": server.stats["by_agent"].get("reviewer", 0),
+            "over_threshold_at_end": sum(1 for r in results if r.get("microbench", {}).get("breaches")),
+        }
+
+    return {"slow_rate": slow_rate, "without_microbench": codegen(False), "with_microbench": codegen(True)}
+
+
+def run_exemplars_once(approve_rate: float, verbose: bool) -> Dict[str, Any]:
+    index = Path(tempfile.mkdtemp(prefix="bench_exemplars_")) / "exemplars.json"
+
+    def codegen() -> Dict[str, Any]:
+        with stub_server(latency=0.05, jitter=0.0, seed=1, approve_rate=approve_rate):
+            out_dir = Path(tempfile.mkdtemp(prefix="bench_exemplars_"))
+            try:
+                results, trace = traced_codegen(out_dir, verbose, refine_rounds=2, exemplars=index)
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+        per_use_case = {}
+        for r in results:
+            llm = [s for s in trace.llm_spans() if s.name.endswith(r["use_case"])]
+            per_use_case[r["use_case"]] = {
+                "refine_rounds": r["refined"],
+                "llm_calls": len(llm),
+                "tokens": sum(s.attrs.get("prompt_tokens", 0) + s.attrs.get("completion_tokens", 0) for s in llm),
+                "exemplars": len(r.get("exemplars") or []),
+            }
+        return per_use_case
+
+    try:
+        # the first run starts from an empty index and fills it, the second one draws on it
+        return {"approve_rate": approve_rate, "cold": codegen(), "warm": codegen()}
+    finally:
+        shutil.rmtree(index.parent, ignore_errors=True)
+
+
+def run_faults_once(fault_rate: float, max_concurrency: int, verbose: bool) -> Dict[str, Any]:
+    import main
+    from agents.scheduler import configure_scheduler, get_scheduler_config
+
+    share = fault_rate / 3
+    scheduler = configure_scheduler(max_concurrency=max_concurrency, max_retries=5,
+                                    backoff_base_s=0.02, backoff_max_s=0.2, seed=1)
+    try:
+        with stub_server(latency=0.01, jitter=0.0, seed=1, fail_rate=share, drop_rate=share,
+                         error_event_rate=share) as server:
+            out_dir = Path(tempfile.mkdtemp(prefix="bench_faults_"))
+            try:
+                with quiet(not verbose):
+                    summary = main.main(BASE_DIR / "summary" / "system_summary.txt", out_dir)
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+    finally:
+        configure_scheduler(**get_scheduler_config())
+    result = {
+        "fault_rate": fault_rate,
+        "max_concurrency": max_concurrency,
+        "llm_calls": summary["llm_calls"],
+        "faults_injected": sum(server.stats["faults"].values()),
+        "retries": scheduler.stats["retries"],
+        "failed_calls": scheduler.stats["failures"],
+        "max_in_flight": scheduler.stats["max_active"],
+        # the stub counts a stream until its handler returns, which can be after the client hung up,
+        # so its number is informational; the check uses the scheduler's own count
+        "server_max_in_flight": server.stats["max_in_flight"],
+        "queued_s": round(scheduler.stats["queued_s"], 3),
+    }
+    result["checks"] = [msg for ok, msg in [
+        (result["failed_calls"] == 0, f"{result['failed_calls']} LLM call(s) failed despite retries"),
+        (result["max_in_flight"] <= max_concurrency,
+         f"{result['max_in_flight']} requests in flight, cap is {max_concurrency}"),
+    ] if not ok]
+    return result
+
+
+def median_run(fn, repeat: int, **kwargs: Any) -> Dict[str, Any]:
+    """Runs a scenario `repeat` times and keeps the run with the median wall time."""
+    runs = sorted((fn(**kwargs) for _ in range(repeat)), key=lambda r: r["wall_s"])
+    result = dict(runs[len(runs) // 2])
+    result["wall_s_runs"] = [r["wall_s"] for r in runs]
+    result["wall_s_stdev"] = round(statistics.pstdev(result["wall_s_runs"]), 3)
+    return result
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Returns one message per metric that got slower than baseline by more than threshold."""
+    regressions = []
+    metrics = [("overhead.wall_s", current["overhead"]["wall_s"], baseline["overhead"]["wall_s"]),
+               ("pipeline.wall_s", current["pipeline"]["wall_s"], baseline["pipeline"]["wall_s"])]
+    base_scaling = {s["workers"]: s for s in baseline.get("scaling", [])}
+    for s in current.get("scaling", []):
+        if s["workers"] in base_scaling:
+            metrics.append((f"scaling[{s['workers']}].wall_s", s["wall_s"], base_scaling[s["workers"]]["wall_s"]))
+    for name, now, before in metrics:
+        # ignore noise on sub-50ms measurements
+        if before > 0 and now - before > 0.05 and now > before * (1 + threshold):
+            regressions.append(f"{name}: {before:.3f}s -> {now:.3f}s (+{(now / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def load_baseline(ref: str) -> Optional[Dict[str, Any]]:
+    path = Path(ref)
+    if not path.exists():
+        path = RESULTS_DIR / f"{ref}.json"
+    if not path.exists():
+        print(f"[WARN] No baseline results found for {ref}")
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    overhead = results["overhead"]
+    pipeline = results["pipeline"]
+    print(f"\n{'='*60}")
+    print(f"Pipeline benchmark @ {results['commit']}")
+    print('='*60)
+    print(f"Framework overhead (zero-latency run): {overhead['wall_s']:.3f}s "
+          f"for {overhead['llm_calls']} LLM calls (+/- {overhead['wall_s_stdev']:.3f}s)")
+    print(f"Pipeline with latency {results['params']['latency']}s: wall {pipeline['wall_s']:.2f}s, "
+          f"sum of LLM call time {pipeline['llm_s']:.2f}s, "
+          f"{pipeline['server_cancelled']} generations cancelled early")
+    if results.get("faults"):
+        f = results["faults"]
+        print(f"Faults at {f['fault_rate']:.0%}: {f['faults_injected']} injected over {f['llm_calls']} LLM calls, "
+              f"{f['retries']} retries, {f['failed_calls']} failed calls, "
+              f"max {f['max_in_flight']} in flight (cap {f['max_concurrency']}, stub saw "
+              f"{f['server_max_in_flight']}), "
+              f"{f['queued_s']:.2f}s queued")
+        for message in f["checks"]:
+            print(f"[FAIL] {message}")
+    if results.get("hosts"):
+        h = results["hosts"]
+        print(f"Hosts: code gen on 1 stub {h['single_wall_s']:.2f}s, on {h['hosts']} stubs + 1 failing "
+              f"{h['pooled_wall_s']:.2f}s ({h['speedup']}x, {h['num_parallel']} parallel per stub); "
+              f"requests per host {h['requests_per_host']}, failing host got {h['dead_host_requests']} "
+              f"and was ejected {h['dead_host_ejections']}x, {h['retries']} retries, "
+              f"{h['failed_calls']} failed calls")
+        for message in h["checks"]:
+            print(f"[FAIL] {message}")
+    if results.get("warmup"):
+        w = results["warmup"]
+        for label in ("cold", "warm"):
+            r = w[label]
+            print(f"Model load {w['load_delay']}s, {'with' if label == 'warm' else 'no'} warm-up: wall {r['wall_s']:.2f}s, "
+                  f"{r['server_loads']} loads, warm-up {r['warmup_load_s']:.2f}s, "
+                  f"cold starts in calls {r['cold_start_s']:.2f}s, generation {r['generation_s']:.2f}s")
+        print(f"Warm-up saved {w['saved_s']:.2f}s of wall time")
+    if results.get("structured"):
+        st = results["structured"]
+        for label in ("text", "schema"):
+            r = st[label]
+            print(f"Replies drifting {st['loose_rate']:.0%}, {label} parsing: {r['replies']} replies "
+                  f"({r['schema_replies']} schema), {r['parse_failures']} unparsed, "
+                  f"{r['refine_rounds']} refine rounds, {r['use_cases_with_code']} use cases with code, "
+                  f"{r['llm_calls']} LLM calls")
+    if results.get("static"):
+        st = results["static"]
+        for label in ("without_gate", "with_gate"):
+            r = st[label]
+            print(f"Drafts with defects {st['defect_rate']:.0%}, {label.replace('_', ' ')}: wall {r['wall_s']:.2f}s, "
+                  f"{r['executions']} executions, {r['reviewer_calls']} reviewer calls, "
+                  f"{r['refine_rounds']} refine rounds ({r['static_refines']} static), "
+                  f"{r['final_rc_nonzero']} failing at the end")
+    if results.get("perf"):
+        perf = results["perf"]
+        for label in ("without_microbench", "with_microbench"):
+            r = perf[label]
+            print(f"Slow drafts {perf['slow_rate']:.0%}, {label.replace('_', ' ')}: wall {r['wall_s']:.2f}s, "
+                  f"{r['benchmarks']} benchmarks ({r['bench_s']:.2f}s), {r['breaches_found']} breaches found, "
+                  f"{r['refine_rounds']} refine rounds, {r['over_threshold_at_end']} over threshold at the end")
+    if results.get("exemplars"):
+        ex = results["exemplars"]
+        print(f"\nFirst drafts approved {ex['approve_rate']:.0%} without examples; cold (empty index) vs. warm run:")
+        print(f"{'Use case':<32} {'Refines':>9} {'Calls':>9} {'Tokens':>13} {'Examples':>8}")
+        for use_case, cold in ex["cold"].items():
+            warm = ex["warm"][use_case]
+            print(f"{use_case:<32} {cold['refine_rounds']:>4} -> {warm['refine_rounds']:<2} "
+                  f"{cold['llm_calls']:>4} -> {warm['llm_calls']:<2} {cold['tokens']:>6} -> {warm['tokens']:<5} "
+                  f"{warm['exemplars']:>8}")
+        totals = {run: {key: sum(uc[key] for uc in ex[run].values()) for key in ("refine_rounds", "tokens")}
+                  for run in ("cold", "warm")}
+        count = len(ex["cold"]) or 1
+        cold, warm = totals["cold"], totals["warm"]
+        print(f"Per use case: {cold['refine_rounds'] / count:.1f} -> {warm['refine_rounds'] / count:.1f} "
+              f"refine rounds, {cold['tokens'] / count:.0f} -> {warm['tokens'] / count:.0f} tokens")
+    if results["scaling"]:
+        base = results["scaling"][0]["wall_s"]
+        print(f"\n{'Workers':>7}  {'Wall':>8}  {'Speedup':>7}  {'Slowest UC':>10}  {'Max in flight':>13}")
+        for s in results["scaling"]:
+            print(f"{s['workers']:>7}  {s['wall_s']:>7.2f}s  {base / s['wall_s']:>6.2f}x  "
+                  f"{s['slowest_use_case_s']:>9.2f}s  {s['server_max_in_flight']:>13}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a local Ollama stub")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub first-token latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="stub latency jitter (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="stub streaming rate (0 = unlimited)")
+    parser.add_argument("--workers", default="1,2,5", help="code-gen worker counts for the scaling run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (median is kept)")
+    parser.add_argument("--faults", type=float, default=0.0,
+                        help="also run the fault-injection scenario with this failure rate (e.g. 0.2)")
+    parser.add_argument("--max-concurrency", type=int, default=2, help="client concurrency cap for --faults")
+    parser.add_argument("--hosts", type=int, default=0,
+                        help="also run the multi-host scenario with this many healthy stubs (e.g. 3)")
+    parser.add_argument("--num-parallel", type=int, default=1, help="replies each stub generates at once for --hosts")
+    parser.add_argument("--load-delay", type=float, default=0.0,
+                        help="also run the warm-up scenario with this stub model load time (e.g. 1.0)")
+    parser.add_argument("--loose-rate", type=float, default=0.0,
+                        help="also run the structured-output scenario with this share of drifting replies (e.g. 0.5)")
+    parser.add_argument("--defect-rate", type=float, default=0.0,
+                        help="also run the static-gate scenario with this share of defective first drafts (e.g. 0.6)")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="also run the micro-benchmark scenario with this share of slow first drafts (e.g. 0.6)")
+    parser.add_argument("--exemplars", type=float, default=None, metavar="APPROVE_RATE",
+                        help="also run code generation twice over one exemplar index, first drafts approved "
+                             "at this rate without examples (e.g. 0.2)")
+    parser.add_argument("--compare", help="baseline result file or commit sha")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--no-save", action="store_true", help="do not write bench/results/<sha>.json")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "commit": git_sha(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {"latency": args.latency, "jitter": args.jitter, "tokens_per_sec": args.tokens_per_sec},
+    }
+    results["overhead"] = median_run(run_pipeline_once, args.repeat, latency=0.0, jitter=0.0,
+                                     tokens_per_sec=0.0, verbose=args.verbose)
+    results["pipeline"] = median_run(run_pipeline_once, args.repeat, latency=args.latency, jitter=args.jitter,
+                                     tokens_per_sec=args.tokens_per_sec, verbose=args.verbose)
+    results["scaling"] = [
+        median_run(run_codegen_once, args.repeat, workers=int(w), latency=args.latency, jitter=args.jitter,
+                   tokens_per_sec=args.tokens_per_sec, verbose=args.verbose)
+        for w in args.workers.split(",") if w.strip()
+    ]
+    if args.faults:
+        results["faults"] = run_faults_once(args.faults, args.max_concurrency, args.verbose)
+    if args.load_delay:
+        results["warmup"] = run_warmup_once(args.load_delay, args.latency, args.verbose)
+    if args.hosts:
+        results["hosts"] = run_hosts_once(args.hosts, args.num_parallel, args.latency, args.verbose)
+    if args.loose_rate:
+        results["structured"] = run_structured_once(args.loose_rate, args.verbose)
+    if args.defect_rate:
+        results["static"] = run_static_once(args.defect_rate, 2, args.verbose)
+    if args.slow_rate:
+        results["perf"] = run_perf_once(args.slow_rate, args.verbose)
+    if args.exemplars is not None:
+        results["exemplars"] = run_exemplars_once(args.exemplars, args.verbose)
+    print_report(results)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        out_path = RESULTS_DIR / f"{results['commit']}.json"
+        out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n[OK] Results saved to: {out_path}")
+
+    if results.get("faults", {}).get("checks") or results.get("hosts", {}).get("checks"):
+        return 1
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        if baseline:
+            regressions = compare(results, baseline, args.threshold)
+            print(f"\nCompared with {baseline['commit']}: "
+                  f"{'no regressions' if not regressions else f'{len(regressions)} regression(s)'}")
+            for line in regressions:
+                print(f"[REGRESSION] {line}")
+            return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
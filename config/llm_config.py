@@ -1,38 +1,175 @@
-# config/llm_config.py
+import os
+from typing import Any, Dict, List, Optional
 
-from typing import Any, Dict, List
+DEFAULT_MODEL = "deepseek-coder-v2:16b"
 
+# How long Ollama keeps a model loaded after a request (its default is 5m). Long enough that
+# the gaps between pipeline stages never unload the 16B model mid-run.
+KEEP_ALIVE = "30m"
 
-def get_config_list() -> List[Dict[str, Any]]:
+# Per-role settings. Any key left out falls back to the shared defaults in get_llm_config().
+# "model" is tried first, then each model in "fallbacks" in order (e.g. when the smaller
+# model is not pulled, or its host fails). Roles match the `role=` passed to ask_agent().
+ROLE_CONFIG: Dict[str, Dict[str, Any]] = {
+    # light roles: short, mostly formulaic replies -> a smaller/faster model
+    "use_case_diagram": {"model": "qwen2.5-coder:7b", "fallbacks": [DEFAULT_MODEL],
+                         "max_tokens": 1024, "timeout": 60},
+    "reviewer": {"model": "qwen2.5-coder:7b", "fallbacks": [DEFAULT_MODEL],
+                 "temperature": 0.0, "max_tokens": 768, "timeout": 60},
+    "seq_diagram": {"max_tokens": 1024, "timeout": 60},
+    "class_diagram": {"max_tokens": 2048},
+    "use_case_specs": {"max_tokens": 3072},
+    "architect": {"max_tokens": 1536},
+    "tester": {"max_tokens": 2048},
+    # the coder is on the critical path of every use case and gets the most room
+    "coder": {"max_tokens": 4096, "timeout": 180},
+}
+
+
+def get_backend_hosts() -> List[str]:
+    """
+    Ollama hosts to spread calls over. OLLAMA_HOSTS takes a comma-separated list
+    (e.g. "http://gpu1:11434,http://gpu2:11434"); otherwise OLLAMA_HOST or the local default.
+    """
+    hosts = os.environ.get("OLLAMA_HOSTS") or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+    return [host.strip() for host in hosts.split(",") if host.strip()]
+
+
+def get_config_list(model: str = DEFAULT_MODEL, fallbacks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
     Configuration list for models served by Ollama.
+    Entries are tried in order: the model first, then its fallbacks.
     """
     return [
         {
             # Must match the model name as shown by `ollama list`
-            "model": "deepseek-coder-v2:16b",
+            "model": name,
 
             # Tell AutoGen to use the Ollama client instead of OpenAI
             "api_type": "ollama",
 
-            # Where Ollama is running (default)
-            "client_host": "http://localhost:11434",
+            # Where Ollama is running (default); OLLAMA_HOST overrides it,
+            # e.g. to point the pipeline at the benchmark stub server.
+            # With several OLLAMA_HOSTS each streamed call is routed by agents/backend_pool.py.
+            "client_host": get_backend_hosts()[0],
 
-            # Optional tweaks
-            "stream": False,
+            # Stream replies so agents can stop reading (and cancel generation)
+            # as soon as the PlantUML block or code fence they asked for is complete.
+            # Set to False to go through AutoGen's non-streaming client instead.
+            "stream": True,
         }
+        for name in [model, *(fallbacks or [])]
     ]
 
 
-def get_llm_config() -> Dict[str, Any]:
+def get_llm_config(role: Optional[str] = None) -> Dict[str, Any]:
     """
-    Shared llm_config for all agents.
+    llm_config for an agent role (shared defaults if role is None or has no entry in ROLE_CONFIG).
     This is what you'll pass to ConversableAgent / AssistantAgent.
     """
+    overrides = ROLE_CONFIG.get(role or "", {})
     return {
-        "config_list": get_config_list(),
-        "temperature": 0.2,
-        "timeout": 120,
-        "max_tokens": 4096,
+        "config_list": get_config_list(overrides.get("model", DEFAULT_MODEL), overrides.get("fallbacks")),
+        "temperature": overrides.get("temperature", 0.2),
+        # seconds per socket read; deadline bounds the whole call including retries
+        "timeout": overrides.get("timeout", 120),
+        "deadline": overrides.get("deadline", 3 * overrides.get("timeout", 120)),
+        "max_tokens": overrides.get("max_tokens", 4096),
+        # Context window requested from Ollama (num_ctx); prompts are budgeted against
+        # context_window - max_tokens, see agents/prompt_budget.py
+        "context_window": overrides.get("context_window", 16384),
+        "keep_alive": overrides.get("keep_alive", KEEP_ALIVE),
+        # Constrain replies to a JSON schema via Ollama's "format" (agents/structured.py);
+        # LLM_STRUCTURED=0 goes back to parsing free-form replies
+        "structured": overrides.get("structured", os.environ.get("LLM_STRUCTURED", "1") != "0"),
     }
 
+
+def get_scheduler_config() -> Dict[str, Any]:
+    """
+    Settings for the client-side LLM scheduler (agents/scheduler.py), shared by all roles.
+    Keep OLLAMA_NUM_PARALLEL at the servers' setting so extra calls wait here; the cap
+    grows with the number of backend hosts.
+    """
+    return {
+        "max_concurrency": int(os.environ.get("OLLAMA_NUM_PARALLEL", 4)) * len(get_backend_hosts()),
+        "max_retries": 3,
+        "backoff_base_s": 0.5,
+        "backoff_max_s": 8.0,
+    }
+
+
+def get_backend_pool_config() -> Dict[str, Any]:
+    """Settings for routing calls over the Ollama hosts (agents/backend_pool.py)."""
+    return {
+        "hosts": get_backend_hosts(),
+        # requests one host serves at once (its OLLAMA_NUM_PARALLEL)
+        "max_in_flight": int(os.environ.get("OLLAMA_NUM_PARALLEL", 4)),
+        # consecutive failures before a host is ejected, and for how long
+        "eject_after": 2,
+        "eject_s": 30.0,
+        "eject_max_s": 300.0,
+    }
+
+
+def get_cache_config() -> Dict[str, Any]:
+    """
+    LLM reply cache (agents/reply_cache.py). Off for single runs unless LLM_CACHE_DIR is set;
+    `main.py batch` turns it on so product variants share identical replies.
+    """
+    directory = os.environ.get("LLM_CACHE_DIR")
+    return {"enabled": bool(directory), "directory": directory, "max_entries": 1024}
+
+
+def get_warmup_config() -> Dict[str, Any]:
+    """
+    Model warm-up at pipeline start (agents/warmup.py): every role's first model is loaded on
+    every backend host while the pipeline sets up. LLM_WARMUP=0 turns it off.
+    """
+    models: List[str] = []
+    for role in [None, *ROLE_CONFIG]:
+        model = get_llm_config(role)["config_list"][0]["model"]
+        if model not in models:
+            models.append(model)
+    return {
+        "enabled": os.environ.get("LLM_WARMUP", "1") != "0",
+        "models": models,
+        # a cold 16B model can take minutes to load from disk
+        "timeout": 600,
+    }
+
+
+def get_microbench_config() -> Dict[str, Any]:
+    """
+    Micro-benchmark of generated implementations (agents/microbench.py): `records` calls per
+    public method over `vehicles` vehicle ids, in a sandbox worker. Methods under min_ops_per_sec,
+    slowing down more than max_slowdown as data grows or over max_peak_mb go to the reviewer.
+    MICROBENCH=0 turns it off.
+    """
+    return {
+        "enabled": os.environ.get("MICROBENCH", "1") != "0",
+        "vehicles": int(os.environ.get("MICROBENCH_VEHICLES", 100)),
+        "records": int(os.environ.get("MICROBENCH_RECORDS", 1000)),
+        "method_budget_s": 1.0,
+        "total_budget_s": 8.0,
+        "min_ops_per_sec": 1000,
+        "max_slowdown": 4.0,
+        "max_peak_mb": 64,
+    }
+
+
+def get_exemplar_config() -> Dict[str, Any]:
+    """
+    Few-shot context from approved code of earlier runs (agents/exemplars.py). The index is
+    out_dir/exemplars.json unless EXEMPLAR_INDEX names another file; EXEMPLARS=0 turns it off.
+    Matches below min_score are not used; the architect gets the matches shrunk to
+    architect_tokens (signatures), the coder to coder_tokens.
+    """
+    return {
+        "enabled": os.environ.get("EXEMPLARS", "1") != "0",
+        "path": os.environ.get("EXEMPLAR_INDEX"),
+        "top_k": 2,
+        "min_score": 0.35,
+        "architect_tokens": 300,
+        "coder_tokens": 900,
+    }
@@ -1,54 +1,149 @@
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import sys
 from pathlib import Path
-from agents.uc_diagram_agent import generate_use_case_diagram
-from agents.uc_specs_agent import generate_use_case_specs
-from agents.seq_diagram_agent import generate_seq_diagram
-from agents.class_diagram_agent import generate_class_diagram
-from agents.code_gen_agent import generate_code_from_sequences
+from typing import List, Optional, Sequence, Union
+
+from agents.pipeline import IMPORT_PROFILE, STAGES, PipelineOptions, load_stage, run_pipeline_file
 
 BASE_DIR = Path(__file__).parent
 
 SUMMARY_PATH = BASE_DIR / "summary" / "system_summary.txt"
 GENERATED_DIR = BASE_DIR / "generated"
-DIAGRAMS_DIR = GENERATED_DIR / "diagrams"
-SPECS_DIR = GENERATED_DIR / "specs"
-SEQ_DIR = DIAGRAMS_DIR / "sequence"
-CODE_DIR = GENERATED_DIR / "code"
-
-CLASS_DIAGRAM_FILE = DIAGRAMS_DIR / "class_diagram.puml"
-
-
-DIAGRAMS_DIR.mkdir(parents=True, exist_ok=True)
-SPECS_DIR.mkdir(parents=True, exist_ok=True)
-SEQ_DIR.mkdir(parents=True, exist_ok=True)
-CODE_DIR.mkdir(parents=True, exist_ok=True)
-
-
-
 
 
-def main():
-
-    output_file = DIAGRAMS_DIR / "use_case_diagram.puml"  # .puml is the PlantUML extension
-    uc_specs_file = SPECS_DIR / "use_case_specs.md"
-   
-
-
-
-    generate_use_case_diagram(SUMMARY_PATH, output_file)
-
-    generate_use_case_specs(output_file, uc_specs_file)
-
-    generate_seq_diagram(uc_specs_file, SEQ_DIR)
-
-    generate_class_diagram(uc_specs_file, CLASS_DIAGRAM_FILE)
+def parse_stages(value: str) -> List[str]:
+    """Turns "specs,seq" into ["specs", "seq"] in pipeline order; "all" selects every stage."""
+    if value.strip() == "all":
+        return list(STAGES)
+    selected = [s.strip() for s in value.split(",") if s.strip()]
+    unknown = [s for s in selected if s not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    return [s for s in STAGES if s in selected]
+
+
+def print_import_profile() -> None:
+    """Prints how long each agent import took and how long startup took overall."""
+    print(f"\n{'Module':<32} {'Import':>9}")
+    for module_name, seconds in IMPORT_PROFILE:
+        print(f"{module_name:<32} {seconds * 1000:>7.1f}ms")
+    print(f"Startup before first stage: {(time.perf_counter() - _STARTED) * 1000:.0f}ms")
+
+
+def main(summary_path: Path = SUMMARY_PATH, generated_dir: Path = GENERATED_DIR,
+         stages: Optional[Sequence[str]] = None, profile_imports: bool = False,
+         seq_mode: str = "template", candidates: int = 1, refine_rounds: int = 1,
+         resume: bool = False, warmup: Optional[bool] = None, record: Optional[Path] = None,
+         replay: Optional[Path] = None, exemplars: Union[Path, bool, None] = None) -> dict:
+    """Runs the selected stages (all by default); returns the trace summary.
+
+    Stages read their inputs from the previous stage's output files, so a partial run
+    (e.g. only "code") reuses whatever an earlier run left in generated_dir.
+    seq_mode picks how sequence diagrams are made: "template" (no LLM), "hybrid" or "llm".
+    candidates and refine_rounds are passed to the code stage (best-of-N coder, review rounds).
+    Progress is checkpointed in generated_dir/run_state.json after every stage and use case;
+    resume=True skips whatever an earlier run of the same summary finished.
+    warmup loads the models in the background first (None: on unless LLM_WARMUP=0).
+    record writes every LLM request and reply to a transcript file; replay serves the replies
+    from one instead of Ollama and raises TranscriptMismatch if a prompt changed.
+    exemplars is the index of approved code used as few-shot context, or False for none
+    (None: on unless EXEMPLARS=0, in EXEMPLAR_INDEX or generated_dir/exemplars.json).
+    See agents/pipeline.py for the async API this wraps.
+    """
+    import asyncio  # ~50ms, only paid when the pipeline actually runs
+
+    options = PipelineOptions(stages, seq_mode, candidates, refine_rounds, resume, warmup, record, replay, exemplars)
+    if profile_imports:
+        for name in options.stages or STAGES:
+            load_stage(name)
+        print_import_profile()
+    return asyncio.run(run_pipeline_file(summary_path, generated_dir, options))
+
+
+def cli(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate UML artifacts and code from a system summary.")
+    sub = parser.add_subparsers(dest="command")
+    run = sub.add_parser("run", help="run the pipeline (all stages by default)")
+    run.add_argument("--stages", type=parse_stages, default=list(STAGES),
+                     help=f"comma-separated stages to run: {','.join(STAGES)} or all (default: all)")
+    run.add_argument("--summary", type=Path, default=SUMMARY_PATH, help="system summary text file")
+    run.add_argument("--out", type=Path, default=GENERATED_DIR, help="output directory (default: generated/)")
+    run.add_argument("--profile-imports", action="store_true", help="print agent import times before running")
+    run.add_argument("--seq-mode", choices=["template", "hybrid", "llm"], default="template",
+                     help="sequence diagrams from the message table (template), template + LLM notes "
+                          "(hybrid) or fully by the LLM (llm); default: template")
+    run.add_argument("--candidates", type=int, default=1,
+                     help="coder candidates per use case; the first that runs and passes its tests wins (default: 1)")
+    run.add_argument("--resume", action="store_true",
+                     help="continue the last run in --out from its first unfinished stage / use case")
+    run.add_argument("--refine-rounds", type=int, default=1, help="max reviewer -> refine rounds (default: 1)")
+    run.add_argument("--no-warmup", dest="warmup", action="store_const", const=False,
+                     help="do not preload the models in the background at start")
+    exemplars = run.add_mutually_exclusive_group()
+    exemplars.add_argument("--exemplars", type=Path, metavar="INDEX",
+                           help="index of approved code used as few-shot context (default: <out>/exemplars.json)")
+    exemplars.add_argument("--no-exemplars", dest="exemplars", action="store_const", const=False,
+                           help="do not use or add to the index of approved code")
+    transcript = run.add_mutually_exclusive_group()
+    transcript.add_argument("--record", type=Path, metavar="TRANSCRIPT",
+                            help="write every LLM request and reply to this transcript file (JSONL)")
+    transcript.add_argument("--replay", type=Path, metavar="TRANSCRIPT",
+                            help="serve LLM replies from a recorded transcript; exits 1 if a prompt changed")
+    batch = sub.add_parser("batch", help="run the pipeline for every summary in a directory")
+    batch.add_argument("summary_dir", type=Path, help="directory of system summary files (*.txt)")
+    batch.add_argument("--out", type=Path, default=GENERATED_DIR / "batch",
+                       help="output root; one subdirectory per summary (default: generated/batch/)")
+    batch.add_argument("--max-pipelines", type=int,
+                       help="summaries processed at once (default: the LLM concurrency cap)")
+    batch.add_argument("--cache-dir", type=Path, help="keep the shared reply cache on disk here")
+    batch.add_argument("--stages", type=parse_stages, default=list(STAGES), help="stages to run (default: all)")
+    batch.add_argument("--seq-mode", choices=["template", "hybrid", "llm"], default="template")
+    batch.add_argument("--candidates", type=int, default=1)
+    batch.add_argument("--refine-rounds", type=int, default=1)
+    batch.add_argument("--resume", action="store_true", help="skip work each summary's earlier run finished")
+    batch.add_argument("--no-warmup", dest="warmup", action="store_const", const=False,
+                       help="do not preload the models at the start of each pipeline")
+    batch_exemplars = batch.add_mutually_exclusive_group()
+    batch_exemplars.add_argument("--exemplars", type=Path, metavar="INDEX",
+                                 help="index of approved code shared by the summaries (default: <out>/exemplars.json)")
+    batch_exemplars.add_argument("--no-exemplars", dest="exemplars", action="store_const", const=False,
+                                 help="do not use or add to the index of approved code")
+    sub.add_parser("stages", help="list the pipeline stages")
+
+    args = parser.parse_args(argv)
+    if args.command == "stages":
+        for name, (module_name, func_name) in STAGES.items():
+            print(f"{name:<8} {module_name}.{func_name}")
+        return 0
+    if args.command == "run":
+        from agents.transcript import TranscriptMismatch
+
+        try:
+            main(args.summary, args.out, args.stages, args.profile_imports, args.seq_mode,
+                 args.candidates, args.refine_rounds, args.resume, args.warmup, args.record, args.replay,
+                 args.exemplars)
+        except TranscriptMismatch as e:
+            print(f"[FAIL] {e}")
+            return 1
+        return 0
+    if args.command == "batch":
+        import asyncio
+
+        from agents.batch import run_batch
+
+        options = PipelineOptions(args.stages, args.seq_mode, args.candidates, args.refine_rounds, args.resume,
+                                  args.warmup, exemplars=args.exemplars)
+        report = asyncio.run(run_batch(args.summary_dir, args.out, options, args.max_pipelines,
+                                       cache_dir=args.cache_dir))
+        return 0 if not report["failed"] else 1
+    # plain `python main.py` keeps running the whole pipeline
+    main()
+    return 0
 
-    # Generate executable Python code from sequence diagrams
-    # Demonstrates all 4 agentic patterns:
-    # 1) Tool-based agents (date calculation functions)
-    # 2) Coding agents (generates and executes Python code)
-    # 3) Multi-agent collaboration (Architect -> Coder -> Tester)
-    # 4) Observer/reflection (Reviewer agent provides feedback, Coder refines)
-    generate_code_from_sequences(SEQ_DIR, CODE_DIR)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
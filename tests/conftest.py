@@ -0,0 +1,33 @@
+import pytest
+
+from agents import backend_pool, reply_cache, scheduler
+from bench.mock_ollama import MockOllama
+
+
+@pytest.fixture(autouse=True)
+def fresh_process_state(monkeypatch):
+    """Every test gets its own scheduler, backend pool and reply cache, built from its environment."""
+    monkeypatch.delenv("OLLAMA_HOSTS", raising=False)
+    monkeypatch.delenv("LLM_CACHE_DIR", raising=False)
+    monkeypatch.setenv("LLM_WARMUP", "0")
+    monkeypatch.setattr(scheduler, "_scheduler", None)
+    monkeypatch.setattr(backend_pool, "_pool", None)
+    monkeypatch.setattr(reply_cache, "_cache", None)
+
+
+@pytest.fixture
+def stub_hosts(monkeypatch):
+    """Starts MockOllama servers and points the pipeline at them: stub_hosts(dict(...), dict(...))."""
+    servers = []
+
+    def start(*settings):
+        for kwargs in settings:
+            server = MockOllama(**{"seed": 1, **kwargs})
+            server.start()
+            servers.append(server)
+        monkeypatch.setenv("OLLAMA_HOSTS", ",".join(server.url for server in servers))
+        return servers
+
+    yield start
+    for server in servers:
+        server.stop()
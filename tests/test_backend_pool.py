@@ -0,0 +1,65 @@
+import time
+
+from agents.backend_pool import BackendPool, configure_backend_pool
+from agents.llm_client import ask_agent
+from agents.scheduler import configure_scheduler
+
+
+def test_least_loaded_host_is_picked():
+    pool = BackendPool(["http://a", "http://b"], max_in_flight=2)
+    first, second = pool.acquire(), pool.acquire()
+    assert {first.url, second.url} == {"http://a", "http://b"}
+    pool.release(first, True, latency_s=0.01)
+    pool.release(second, True, latency_s=1.0)
+    # both idle now: the faster host wins, and keeps winning until its queue makes it slower
+    picks = [pool.acquire().url for _ in range(3)]
+    assert picks[0] == first.url
+    assert picks.count(first.url) == 2  # a full host is only used once every host is full
+
+
+def test_ejection_cooldown_doubles():
+    pool = BackendPool(["http://a", "http://b"], eject_after=2, eject_s=10.0, eject_max_s=25.0)
+    bad = pool.backends[0]
+    for _ in range(2):
+        pool.release(pool.acquire("http://a"), False)
+    assert bad.ejected_until - time.monotonic() > 9.0
+    assert all(pool.acquire().url == "http://b" for _ in range(3))
+
+    # back from the cooldown, one failure ejects it again for twice as long, capped at eject_max_s
+    bad.ejected_until = 0.0
+    pool.release(pool.acquire("http://a"), False)
+    assert 19.0 < bad.ejected_until - time.monotonic() <= 20.0
+    bad.ejected_until = 0.0
+    pool.release(pool.acquire("http://a"), False)
+    assert 24.0 < bad.ejected_until - time.monotonic() <= 25.0
+
+    # a success resets it
+    bad.ejected_until = 0.0
+    pool.release(pool.acquire("http://a"), True)
+    assert bad.ejections == 0 and bad.failures == 0
+
+
+def test_all_ejected_uses_the_host_due_back_first():
+    pool = BackendPool(["http://a", "http://b"], eject_after=1, eject_s=10.0)
+    pool.release(pool.acquire("http://a"), False)
+    time.sleep(0.01)
+    pool.release(pool.acquire("http://b"), False)
+    assert pool.acquire().url == "http://a"
+
+
+def test_failing_host_is_ejected_and_traffic_moves_to_the_healthy_one(stub_hosts):
+    failing, healthy = stub_hosts(dict(fail_rate=1.0), dict())
+    configure_scheduler(max_concurrency=2, max_retries=5, backoff_base_s=0.0, seed=1)
+    pool = configure_backend_pool(eject_after=2, eject_s=60.0)
+
+    for i in range(8):
+        assert "@startuml" in ask_agent(f"class_diagram_{i}", "Output a class diagram in PlantUML.", "go",
+                                        role="class_diagram")
+
+    snapshot = pool.snapshot()
+    assert snapshot[failing.url]["ejected"]
+    assert snapshot[failing.url]["ejections"] == 1
+    # once ejected, the failing host gets nothing more
+    assert failing.stats["requests"] == snapshot[failing.url]["requests"] <= 2
+    assert healthy.stats["requests"] == 8
+    assert sum(failing.stats["faults"].values()) == failing.stats["requests"]
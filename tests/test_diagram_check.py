@@ -0,0 +1,78 @@
+from agents import diagram_check, plantuml
+from agents.diagram_check import class_problems, repair, sequence_problems
+
+PARTICIPANTS = ["MaintenanceService", "DB"]
+MESSAGES = [
+    "User -> MaintenanceService: Log Maintenance (vehicleId, details)",
+    "MaintenanceService -> DB: Insert Record (vehicleId, record)",
+    "DB --> MaintenanceService: Ack",
+    "MaintenanceService --> User: Confirmation",
+]
+HEADER = ["@startuml", "actor User", "participant MaintenanceService", 'participant "Maintenance DB" as DB']
+
+
+def diagram(*lines):
+    return "\n".join([*HEADER, *lines, "@enduml"])
+
+
+def test_complete_diagram_has_no_problems():
+    # the alias is the declared name, not the first word of the label
+    assert sequence_problems(plantuml.parse(diagram(*MESSAGES)), MESSAGES, PARTICIPANTS) == []
+
+
+def test_removed_message_is_reported_as_missing():
+    parsed = plantuml.parse(diagram(*MESSAGES[:2], *MESSAGES[3:]))
+
+    assert sequence_problems(parsed, MESSAGES, PARTICIPANTS) == ["missing message: DB --> MaintenanceService: Ack"]
+
+
+def test_extra_and_reordered_lines():
+    parsed = plantuml.parse(diagram(MESSAGES[1], MESSAGES[0], *MESSAGES[2:], "DB -> DB: Vacuum"))
+
+    problems = sequence_problems(parsed, MESSAGES, PARTICIPANTS)
+
+    assert problems[0] == "extra message: DB -> DB: Vacuum"
+    assert problems[1].startswith("messages out of order (expected order: User -> MaintenanceService")
+
+
+def test_declarations():
+    text = "\n".join(["@startuml", "participant User", "database DB", "participant Cache",
+                      "DB -> MaintenanceService: Ping", "@enduml"])
+
+    problems = sequence_problems(plantuml.parse(text), [], PARTICIPANTS)
+
+    # MaintenanceService only appears in a message, so it counts as undeclared
+    assert problems == ["User is declared as participant, not as actor",
+                        "missing declaration: participant MaintenanceService",
+                        "extra declaration: participant Cache",
+                        "extra message: DB -> MaintenanceService: Ping"]
+
+
+def test_class_problems():
+    text = "\n".join(["@startuml", "class Vehicle", "class MaintenanceRecord", "class Owner",
+                      "MaintenanceRecord \"*\" -- \"1\" Vehicle", "@enduml"])
+    associations = ['Vehicle "1" -- "*" MaintenanceRecord', "Vehicle --> ServiceSchedule"]
+
+    problems = class_problems(plantuml.parse(text), ["Vehicle", "MaintenanceRecord", "ServiceSchedule"],
+                              associations)
+
+    # a plain association written the other way round still counts
+    assert problems == ["missing class: ServiceSchedule", "extra class: Owner",
+                        "missing association: Vehicle --> ServiceSchedule"]
+
+
+def test_repair_sends_only_the_problems(monkeypatch):
+    prompts = []
+
+    def fake_ask_plantuml(name, system_message, prompt, role):
+        prompts.append(prompt)
+        return diagram(*MESSAGES)
+    monkeypatch.setattr(diagram_check, "ask_plantuml", fake_ask_plantuml)
+    broken = diagram(*MESSAGES[:2], *MESSAGES[3:])
+
+    block, problems = repair("seq_diagram_agent_Log_Maintenance", "sequence", broken,
+                             lambda d: sequence_problems(d, MESSAGES, PARTICIPANTS), "coder")
+
+    assert problems == [] and block == diagram(*MESSAGES)
+    assert len(prompts) == 1
+    assert "- missing message: DB --> MaintenanceService: Ack" in prompts[0]
@@ -0,0 +1,80 @@
+import json
+
+from agents import plantuml
+from agents.exemplars import EXEMPLAR_FILE, ExemplarIndex, format_examples, open_index, structure
+
+
+def sequence(*messages):
+    return plantuml.parse("\n".join(["@startuml", "actor User", *messages, "@enduml"]))
+
+
+LOG = sequence("User -> MaintenanceService: Log Maintenance (vehicleId, details)",
+               "MaintenanceService -> MaintenanceDB: Insert Record (vehicleId, record)",
+               "MaintenanceDB --> MaintenanceService: Ack",
+               "MaintenanceService --> User: Confirmation")
+REGISTER = sequence("User -> VehicleService: Register Vehicle (vin, make, model)",
+                    "VehicleService -> VehicleDB: Save Vehicle (vehicle)",
+                    "VehicleDB --> VehicleService: Ack")
+CODE = "class MaintenanceService:\n    def log_maintenance(self, vehicle_id, details):\n        return 'Ack'\n"
+
+
+def test_structure_keeps_participants_and_request_edges():
+    shape = structure(LOG)
+
+    # actors and replies are left out
+    assert shape["participants"] == ["MaintenanceService", "MaintenanceDB"]
+    assert shape["edges"] == ["User->MaintenanceService.log_maintenance",
+                              "MaintenanceService->MaintenanceDB.insert_record"]
+
+
+def test_search_ranks_the_similar_use_case_first(tmp_path):
+    index = ExemplarIndex(tmp_path / EXEMPLAR_FILE)
+    index.add("Register Vehicle", REGISTER, "class VehicleService: ...\n")
+    index.add("Log Maintenance", LOG, CODE, refined=1)
+    query = sequence("User -> MaintenanceService: Log Service Visit (vehicleId, details)",
+                     "MaintenanceService -> MaintenanceDB: Insert Record (vehicleId, record)")
+
+    matches = index.search("Log Service Visit", query, k=2)
+
+    assert [entry["use_case"] for _, entry in matches] == ["Log Maintenance", "Register Vehicle"]
+    assert 0 < matches[1][0] < matches[0][0] <= 1
+    assert matches[0][1]["refined"] == 1
+    between = (matches[0][0] + matches[1][0]) / 2
+    assert [entry["use_case"] for _, entry in index.search("Log Service Visit", query, min_score=between)] \
+        == ["Log Maintenance"]
+
+
+def test_add_replaces_the_same_use_case_and_persists(tmp_path):
+    path = tmp_path / EXEMPLAR_FILE
+    index = ExemplarIndex(path)
+    index.add("Log Maintenance", LOG, "old")
+    index.add("Log Maintenance", LOG, CODE)
+
+    reloaded = ExemplarIndex(path)
+
+    assert [entry["code"] for entry in reloaded.entries] == [CODE]
+    assert not path.with_suffix(".tmp").exists()
+
+
+def test_index_of_another_version_starts_empty(tmp_path):
+    path = tmp_path / EXEMPLAR_FILE
+    path.write_text(json.dumps({"version": 0, "entries": [{"use_case": "old"}]}), encoding="utf-8")
+
+    assert ExemplarIndex(path).entries == []
+    assert ExemplarIndex(tmp_path / "missing.json").search("Log Maintenance", LOG) == []
+
+
+def test_open_index_is_shared_per_file(tmp_path):
+    assert open_index(tmp_path / EXEMPLAR_FILE) is open_index(tmp_path / "." / EXEMPLAR_FILE)
+    assert open_index(tmp_path / EXEMPLAR_FILE) is not open_index(tmp_path / "other.json")
+
+
+def test_format_examples(tmp_path):
+    index = ExemplarIndex(tmp_path / EXEMPLAR_FILE)
+    index.add("Log Maintenance", LOG, CODE)
+
+    text = format_examples(index.search("Log Maintenance", LOG), max_tokens=300)
+
+    assert text.startswith('# Approved implementation of "Log Maintenance" (similarity 1.00)\n')
+    assert "def log_maintenance" in text
+    assert format_examples([], max_tokens=300) == ""
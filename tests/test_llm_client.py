@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from agents.llm_client import BlockExtractor
+
+REPLY = '{"code": "x = {\\"a\\": [1]}\\n}", "issues": ["a } in a string", {"b": "]"}]}'
+
+
+def feed(extractor: BlockExtractor, text: str, step: int) -> bool:
+    return any(extractor.feed(text[i:i + step]) for i in range(0, len(text), step))
+
+
+@pytest.mark.parametrize("step", [1, 4, 1000])
+def test_json_stops_when_the_object_closes(step):
+    extractor = BlockExtractor("json")
+    assert feed(extractor, "\n" + REPLY + "\n\n   \n   trailing", step)
+    assert json.loads(extractor.block_text()) == json.loads(REPLY)
+
+
+def test_json_waits_for_an_unfinished_object():
+    extractor = BlockExtractor("json")
+    assert not feed(extractor, '{"plantuml": "@startuml\\nA -> B\\n@enduml', 3)
+    assert extractor.block_text() == '{"plantuml": "@startuml\\nA -> B\\n@enduml'
+
+
+@pytest.mark.parametrize("mode, text, block", [
+    ("plantuml", "Here:\n@startuml\nA -> B\n@enduml\nmore prose", "Here:\n@startuml\nA -> B\n@enduml"),
+    ("code", "Code:\n```python\nx = 1\n```\nmore prose", "Code:\n```python\nx = 1\n```"),
+])
+def test_block_modes_stop_at_the_closing_marker(mode, text, block):
+    extractor = BlockExtractor(mode)
+    assert feed(extractor, text, 2)
+    assert extractor.block_text() == block
+
+
+def test_autogen_gets_only_the_keys_it_understands(monkeypatch):
+    import sys
+    import types
+
+    from agents import llm_client
+    from config.llm_config import get_llm_config
+
+    seen = {}
+
+    class ConversableAgent:
+        def __init__(self, name, system_message, llm_config):
+            seen.update(llm_config)
+
+        def generate_reply(self, messages):
+            return {"content": "@startuml\n@enduml"}
+
+    module = types.ModuleType("autogen.agentchat")
+    module.ConversableAgent = ConversableAgent
+    monkeypatch.setitem(sys.modules, "autogen", types.ModuleType("autogen"))
+    monkeypatch.setitem(sys.modules, "autogen.agentchat", module)
+    llm_config = {**get_llm_config("coder"), "format": {"type": "object"}}
+    cfg = {**llm_config["config_list"][0], "stream": False}
+    content, _ = llm_client._autogen_chat("coder", "system", "user", llm_config, cfg)
+    assert content == "@startuml\n@enduml"
+    assert set(seen) == {"config_list", "temperature", "timeout", "max_tokens"}
+    assert seen["config_list"] == [cfg]
@@ -0,0 +1,92 @@
+import pytest
+
+from agents.microbench import breaches, format_report, run_microbench, sample_arg
+from agents.sandbox import SandboxPool
+from config.llm_config import get_microbench_config
+
+# one fast method, one that rewrites its whole growing store on every call, one that always raises,
+# and a demo that must not run on import
+IMPL = '''import json
+
+
+class MaintenanceLog:
+    def __init__(self):
+        self.entries = []
+        self.saved = []
+        self.blob = "[]"
+
+    def log_maintenance(self, vehicle_id, details):
+        self.entries.append((vehicle_id, details))
+
+    def save_record(self, details):
+        self.saved.append(details)
+        self.blob = json.dumps(self.saved)
+
+    def get_history(self, vehicle_id):
+        raise KeyError(vehicle_id)
+
+
+if __name__ == "__main__":
+    raise SystemExit("the demo ran")
+'''
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(size=1)
+    yield pool
+    pool.close()
+
+
+def test_sample_args_follow_parameter_names():
+    assert sample_arg("vehicle_id", "VH00007", 3) == "VH00007"
+    assert sample_arg("record_id", "VH00007", 3) == "R000003"
+    assert sample_arg("service_date", "VH00007", 3) == "2024-06-01"
+    assert sample_arg("mileage", "VH00007", 3) == 10003
+    assert sample_arg("details", "VH00007", 3)["vehicle_id"] == "VH00007"
+
+
+def test_worker_benchmarks_every_public_method(tmp_path, pool):
+    impl = tmp_path / "log_maintenance_impl.py"
+    impl.write_text(IMPL, encoding="utf-8")
+    config = {**get_microbench_config(), "vehicles": 10, "records": 400}
+
+    report = run_microbench(impl, pool, config)
+
+    assert "error" not in report
+    methods = {m["name"]: m for m in report["methods"]}
+    # creating methods run first, so the others see a filled store
+    assert report["methods"][0]["name"] == "MaintenanceLog.log_maintenance"
+    assert set(methods) == {"MaintenanceLog.log_maintenance", "MaintenanceLog.save_record",
+                            "MaintenanceLog.get_history"}
+    assert methods["MaintenanceLog.log_maintenance"]["errors"] == 0
+    assert methods["MaintenanceLog.get_history"]["errors"] == methods["MaintenanceLog.get_history"]["calls"]
+    assert methods["MaintenanceLog.save_record"]["slowdown"] > config["max_slowdown"]
+    # only the rewrite is over a threshold; the method that only raised is not judged
+    assert [problem.split(":")[0] for problem in breaches(report, config)] == ["MaintenanceLog.save_record"]
+    assert "(400 raised)" in format_report(report)
+
+
+def test_worker_reports_an_import_failure(tmp_path, pool):
+    impl = tmp_path / "broken_impl.py"
+    impl.write_text("import not_a_module\n", encoding="utf-8")
+
+    report = run_microbench(impl, pool, get_microbench_config())
+
+    assert report["methods"] == [] and "not_a_module" in report["error"]
+
+
+def test_breaches():
+    config = get_microbench_config()
+    report = {"vehicles": 100, "records": 1000, "methods": [
+        {"name": "Store.add", "calls": 1000, "errors": 0, "ops_per_sec": 90000.0, "slowdown": 1.1, "peak_kb": 12.0},
+        {"name": "Store.save", "calls": 300, "errors": 0, "ops_per_sec": 300.0, "slowdown": 9.5, "peak_kb": 12.0},
+        {"name": "Store.get", "calls": 1000, "errors": 1000, "ops_per_sec": 5.0, "slowdown": None, "peak_kb": 0.0},
+    ]}
+
+    problems = breaches(report, config)
+
+    # Store.get only raised with the made-up arguments, so it is not judged
+    assert len(problems) == 1
+    assert problems[0].startswith("Store.save: 300 ops/sec") and "9.5x slower" in problems[0]
+    assert problems[0].endswith("under 100 vehicles x 1000 records")
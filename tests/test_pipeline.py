@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from agents.pipeline import Pipeline, PipelineOptions
+
+SUMMARY = "A car maintenance tracker: register vehicles, log maintenance, get service recommendations.\n"
+
+
+def test_failed_stage_leaves_no_warmup_task_behind(stub_hosts, tmp_path, monkeypatch):
+    server, = stub_hosts(dict(load_delay=0.2))
+    summary = tmp_path / "summary.txt"
+    summary.write_text(SUMMARY, encoding="utf-8")
+    pipeline = Pipeline(summary, tmp_path / "out", PipelineOptions(stages=["usecase"], warmup=True))
+
+    async def broken_stage(name):
+        raise RuntimeError(f"{name} failed")
+    monkeypatch.setattr(pipeline, "run_stage", broken_stage)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="usecase failed"):
+            await pipeline.run()
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    # the warm-up ran to completion instead of being abandoned
+    assert server.stats["requests"] >= 1 and server.stats["in_flight"] == 0
@@ -0,0 +1,36 @@
+from agents import plantuml
+
+
+def test_usecase_keyword_with_alias():
+    diagram = plantuml.parse("@startuml\nactor User\nusecase (Register) as UC1\nUser --> UC1\n@enduml")
+    assert diagram.kind == "usecase"
+    assert diagram.use_cases == ["Register"]
+    assert diagram.compact() == "Actors: User\nUser -> (Register)"
+
+
+def test_quoted_usecase_with_alias():
+    diagram = plantuml.parse('@startuml\nactor User\nusecase "Log Event" as UC2\nUser --> UC2\n@enduml')
+    assert diagram.kind == "usecase"
+    assert diagram.use_cases == ["Log Event"]
+    assert diagram.compact() == "Actors: User\nUser -> (Log Event)"
+
+
+def test_parenthesised_usecase_with_alias():
+    diagram = plantuml.parse("@startuml\nactor User\n(View History) as UC3\nUser --> UC3\n@enduml")
+    assert diagram.kind == "usecase"
+    assert diagram.compact() == "Actors: User\nUser -> (View History)"
+
+
+def test_usecase_link_written_from_the_use_case_end():
+    diagram = plantuml.parse("@startuml\nactor User\n(Log Event) <-- User\n@enduml")
+    link = diagram.links[0]
+    assert (link.source, link.arrow, link.target) == ("User", "-->", "Log Event")
+    assert diagram.actors == ["User"]
+    assert diagram.compact() == "Actors: User\nUser -> (Log Event)"
+
+
+def test_reverse_arrow():
+    assert plantuml._reverse_arrow("<--") == "-->"
+    assert plantuml._reverse_arrow("<|--") == "--|>"
+    assert plantuml._reverse_arrow("..>") == "<.."
+    assert plantuml._reverse_arrow("--") == "--"
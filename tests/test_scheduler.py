@@ -0,0 +1,112 @@
+import threading
+import time
+import urllib.error
+
+import pytest
+
+from agents.scheduler import BackendError, DeadlineExceeded, LLMScheduler
+
+
+def http_error(code: int) -> urllib.error.HTTPError:
+    return urllib.error.HTTPError("http://stub/api/chat", code, "stub", {}, None)
+
+
+def flaky(*errors: Exception):
+    """A call that raises the given errors in turn, then returns "ok"."""
+    pending = list(errors)
+    calls = []
+
+    def fn(deadline: float) -> str:
+        calls.append(deadline)
+        if pending:
+            raise pending.pop(0)
+        return "ok"
+    return fn, calls
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_waiting_calls_run_by_priority_then_arrival():
+    scheduler = LLMScheduler(max_concurrency=1)
+    release = threading.Event()
+    order = []
+    holder = threading.Thread(target=scheduler.call, args=(lambda d: release.wait(5),))
+    holder.start()
+    wait_until(lambda: scheduler._active == 1)
+
+    waiters = []
+    for label, priority in [("tester", 3), ("reviewer-a", 2), ("diagram", 0), ("reviewer-b", 2)]:
+        waiter = threading.Thread(target=scheduler.call, args=(lambda d, label=label: order.append(label),),
+                                  kwargs={"priority": priority})
+        waiter.start()
+        waiters.append(waiter)
+        # queued before the next one arrives, so arrival order is fixed
+        wait_until(lambda: len(scheduler._waiting) == len(waiters))
+    release.set()
+    for thread in [holder, *waiters]:
+        thread.join(5)
+    assert order == ["diagram", "reviewer-a", "reviewer-b", "tester"]
+    assert scheduler.stats["max_active"] == 1
+
+
+@pytest.mark.parametrize("error", [http_error(500), http_error(503), http_error(429), BackendError("overloaded"),
+                                   ConnectionResetError()])
+def test_transient_failures_are_retried(error):
+    scheduler = LLMScheduler(max_retries=3, backoff_base_s=0.0, seed=1)
+    fn, calls = flaky(error, error)
+    stats = {}
+    assert scheduler.call(fn, "stub", stats=stats) == "ok"
+    assert len(calls) == 3
+    assert stats["retries"] == 2
+    assert scheduler.stats["retries"] == 2 and scheduler.stats["failures"] == 0
+
+
+def test_client_errors_are_not_retried():
+    scheduler = LLMScheduler(max_retries=3, backoff_base_s=0.0)
+    fn, calls = flaky(http_error(400))
+    with pytest.raises(urllib.error.HTTPError):
+        scheduler.call(fn, "stub")
+    assert len(calls) == 1
+    assert scheduler.stats["failures"] == 1
+
+
+def test_gives_up_after_max_retries():
+    scheduler = LLMScheduler(max_retries=2, backoff_base_s=0.0)
+    fn, calls = flaky(*[http_error(502)] * 5)
+    with pytest.raises(urllib.error.HTTPError):
+        scheduler.call(fn, "stub")
+    assert len(calls) == 3
+    assert scheduler.stats["retries"] == 2 and scheduler.stats["failures"] == 1
+
+
+def test_backoff_is_capped_full_jitter():
+    scheduler = LLMScheduler(backoff_base_s=0.5, backoff_max_s=2.0, seed=1)
+    for attempt in range(1, 8):
+        assert 0.0 <= scheduler.backoff(attempt) <= min(2.0, 0.5 * 2 ** (attempt - 1))
+
+
+def test_no_retry_starts_past_the_deadline():
+    scheduler = LLMScheduler(max_retries=5, backoff_base_s=10.0, backoff_max_s=10.0, seed=1)
+    fn, calls = flaky(BackendError("overloaded"))
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        scheduler.call(fn, "stub", deadline_s=1e-6)
+    assert len(calls) == 1
+    assert time.perf_counter() - started < 1.0  # did not sleep through the backoff
+    assert scheduler.stats["failures"] == 1
+
+
+def test_deadline_starts_when_the_call_gets_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+    fn, calls = flaky()
+    with scheduler.slot():
+        thread = threading.Thread(target=scheduler.call, args=(fn,), kwargs={"deadline_s": 60})
+        thread.start()
+        time.sleep(0.05)
+        queued_until = time.perf_counter()
+    thread.join(5)
+    assert calls and calls[0] >= queued_until + 60
@@ -0,0 +1,81 @@
+from agents import plantuml
+from agents.static_check import BLOCKING_KINDS, analyze, message_method
+
+BROKEN = '''class MaintenanceDB:
+    def __init__(self):
+        self.records = {}
+
+    def insert(self, vehicle_id, record):
+        record["logged"] = datetime.now().isoformat()
+        self.records.setdefault(vehicleId, []).append(record)
+        return "Ack"
+
+
+db = MaintenanceDB()
+
+
+if __name__ == "__main__":
+    print(db.insert("V1", {}))
+'''
+
+CLEAN = '''from datetime import datetime
+
+
+class MaintenanceDB:
+    def __init__(self):
+        self.records = {}
+
+    def insert_record(self, vehicle_id, record):
+        record["logged"] = datetime.now().isoformat()
+        self.records.setdefault(vehicle_id, []).append(record)
+        return "Ack"
+
+
+if __name__ == "__main__":
+    print(MaintenanceDB().insert_record("V1", {}))
+'''
+
+DIAGRAM = plantuml.parse("""@startuml
+actor User
+participant MaintenanceDB
+participant Notifier
+User -> MaintenanceDB: Insert Record (vehicleId)
+MaintenanceDB -> Notifier: Send Reminder
+MaintenanceDB --> User: Ack
+@enduml""")
+
+
+def test_broken_draft_findings():
+    findings = {f.kind: f for f in analyze(BROKEN)}
+
+    assert set(findings) == {"undefined-name", "missing-import", "side-effect"}
+    assert findings["undefined-name"].line == 7 and "'vehicleId'" in str(findings["undefined-name"])
+    assert findings["missing-import"].line == 6 and "from datetime import datetime" in str(findings["missing-import"])
+    assert findings["side-effect"].line == 11 and "db = MaintenanceDB()" in str(findings["side-effect"])
+
+
+def test_only_breaking_findings_block():
+    blocking = [f.kind for f in analyze(BROKEN) if f.kind in BLOCKING_KINDS]
+
+    assert blocking == ["missing-import", "undefined-name"]
+
+
+def test_clean_code_against_its_diagram():
+    findings = analyze(CLEAN, diagram=DIAGRAM)
+
+    # replies and messages to actors are skipped; the missing class is reported once
+    assert [f.kind for f in findings] == ["diagram"]
+    assert "no class Notifier is defined" in str(findings[0])
+
+
+def test_missing_method_is_a_diagram_finding():
+    code = CLEAN.replace("insert_record", "store") + "\n\nclass Notifier:\n    def send_reminder(self):\n        pass\n"
+
+    findings = analyze(code, diagram=DIAGRAM)
+
+    assert [f.kind for f in findings] == ["diagram"]
+    assert "MaintenanceDB has no method" in str(findings[0]) and "insert_record()" in str(findings[0])
+
+
+def test_message_method():
+    assert message_method("Fetch Recent Maintenance (vehicleId)") == "fetch_recent_maintenance"
@@ -0,0 +1,64 @@
+import pytest
+
+from agents.backend_pool import get_backend_pool
+from agents.structured import (CODE_SCHEMA, PLANTUML_SCHEMA, REVIEW_SCHEMA, _from_text, ask_plantuml,
+                               ask_structured, validate)
+
+CLASS_SYSTEM = "You output a PlantUML class diagram."
+
+
+@pytest.mark.parametrize("data, errors", [
+    ({"verdict": "approved", "issues": []}, []),
+    ({"verdict": "approved"}, ["missing 'issues'"]),
+    ({"verdict": "maybe", "issues": []}, ["'verdict' is not one of ['approved', 'changes_requested']"]),
+    ({"verdict": "approved", "issues": "none"}, ["'issues' is not a array"]),
+    ({"verdict": "approved", "issues": [1]}, ["'issues' has items that are not strings"]),
+    (["approved"], ["reply is not a JSON object"]),
+])
+def test_validate(data, errors):
+    assert validate(data, REVIEW_SCHEMA) == errors
+
+
+def test_free_form_parsing():
+    assert _from_text("Sure:\n@startuml\nA -> B\n@enduml\nDone.", PLANTUML_SCHEMA) == {
+        "plantuml": "@startuml\nA -> B\n@enduml"}
+    assert _from_text("no diagram here", PLANTUML_SCHEMA) is None
+    assert _from_text("```python\nx = 1\n```", CODE_SCHEMA) == {"code": "x = 1\n"}
+    assert _from_text("Looks good. APPROVED", REVIEW_SCHEMA)["verdict"] == "approved"
+    assert _from_text("Fix the import.", REVIEW_SCHEMA) == {"verdict": "changes_requested",
+                                                           "issues": ["Fix the import."]}
+
+
+def test_schema_reply_is_parsed_as_json(stub_hosts):
+    server, = stub_hosts(dict())
+    review = ask_structured("reviewer", "You are a code reviewer.", "Review this.", REVIEW_SCHEMA,
+                            role="reviewer")
+    assert review == {"verdict": "approved", "issues": []}
+    assert server.stats["requests"] == 1
+
+
+def test_backend_without_schema_support_falls_back_to_free_form(stub_hosts):
+    server, = stub_hosts(dict(json_format=False))
+    block = ask_plantuml("class_diagram", CLASS_SYSTEM, "go", role="class_diagram")
+    assert block.startswith("@startuml") and block.endswith("@enduml")
+    # one rejected schema request, then the free-form retry; the fallback model is not tried
+    assert server.stats["format_rejected"] == 1 and server.stats["requests"] == 1
+    assert not get_backend_pool().accepts_format()
+
+    # every host rejected schemas, so the next call goes free-form straight away
+    assert ask_plantuml("class_diagram_2", CLASS_SYSTEM, "go", role="class_diagram")
+    assert server.stats["format_rejected"] == 1 and server.stats["requests"] == 2
+
+
+def test_schema_calls_avoid_the_host_that_rejected_them(stub_hosts):
+    plain, constrained = stub_hosts(dict(json_format=False), dict())
+    pool = get_backend_pool()
+    for i in range(6):
+        assert ask_plantuml(f"class_diagram_{i}", CLASS_SYSTEM, "go", role="class_diagram")
+    # the first call went to the first (idle) host; after its 400 no schema request went there again
+    assert plain.stats["format_rejected"] == 1
+    assert [b.url for b in pool.backends if b.rejects_format] == [plain.url]
+    assert pool.accepts_format()
+    # the free-form retry of the first call may use either host; every other call was a schema call
+    assert constrained.stats["requests"] >= 5
+    assert plain.stats["requests"] <= 1
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from agents import code_gen_agent
+from agents.pipeline import PipelineOptions, run_pipeline
+from agents.transcript import TranscriptMismatch
+
+SUMMARY = "A car maintenance tracker: register vehicles, log maintenance, get service recommendations.\n"
+STAGES = ["usecase", "specs", "seq", "class", "code"]
+
+
+def run(out_dir, summary=SUMMARY, **options):
+    return asyncio.run(run_pipeline(summary, out_dir, PipelineOptions(stages=STAGES, seq_mode="llm", **options)))
+
+
+@pytest.fixture
+def recorded(stub_hosts, tmp_path):
+    """A transcript recorded against a stub, which is stopped again so a replay cannot reach it."""
+    server, = stub_hosts(dict())
+    transcript = tmp_path / "run.jsonl"
+    summary = run(tmp_path / "recorded", record=transcript)
+    assert summary["llm_calls"] > 0
+    server.stop()
+    return transcript, server
+
+
+class LaterDay(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2031, 1, 1, tzinfo=tz)
+
+
+def test_replay_makes_no_backend_calls_on_a_later_day(recorded, tmp_path, monkeypatch):
+    transcript, server = recorded
+    requests = server.stats["requests"]
+    # the tools' reference date comes from the transcript, not the clock
+    monkeypatch.setattr(code_gen_agent, "datetime", LaterDay)
+
+    summary = run(tmp_path / "replayed", replay=transcript)
+
+    assert server.stats["requests"] == requests
+    assert summary["llm_calls"] > 0
+    recorded_code = {p.name: p.read_text(encoding="utf-8") for p in (tmp_path / "recorded/code").glob("*_impl.py")}
+    replayed_code = {p.name: p.read_text(encoding="utf-8") for p in (tmp_path / "replayed/code").glob("*_impl.py")}
+    assert recorded_code and replayed_code == recorded_code
+
+
+def test_changed_prompt_raises_transcript_mismatch(recorded, tmp_path):
+    transcript, _ = recorded
+    summary = SUMMARY + "Vehicles can also be sold.\n"  # changes the use case diagram prompt
+
+    with pytest.raises(TranscriptMismatch, match="use_case_diagram"):
+        run(tmp_path / "replayed", replay=transcript, summary=summary)
@@ -0,0 +1,42 @@
+from agents.llm_client import ask_agent
+from agents.scheduler import configure_scheduler
+from agents.tracing import start_trace
+from agents.warmup import warm_up
+from config.llm_config import get_llm_config
+
+LOAD_DELAY = 0.3
+
+
+def first_call_load_s(role: str) -> float:
+    trace = start_trace()
+    ask_agent(f"{role}_first", "You are a code reviewer.", "Review this.", role=role)
+    span, = [s for s in trace.spans if s.kind == "llm"]
+    return span.attrs.get("load_s") or 0.0
+
+
+def test_cold_first_call_pays_the_load(stub_hosts):
+    server, = stub_hosts(dict(load_delay=LOAD_DELAY))
+    assert first_call_load_s("reviewer") >= LOAD_DELAY
+    assert server.stats["loads"] == 1
+
+
+def test_warm_up_removes_the_first_call_load(stub_hosts):
+    server, = stub_hosts(dict(load_delay=LOAD_DELAY))
+    models = [get_llm_config(role)["config_list"][0]["model"] for role in ("reviewer", "coder")]
+    results = warm_up(models=models)
+    assert [r["ok"] for r in results] == [True, True]
+    assert all(r["load_s"] >= LOAD_DELAY for r in results)
+
+    assert first_call_load_s("reviewer") < 0.05
+    assert first_call_load_s("coder") < 0.05
+    # one load per model, all of them paid by the warm-up
+    assert server.stats["loads"] == len(models)
+
+
+def test_warm_ups_count_against_the_scheduler_cap(stub_hosts):
+    server, = stub_hosts(dict(load_delay=0.05))
+    scheduler = configure_scheduler(max_concurrency=1)
+    results = warm_up(models=["model-a", "model-b", "model-c"])
+    assert all(r["ok"] for r in results)
+    assert scheduler.stats["max_active"] == 1
+    assert server.stats["max_in_flight"] == 1